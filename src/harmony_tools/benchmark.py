@@ -0,0 +1,451 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+import os
+import sys
+import json
+import time
+import click
+import base64
+import random
+import platform
+import tempfile
+import contextlib
+import subprocess
+from datetime import datetime, timezone
+from bs4 import BeautifulSoup
+from harmony_tools import html2doc, upload2drive
+from harmony_tools.compact import coalesce_runs
+from harmony_tools.imagecache import format_bytes
+from harmony_tools.config import config
+from harmony_tools.instrument import peak_rss, reset_peak_rss
+
+DEFAULT_SIZES = [10, 100]
+MERGE_JOBS = max(2, os.cpu_count() or 1)
+# Lessons kept in memory for the save stages, so large corpora don't hold
+# every built document through the merges
+SAVE_SAMPLE = 100
+STARTUP_MODULES = ["harmony_tools.html2doc", "harmony_tools.upload2drive"]
+# Dependencies that must only load on the code paths that use them
+HEAVY_MODULES = [
+    "bs4",
+    "docx",
+    "docxcompose",
+    "googleapiclient",
+    "google_auth_oauthlib",
+    "html5lib",
+    "lxml",
+    "nocairosvg",
+    "PIL",
+    "requests",
+]
+
+WORDS = (
+    "harmony chord scale interval melody rhythm tempo cadence modulation "
+    "voicing progression tonic dominant subdominant triad seventh octave"
+).split()
+
+# 1x1 PNG, enough for python-docx to read the image header
+PIXEL_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+
+
+# --- Synthetic Teachable-style lessons ---
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _text_blocks(rng, paragraphs=40):
+    blocks = [f"<h2>{_sentence(rng, 4)}</h2>"]
+    for _ in range(paragraphs):
+        blocks.append(
+            f"<p>{_sentence(rng)} <strong>{_sentence(rng, 3)}</strong> "
+            f"<em>{_sentence(rng, 3)}</em> "
+            f"<a href='https://example.com/{rng.randint(0, 999)}'>link</a></p>"
+        )
+    return blocks
+
+
+def _image_blocks(rng, images=30):
+    # Relative sources resolve to file:// URLs next to the lesson
+    return [
+        f"<p>{_sentence(rng)}</p><img src='assets/image{rng.randint(0, 9)}.png' "
+        "width='320' height='200'>"
+        for _ in range(images)
+    ]
+
+
+def _base64_blocks(rng, images=30):
+    data_uri = "data:image/png;base64," + base64.b64encode(PIXEL_PNG).decode()
+    return [
+        f"<p>{_sentence(rng)}<img src='{data_uri}' width='64'></p>"
+        for _ in range(images)
+    ]
+
+
+def _nested_blocks(rng, depth=150):
+    return [
+        "<div class='wrapper'>" * depth + f"<p>{_sentence(rng)}</p>" + "</div>" * depth
+    ]
+
+
+def _list_blocks(rng, items=100):
+    bullets = "".join(f"<li>{_sentence(rng, 6)}</li>" for _ in range(items))
+    numbers = "".join(f"<li>{_sentence(rng, 6)}</li>" for _ in range(items))
+    return [f"<ul>{bullets}</ul>", f"<ol>{numbers}</ol>"]
+
+
+def _attachment_blocks(rng, attachments=40):
+    blocks = []
+    for i in range(attachments):
+        if i % 2:
+            blocks.append(
+                "<div class='lecture-attachment lecture-attachment-type-pdf_embed'>"
+                f"<div class='label'>Worksheet {i}.pdf</div>"
+                f"<a href='https://example.com/files/{i}.pdf'>Download</a></div>"
+            )
+        else:
+            blocks.append(
+                "<div class='lecture-attachment lecture-attachment-type-audio'>"
+                f"<span class='audioloader__name'>Exercise {i}.mp3</span></div>"
+            )
+    return blocks
+
+
+LESSON_KINDS = {
+    "text": _text_blocks,
+    "images": _image_blocks,
+    "base64": _base64_blocks,
+    "nested": _nested_blocks,
+    "lists": _list_blocks,
+    "attachments": _attachment_blocks,
+}
+
+
+def generate_lesson(kind, index, rng):
+    """
+    Return a saved-page style HTML document for one synthetic lesson,
+    including the navigation chrome and scripts real exports carry.
+    """
+    blocks = "".join(
+        f"<div class='lecture-attachment'>{block}</div>"
+        for block in LESSON_KINDS[kind](rng)
+    )
+    return (
+        f"<!DOCTYPE html><html><head><title>Lesson {index:05d} {kind}</title>"
+        "<style>.course-sidebar{color:red}</style>"
+        "<script>window.analytics = {};</script></head><body>"
+        "<header class='navbar'><a href='/'>Course</a></header>"
+        "<div class='course-sidebar'><ul><li>Section 1</li><li>Section 2</li></ul></div>"
+        f"<div class='course-mainbar lecture-content'>{blocks}</div>"
+        "</body></html>"
+    )
+
+
+def build_corpus(folder, kind, size, seed=0):
+    """
+    Write `size` lessons of `kind` into `folder`, returning the filenames.
+    """
+    rng = random.Random(seed)
+    assets = os.path.join(folder, "assets")
+    os.makedirs(assets, exist_ok=True)
+    for i in range(10):
+        with open(os.path.join(assets, f"image{i}.png"), "wb") as f:
+            f.write(PIXEL_PNG)
+
+    filenames = []
+    for index in range(size):
+        filename = f"lesson{index:05d}.html"
+        with open(os.path.join(folder, filename), "w", encoding="utf-8") as f:
+            f.write(generate_lesson(kind, index, rng))
+        filenames.append(filename)
+    return filenames
+
+
+# --- Measurement ---
+def peak_rss_mb(reset):
+    """
+    Peak resident set size since reset_peak_rss(), in MB. None where the
+    peak couldn't be reset, as it would be that of every stage so far.
+    """
+    peak = peak_rss() if reset else None
+    return round(peak / (1024 * 1024), 1) if peak is not None else None
+
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def measure(stage, items, func):
+    reset = reset_peak_rss()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    return result, {
+        "stage": stage,
+        "items": items,
+        "seconds": round(seconds, 4),
+        "per_item_ms": round(seconds * 1000 / items, 3) if items else None,
+        "throughput": round(items / seconds, 2) if seconds else None,
+        "peak_rss_mb": peak_rss_mb(reset),
+    }
+
+
+def measure_save(stage, docs, folder):
+    """
+    Time saving `docs` into `folder`, with the total size of the files.
+    """
+    paths = [os.path.join(folder, f"lesson_{i}.docx") for i in range(len(docs))]
+    _, timing = measure(
+        stage, len(docs), lambda: [doc.save(p) for doc, p in zip(docs, paths)]
+    )
+    timing["output_bytes"] = sum(os.path.getsize(p) for p in paths)
+    return timing
+
+
+def import_profile(module):
+    """
+    Import `module` in a fresh interpreter, returning its cumulative
+    import time in seconds and the heavy dependencies it pulled in.
+    """
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(sorted(set({HEAVY_MODULES!r}) & set(sys.modules))))"
+    )
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    seconds = None
+    for line in process.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            seconds = int(fields[1]) / 1e6
+    loaded = [name for name in process.stdout.strip().split(",") if name]
+    return seconds, loaded
+
+
+def benchmark_startup(modules=None, repeat=5):
+    """
+    Best-of-`repeat` import time of the CLI modules, as a guard against
+    heavy dependencies creeping back into their import path.
+    """
+    timings = []
+    for module in modules or STARTUP_MODULES:
+        runs = [import_profile(module) for _ in range(repeat)]
+        seconds = min(run[0] for run in runs)
+        timings.append(
+            {
+                "kind": "startup",
+                "size": 1,
+                "stage": f"import {module.rsplit('.', 1)[-1]}",
+                "items": 1,
+                "seconds": round(seconds, 4),
+                "per_item_ms": round(seconds * 1000, 3),
+                "throughput": None,
+                "peak_rss_mb": None,
+                "heavy_modules": runs[0][1],
+            }
+        )
+    return timings
+
+
+def benchmark_corpus(kind, size, verbose=False, merge_jobs=MERGE_JOBS):
+    """
+    Time every pipeline stage over a fresh corpus of `size` lessons, with
+    the tree merge on `merge_jobs` workers next to the sequential one.
+    """
+    timings = []
+    with tempfile.TemporaryDirectory() as workdir, quiet(not verbose):
+        config.load(workdir, force=True, keep_inputs=True)
+        filenames = build_corpus(str(config.input_folder), kind, size)
+
+        outputs, timing = measure(
+            "process_file",
+            size,
+            lambda: [html2doc.process_file(name) for name in filenames],
+        )
+        timings.append(timing)
+
+        # Block dispatch alone, over bodies parsed up front
+        bodies = []
+        for name in filenames:
+            path = str(config.input_folder / name)
+            with open(path, encoding="utf-8") as f:
+                soup = BeautifulSoup(f, "html5lib")
+            lesson_body = soup.find("div", class_="course-mainbar lecture-content")
+            bodies.append((lesson_body, path))
+        docs, timing = measure(
+            "process_element",
+            size,
+            lambda: [
+                html2doc.build_lesson_document(body, path) for body, path in bodies
+            ],
+        )
+        timings.append(timing)
+        del docs[SAVE_SAMPLE:]
+
+        # The same documents saved before and after their runs are coalesced
+        saved = os.path.join(workdir, "saved")
+        os.makedirs(saved)
+        timings.append(measure_save("save_uncoalesced", docs, saved))
+        coalesced, timing = measure(
+            "coalesce_runs", len(docs), lambda: sum(coalesce_runs(doc) for doc in docs)
+        )
+        timing["runs_coalesced"] = coalesced
+        timings.append(timing)
+        timings.append(measure_save("save_coalesced", docs, saved))
+        docs.clear()
+
+        lesson_paths, timing = measure(
+            "collect_lesson_files",
+            size,
+            lambda: upload2drive.collect_lesson_files(str(config.output_folder)),
+        )
+        timings.append(timing)
+
+        merged = os.path.join(workdir, "merged.docx")
+        _, timing = measure(
+            "merge_with_images",
+            size,
+            lambda: upload2drive.merge_with_images(lesson_paths, merged),
+        )
+        timing["output_bytes"] = os.path.getsize(merged)
+        timing["input_bytes"] = sum(os.path.getsize(p) for p in outputs if p)
+        timings.append(timing)
+
+        tree_merged = os.path.join(workdir, "tree_merged.docx")
+        _, timing = measure(
+            "merge_tree",
+            size,
+            lambda: upload2drive.merge_tree(lesson_paths, tree_merged, jobs=merge_jobs),
+        )
+        timing["output_bytes"] = os.path.getsize(tree_merged)
+        timing["jobs"] = merge_jobs
+        timings.append(timing)
+
+    for timing in timings:
+        timing.update({"kind": kind, "size": size})
+    return timings
+
+
+def run_benchmarks(kinds=None, sizes=None, verbose=False):
+    kinds = kinds or list(LESSON_KINDS)
+    sizes = sizes or DEFAULT_SIZES
+    print("⏱️  startup")
+    results = benchmark_startup()
+    for size in sizes:
+        for kind in kinds:
+            print(f"⏱️  {kind} x {size}")
+            results.extend(benchmark_corpus(kind, size, verbose=verbose))
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare_reports(baseline, current):
+    """
+    Pair up matching (kind, size, stage) results from two reports and
+    return rows of (key, baseline seconds, current seconds, ratio).
+    """
+    previous = {
+        (r["kind"], r["size"], r["stage"]): r["seconds"] for r in baseline["results"]
+    }
+    rows = []
+    for result in current["results"]:
+        key = (result["kind"], result["size"], result["stage"])
+        if key in previous:
+            before = previous[key]
+            ratio = result["seconds"] / before if before else None
+            rows.append((key, before, result["seconds"], ratio))
+    return rows
+
+
+def print_report(report):
+    print(
+        f"\n{'kind':<12}{'size':>6}  {'stage':<22}{'seconds':>10}"
+        f"{'ms/item':>10}{'items/s':>10}{'peak MB':>10}{'output':>12}"
+    )
+    for r in report["results"]:
+        output = format_bytes(r["output_bytes"]) if r.get("output_bytes") else ""
+        print(
+            f"{r['kind']:<12}{r['size']:>6}  {r['stage']:<22}{r['seconds']:>10.3f}"
+            f"{r['per_item_ms'] or 0:>10.2f}{r['throughput'] or 0:>10.1f}"
+            f"{r['peak_rss_mb'] or 0:>10.1f}{output:>12}"
+        )
+
+
+def print_comparison(rows):
+    print(
+        f"\n{'kind':<12}{'size':>6}  {'stage':<22}{'before':>10}{'after':>10}{'change':>10}"
+    )
+    for (kind, size, stage), before, after, ratio in rows:
+        change = f"{(ratio - 1):+.0%}" if ratio is not None else "n/a"
+        print(
+            f"{kind:<12}{size:>6}  {stage:<22}{before:>10.3f}{after:>10.3f}{change:>10}"
+        )
+
+
+def _parse_list(ctx, param, value):
+    return (
+        [item.strip() for item in value.split(",") if item.strip()] if value else None
+    )
+
+
+@click.command(help="Benchmark the conversion and merge pipelines")
+@click.option(
+    "--kinds",
+    callback=_parse_list,
+    help=f"Comma-separated lesson kinds (default: {','.join(LESSON_KINDS)})",
+)
+@click.option(
+    "--sizes",
+    callback=_parse_list,
+    help="Comma-separated corpus sizes (default: 10,100)",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False),
+    default="benchmark.json",
+    show_default=True,
+    help="Where to write the JSON report",
+)
+@click.option(
+    "--compare",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Previous JSON report to compare against",
+)
+@click.option("--verbose", is_flag=True, default=False, help="Show conversion output")
+def main(kinds, sizes, output, compare, verbose):
+    unknown = set(kinds or []) - set(LESSON_KINDS)
+    if unknown:
+        raise click.BadParameter(f"Unknown lesson kinds: {', '.join(sorted(unknown))}")
+
+    report = run_benchmarks(
+        kinds=kinds, sizes=[int(s) for s in sizes] if sizes else None, verbose=verbose
+    )
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\n📝 Report written to {output}")
+
+    if compare:
+        with open(compare) as f:
+            print_comparison(compare_reports(json.load(f), report))
+
+
+if __name__ == "__main__":
+    main()
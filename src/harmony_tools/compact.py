@@ -0,0 +1,148 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+import copy
+
+HYPERLINK_RELTYPE = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink"
+)
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+# Run properties that don't show on a run holding nothing but spaces
+INVISIBLE_ON_SPACES = {f"{W}b", f"{W}bCs", f"{W}i", f"{W}iCs"}
+
+
+class HyperlinkRels:
+    """
+    External hyperlink relationships of one part. python-docx finds an
+    existing relationship, and the next free rId, by scanning every
+    relationship of the part, which makes link-heavy lessons quadratic.
+    """
+
+    def __init__(self, part):
+        self.rels = part.rels
+        self.rids = {
+            rel.target_ref: rId
+            for rId, rel in self.rels.items()
+            if rel.is_external and rel.reltype == HYPERLINK_RELTYPE
+        }
+        self.next_id = len(self.rels) + 1
+
+    def rid(self, url):
+        rId = self.rids.get(url)
+        if rId is None:
+            while f"rId{self.next_id}" in self.rels:
+                self.next_id += 1
+            rId = f"rId{self.next_id}"
+            self.rels.add_relationship(HYPERLINK_RELTYPE, url, rId, is_external=True)
+            self.rids[url] = rId
+        return rId
+
+
+def hyperlink_rid(part, url):
+    """
+    rId of the part's relationship to `url`, added on first use.
+    """
+    rels = getattr(part, "hyperlink_rels", None)
+    if rels is None:
+        rels = part.hyperlink_rels = HyperlinkRels(part)
+    return rels.rid(url)
+
+
+def hyperlink_style_id(part):
+    """
+    Id of the Hyperlink character style, which links reference instead of
+    carrying their own colour and underline.
+    """
+    style_id = getattr(part, "hyperlink_style_id", None)
+    if style_id is None:
+        style_id = part.hyperlink_style_id = part.styles["Hyperlink"].style_id
+    return style_id
+
+
+def _text_only(run):
+    """
+    The single w:t of a run made of (optional) properties and one text
+    element, or None for anything else (pictures, breaks, tabs, fields).
+    """
+    text = None
+    for child in run:
+        if child.tag == f"{W}t" and text is None:
+            text = child
+        elif child.tag != f"{W}rPr":
+            return None
+    return text
+
+
+def _properties(run):
+    rPr = run.find(f"{W}rPr")
+    return b"" if rPr is None else _serialize(rPr)
+
+
+def _serialize(element):
+    from lxml import etree  # python-docx's own dependency
+
+    return etree.tostring(element)
+
+
+def _blends_into(spaces, text, other):
+    """
+    Whether a run of bare spaces may take on the formatting of `other`.
+    """
+    if text.text and text.text.strip():
+        return False
+    if spaces.find(f"{W}rPr") is not None:
+        return False
+    rPr = other.find(f"{W}rPr")
+    return rPr is None or all(child.tag in INVISIBLE_ON_SPACES for child in rPr)
+
+
+def coalesce_paragraph(p):
+    """
+    Merge adjacent text runs of a paragraph that render identically.
+    Returns the number of runs removed.
+    """
+    removed = 0
+    current = current_text = current_key = None
+
+    for child in list(p):
+        text = _text_only(child) if child.tag == f"{W}r" else None
+        if text is None:
+            current = None
+            continue
+
+        key = _properties(child)
+        if current is not None:
+            if key == current_key or _blends_into(child, text, current):
+                merged = True
+            elif _blends_into(current, current_text, child):
+                # The spaces so far adopt this run's formatting
+                current.insert(0, copy.deepcopy(child.find(f"{W}rPr")))
+                current_key = key
+                merged = True
+            else:
+                merged = False
+
+            if merged:
+                current_text.text = (current_text.text or "") + (text.text or "")
+                if current_text.text != current_text.text.strip():
+                    current_text.set(XML_SPACE, "preserve")
+                p.remove(child)
+                removed += 1
+                continue
+
+        current, current_text, current_key = child, text, key
+
+    return removed
+
+
+def coalesce_runs(doc):
+    """
+    Coalesce runs across every body paragraph, including those in tables.
+    """
+    return sum(coalesce_paragraph(p) for p in doc.element.body.iter(f"{W}p"))
+
+
+def body_xml_size(doc):
+    return len(_serialize(doc.element.body))
@@ -0,0 +1,43 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+from docxcompose.composer import Composer
+from docxcompose.utils import xpath
+
+STYLE_REFERENCES = ".//w:tblStyle|.//w:pStyle|.//w:rStyle"
+
+
+class LessonComposer(Composer):
+    """
+    docxcompose's Composer lists every style of the output document for
+    each element it appends, which dominates the time spent merging
+    lessons. An element whose styles the output already has, under the
+    same id and without numbering, needs none of that work, so it skips
+    add_styles altogether.
+    """
+
+    def insert(self, index, doc, remove_property_fields=True):
+        self._plain_styles = None
+        super().insert(index, doc, remove_property_fields=remove_property_fields)
+
+    def plain_styles(self, doc):
+        """
+        Style ids of `doc` that add_styles would leave untouched.
+        """
+        ours = {style.style_id for style in self.doc.styles}
+        return {
+            style.style_id
+            for style in doc.styles
+            if style.style_id in ours
+            and self.mapped_style_id(style.style_id) == style.style_id
+            and not xpath(style.element, ".//w:numId")
+        }
+
+    def add_styles(self, doc, element):
+        if not self.preserve_styles:
+            if self._plain_styles is None:
+                self._plain_styles = self.plain_styles(doc)
+            used = {ref.val for ref in xpath(element, STYLE_REFERENCES)}
+            if used <= self._plain_styles:
+                return
+        super().add_styles(doc, element)
@@ -38,6 +38,11 @@ class Config:
         self._ensure_loaded()
         return self._processed_folder
 
+    @property
+    def state_folder(self):
+        self._ensure_loaded()
+        return self._state_folder
+
     @property
     def font(self):
         self._ensure_loaded()
@@ -48,6 +53,51 @@ class Config:
         self._ensure_loaded()
         return self._nomedia
 
+    @property
+    def keep_inputs(self):
+        self._ensure_loaded()
+        return self._keep_inputs
+
+    @property
+    def parser(self):
+        self._ensure_loaded()
+        return self._parser
+
+    @property
+    def inline_svg(self):
+        self._ensure_loaded()
+        return self._inline_svg
+
+    @property
+    def optimize_images(self):
+        self._ensure_loaded()
+        return self._optimize_images
+
+    @property
+    def image_dpi(self):
+        self._ensure_loaded()
+        return self._image_dpi
+
+    @property
+    def template(self):
+        self._ensure_loaded()
+        return self._template
+
+    @property
+    def full_parse(self):
+        self._ensure_loaded()
+        return self._full_parse
+
+    @property
+    def low_memory(self):
+        self._ensure_loaded()
+        return self._low_memory
+
+    @property
+    def memory_budget(self):
+        self._ensure_loaded()
+        return self._memory_budget
+
     @property
     def google_credentials_path(self):
         return CREDENTIALS_FILE
@@ -62,10 +112,35 @@ class Config:
         self._input_folder = None
         self._output_folder = None
         self._processed_folder = None
+        self._state_folder = None
         self._font = "Helvetica"
         self._nomedia = False
-
-    def load(self, workdir=None, force=False, font="Helvetica", nomedia=False):
+        self._keep_inputs = False
+        self._parser = "html5lib"
+        self._full_parse = False
+        self._inline_svg = False
+        self._optimize_images = False
+        self._image_dpi = 150
+        self._template = None
+        self._low_memory = False
+        self._memory_budget = 0
+
+    def load(
+        self,
+        workdir=None,
+        force=False,
+        font="Helvetica",
+        nomedia=False,
+        keep_inputs=False,
+        parser="html5lib",
+        full_parse=False,
+        inline_svg=False,
+        optimize_images=False,
+        image_dpi=150,
+        template=None,
+        low_memory=False,
+        memory_budget=0,
+    ):
 
         if self._loaded and not force:
             return self
@@ -82,21 +157,56 @@ class Config:
         )
 
         self._workdir = workdir.expanduser().resolve()
+        self._font = font or "Helvetica"
+        self._nomedia = nomedia
+        self._keep_inputs = keep_inputs
+        self._parser = parser or "html5lib"
+        self._full_parse = full_parse
+        self._inline_svg = inline_svg
+        self._optimize_images = optimize_images
+        self._image_dpi = image_dpi or 150
+        self._template = Path(template).expanduser().resolve() if template else None
+        self._low_memory = low_memory
+        # In bytes; given in MB on the command line, 0 for no limit
+        self._memory_budget = (memory_budget or 0) * 1024 * 1024
         self._input_folder = self._workdir / "saved_html_lessons"
         self._output_folder = self._workdir / "converted_docs"
         self._processed_folder = self._workdir / "processed_html"
+        self._state_folder = self._workdir / ".harmony"
 
         # Ensure folders exist
         for folder in [
             self._input_folder,
             self._output_folder,
             self._processed_folder,
+            self._state_folder,
         ]:
             folder.mkdir(parents=True, exist_ok=True)
 
         self._loaded = True
         return self
 
+    def options(self):
+        """
+        The load() arguments that reproduce this configuration, e.g. in a
+        worker process.
+        """
+        self._ensure_loaded()
+        return {
+            "workdir": self._workdir,
+            "font": self._font,
+            "nomedia": self._nomedia,
+            "keep_inputs": self._keep_inputs,
+            "parser": self._parser,
+            "full_parse": self._full_parse,
+            "inline_svg": self._inline_svg,
+            "optimize_images": self._optimize_images,
+            "image_dpi": self._image_dpi,
+            "template": self._template,
+            "low_memory": self._low_memory,
+            "memory_budget": self._memory_budget // (1024 * 1024),
+        }
+
     def save(self):
         CONFIG_FILE.parent.mkdir(parents=True, exist_ok=True)
         with CONFIG_FILE.open("w") as f:
@@ -0,0 +1,284 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+import os
+import hashlib
+from harmony_tools.config import config
+from harmony_tools.manifest import Manifest
+from harmony_tools.lessonindex import lesson_hashes
+from harmony_tools.upload2drive import add_table_of_contents
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+# Hidden bookmarks (leading underscore) marking where each lesson starts
+MARKER_PREFIX = "_Lesson"
+END_MARKER = "_LessonsEnd"
+# Relationships that only body content refers to, and a splice can orphan
+CONTENT_RELTYPES = {
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image",
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink",
+}
+
+
+def marker_name(path):
+    digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+    return f"{MARKER_PREFIX}{digest[:24]}"
+
+
+def get_merge_manifest():
+    return Manifest(config.state_folder / "merge_manifest.json")
+
+
+# --- Segments ---
+def _marker(name):
+    """
+    An empty bookmark at body level. Empty, because docxcompose numbers
+    bookmark starts and ends separately, which only keeps pairs intact
+    when they don't enclose other bookmarks.
+    """
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
+    start = OxmlElement("w:bookmarkStart")
+    start.set(qn("w:id"), "0")
+    start.set(qn("w:name"), name)
+    end = OxmlElement("w:bookmarkEnd")
+    end.set(qn("w:id"), "0")
+    return start, end
+
+
+def _page_break():
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
+    paragraph = OxmlElement("w:p")
+    br = paragraph.add_r().add_br()
+    br.set(qn("w:type"), "page")
+    return paragraph
+
+
+def _is_marker(element):
+    return element.tag == f"{W}bookmarkStart" and element.get(
+        f"{W}name", ""
+    ).startswith(MARKER_PREFIX)
+
+
+def find_markers(body):
+    """
+    {name: bookmarkStart} of the lesson markers in a merged body.
+    """
+    return {
+        child.get(f"{W}name"): child
+        for child in body.iterchildren(f"{W}bookmarkStart")
+        if _is_marker(child)
+    }
+
+
+def segment_end(body, marker):
+    """
+    Body index of the marker following `marker`, where its segment ends.
+    """
+    for child in marker.itersiblings():
+        if _is_marker(child):
+            return body.index(child)
+    raise ValueError("merged document has no end marker")
+
+
+def insert_segment(composer, index, path, name):
+    """
+    Insert a lesson, preceded by its marker and a page break, at body
+    `index`. Returns its marker.
+    """
+    from docx import Document
+
+    body = composer.doc.element.body
+    start, end = _marker(name)
+    for offset, element in enumerate([start, end, _page_break()]):
+        body.insert(index + offset, element)
+    composer.insert(index + 3, Document(path))
+    return start
+
+
+def remove_segment(body, marker):
+    stop = body[segment_end(body, marker)]
+    element = marker
+    while element is not stop:
+        following = element.getnext()
+        body.remove(element)
+        element = following
+
+
+def prune_relationships(part):
+    """
+    Drop image and hyperlink relationships nothing in the document uses
+    any more, so their images are left out when saving.
+    """
+    used = set()
+    for element in part.element.iter():
+        used.update(value for key, value in element.attrib.items() if key.startswith(R))
+    for rId, rel in list(part.rels.items()):
+        if rel.reltype in CONTENT_RELTYPES and rId not in used:
+            del part.rels[rId]
+
+
+def prune_numbering(doc):
+    """
+    Drop list definitions left behind by removed lessons, so numbering
+    doesn't grow with every splice.
+    """
+    try:
+        numbering = doc.part.numbering_part.element
+    except NotImplementedError:
+        return
+
+    used = set(doc.element.body.xpath(".//w:numId/@w:val"))
+    used.update(doc.styles.element.xpath(".//w:numId/@w:val"))
+    for num in numbering.xpath("./w:num"):
+        if num.get(f"{W}numId") not in used:
+            numbering.remove(num)
+
+    abstract_used = set(numbering.xpath("./w:num/w:abstractNumId/@w:val"))
+    for abstract in numbering.xpath("./w:abstractNum"):
+        linked = abstract.find(f"{W}styleLink") is not None
+        linked = linked or abstract.find(f"{W}numStyleLink") is not None
+        if abstract.get(f"{W}abstractNumId") not in abstract_used and not linked:
+            numbering.remove(abstract)
+
+
+# --- Merging ---
+def build_segmented(lessons, output_filename):
+    """
+    Merge every lesson from scratch, marking where each one starts.
+    """
+    from docx import Document
+    from harmony_tools.composer import LessonComposer
+
+    master = Document(lessons[0]["path"])
+    composer = LessonComposer(master)
+    body = master.element.body
+    for offset, element in enumerate(_marker(lessons[0]["marker"])):
+        body.insert(offset, element)
+
+    for lesson in lessons[1:]:
+        insert_segment(
+            composer, composer.append_index(), lesson["path"], lesson["marker"]
+        )
+
+    index = composer.append_index()
+    for offset, element in enumerate(_marker(END_MARKER)):
+        body.insert(index + offset, element)
+    composer.renumber_bookmarks()
+    add_table_of_contents(master)
+    composer.save(output_filename)
+
+
+def plan_splice(recorded, lessons):
+    """
+    Lessons to take out of and put into the merged document, or None
+    when it has to be rebuilt: the first lesson, which the document's
+    styles and page setup come from, changed, or lessons were reordered.
+    """
+
+    def version(lesson):
+        return lesson["path"], lesson["hash"]
+
+    old = {version(lesson) for lesson in recorded}
+    new = {version(lesson) for lesson in lessons}
+    if version(recorded[0]) != version(lessons[0]):
+        return None
+
+    kept_before = [version(lesson) for lesson in recorded if version(lesson) in new]
+    kept_after = [version(lesson) for lesson in lessons if version(lesson) in old]
+    if kept_before != kept_after:
+        return None
+
+    removed = [lesson for lesson in recorded if version(lesson) not in new]
+    added = [lesson for lesson in lessons if version(lesson) not in old]
+    return removed, added
+
+
+def splice(output_filename, lessons, removed, added):
+    """
+    Replace only the segments of changed lessons in a merged document.
+    Returns False when its markers don't match what was recorded.
+    """
+    from docx import Document
+    from harmony_tools.composer import LessonComposer
+
+    master = Document(output_filename)
+    body = master.element.body
+    markers = find_markers(body)
+    added_markers = {lesson["marker"] for lesson in added}
+    expected = {lesson["marker"] for lesson in removed}
+    expected.update(
+        lesson["marker"] for lesson in lessons if lesson["marker"] not in added_markers
+    )
+    if not expected.union([END_MARKER]) <= set(markers):
+        return False
+
+    for lesson in removed:
+        remove_segment(body, markers.pop(lesson["marker"]))
+
+    composer = LessonComposer(master)
+    previous = markers[lessons[0]["marker"]]
+    for lesson in lessons[1:]:
+        if lesson["marker"] in added_markers:
+            index = segment_end(body, previous)
+            previous = insert_segment(composer, index, lesson["path"], lesson["marker"])
+        else:
+            previous = markers[lesson["marker"]]
+
+    composer.renumber_bookmarks()
+    prune_relationships(master.part)
+    prune_numbering(master)
+    master.save(output_filename)
+    return True
+
+
+def merge_delta(docx_files, output_filename, manifest=None):
+    """
+    Merge lessons like merge_with_images, keeping the merged document
+    split into one marked segment per lesson. The merge manifest records
+    which lesson hash produced each segment, so later runs only re-compose
+    the lessons that changed, were added or were removed.
+    """
+    if not docx_files:
+        print("❌ No .docx files found to merge.")
+        return None
+
+    manifest = manifest or get_merge_manifest()
+    key = os.path.abspath(output_filename)
+    lessons = [
+        {"path": os.path.abspath(path), "hash": digest, "marker": marker_name(path)}
+        for path, digest in zip(docx_files, lesson_hashes(docx_files))
+    ]
+
+    recorded = manifest.get(key)
+    plan = None
+    if recorded and os.path.isfile(output_filename):
+        stat = os.stat(output_filename)
+        if (stat.st_size, stat.st_mtime_ns) == (recorded["size"], recorded["mtime_ns"]):
+            plan = plan_splice(recorded["lessons"], lessons)
+
+    if plan == ([], []):
+        print(f"💤 {output_filename} is up to date")
+        return output_filename
+
+    if plan and splice(output_filename, lessons, *plan):
+        removed, added = plan
+        print(
+            f"✂️  Spliced {len(added)} lessons into {output_filename} "
+            f"({len(removed)} segments replaced or removed)"
+        )
+    else:
+        print(f"Merging {len(docx_files)} files into {output_filename}...")
+        build_segmented(lessons, output_filename)
+        print(f"✅ Merged lessons into: {output_filename}")
+
+    stat = os.stat(output_filename)
+    manifest.set(
+        key,
+        {"lessons": lessons, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns},
+    )
+    manifest.save()
+    return output_filename
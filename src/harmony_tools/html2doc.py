@@ -4,96 +4,92 @@
 import os
 import shutil
 import click
-import requests
+import traceback
+import threading
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import io
 import re
+import html
 import base64
-import tempfile
-import nocairosvg
-from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup, NavigableString
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+from urllib.parse import urljoin
 from harmony_tools.config import config
 
+# bs4, python-docx, requests and the image libraries are imported where
+# they are used, so --help and runs with nothing to convert start fast.
+from harmony_tools.manifest import Manifest, hash_bytes, hash_file
+from harmony_tools.lessonindex import get_lesson_index, lesson_entry
+from harmony_tools.imagecache import DEFAULT_MAX_BYTES, format_bytes, get_image_cache
+from harmony_tools.svgcache import get_svg_cache
+from harmony_tools.template import new_document
+from harmony_tools.compact import (
+    body_xml_size,
+    coalesce_runs,
+    hyperlink_rid,
+    hyperlink_style_id,
+)
+from harmony_tools.watch import DEFAULT_DEBOUNCE, DEFAULT_INTERVAL, InputWatcher
+from harmony_tools.imageopt import optimized_image, take_savings
+from harmony_tools.prefetch import collect_image_urls, get_session, prefetch_images
+from harmony_tools.instrument import (
+    MemoryBudgetExceeded,
+    check_memory_budget,
+    metrics,
+    peak_rss,
+    print_summary_table,
+    reset_peak_rss,
+    write_jsonl,
+)
+from harmony_tools.walker import (
+    DocumentWalker,
+    ignore,
+    register_block_handler,
+    register_class_handler,
+    register_inline_handler,
+)
+
 
 # --- Helper functions ---
 def safe_filename(name):
     return "".join(c for c in name if c.isalnum() or c in " -_").rstrip()
 
 
-def svg_to_png_bytes(svg_html):
+def svg_to_png_bytes(svg_html, width=None):
     """
-    Convert an SVG string to PNG bytes in memory.
-    Attempts to auto-correct missing namespace issues.
+    Convert an SVG string to PNG bytes in memory, through the workdir's
+    SVG cache. Attempts to auto-correct missing namespace issues.
     """
-    try:
-        # Fix missing xmlns if necessary
-        if "<svg" in svg_html and "xmlns=" not in svg_html:
-            svg_html = svg_html.replace(
-                "<svg",
-                '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"',
-                1,
-            )
-
-        png_data = nocairosvg.svg2png(bytestring=svg_html.encode("utf-8"))
-        return png_data
-
-    except Exception as e:
-        print(f"Failed to convert SVG to PNG: {e}")
-        return None
+    return get_svg_cache().render(svg_html, width)
 
 
-def download_image(url, save_folder):
-    try:
-        response = requests.get(url, stream=True, timeout=10)
-        response.raise_for_status()
-        parsed_url = urlparse(url)
-        img_name = os.path.basename(parsed_url.path)
-        img_name = safe_filename(img_name)
-        img_path = os.path.join(save_folder, img_name)
-        with open(img_path, "wb") as f:
-            f.write(response.content)
-        return img_path
-    except Exception as e:
-        print(f"Failed to download image {url}: {e}")
-        return None
+def download_image(url):
+    """
+    Fetch an image through the workdir's shared image cache and return
+    its local path, or None if it could not be downloaded.
+    """
+    path = get_image_cache().fetch(url, session=get_session())
+    return str(path) if path else None
 
 
 def add_hyperlink(paragraph, text, url):
     """
     A function that places a hyperlink within a paragraph object.
     """
-    # Create the w:hyperlink tag and add needed values
-    part = paragraph.part
-    r_id = part.relate_to(
-        url,
-        "http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink",
-        is_external=True,
-    )
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
 
+    # Create the w:hyperlink tag, sharing one relationship per URL
+    part = paragraph.part
     hyperlink = OxmlElement("w:hyperlink")
-    hyperlink.set(qn("r:id"), r_id)
+    hyperlink.set(qn("r:id"), hyperlink_rid(part, url))
 
-    # Create a w:r element
+    # Create a w:r element, formatted by the shared Hyperlink style
     new_run = OxmlElement("w:r")
-
-    # Create a w:rPr element
     rPr = OxmlElement("w:rPr")
-
-    # Add color
-    color = OxmlElement("w:color")
-    color.set(qn("w:val"), "0000FF")
-    rPr.append(color)
-
-    # Add underline
-    underline = OxmlElement("w:u")
-    underline.set(qn("w:val"), "single")
-    rPr.append(underline)
-
-    # Add rPr to run
+    rStyle = OxmlElement("w:rStyle")
+    rStyle.set(qn("w:val"), hyperlink_style_id(part))
+    rPr.append(rStyle)
     new_run.append(rPr)
 
     # Create a w:t element and add the text
@@ -112,83 +108,78 @@ def process_element(elem, doc):
     """
     Main Processing Loop — handles block-level structures.
     """
-    if elem.name in ["h1", "h2", "h3"]:
-        handle_heading(elem, doc)
+    DocumentWalker(doc).walk(elem)
 
-    elif elem.name == "p":
-        handle_paragraph(elem, doc)
 
-    elif elem.name == "ul":
-        handle_unordered_list(elem, doc)
+def handle_heading(elem, walker):
+    # Determine heading level (limit to Heading 1–3 for Word styles)
+    heading_level = min(int(elem.name[1]), 3)
 
-    elif elem.name == "ol":
-        handle_ordered_list(elem, doc)
+    # Create the heading paragraph; spacing comes from the template styles
+    para = walker.doc.add_paragraph(style=f"Heading {heading_level}")
 
-    elif elem.name == "img" and not config.nomedia:
-        # Standalone block-level image
-        para = doc.add_paragraph()
-        handle_image(elem, para, doc)
+    # Process inline contents (text, links, images inside heading)
+    walker.inline(elem, para)
 
-    elif elem.name == "div":
-        elem_classes = elem.get("class", [])
 
-        if "lecture-attachment-type-pdf_embed" in elem_classes:
-            handle_pdf_embed(elem, doc)
+def handle_paragraph(elem, walker, style="Normal"):
+    from docx.shared import Pt
 
-        elif "lecture-attachment-type-audio" in elem_classes:
-            audio_name = "[Audio]"
-            name_span = elem.find("span", class_="audioloader__name")
-            if name_span and name_span.string:
-                audio_name = f"[{name_span.string.strip()}]"
-            doc.add_paragraph(audio_name)
+    para = walker.doc.add_paragraph(style=style)
 
-        elif "lecture-attachment-type-video" in elem_classes:
-            doc.add_paragraph("[Video Here]")
+    # List indentation and spacing come from the template styles
+    if style == "Normal":
+        para.paragraph_format.space_after = Pt(10)
 
-        else:
-            # Default: recurse into div's children
-            for child in elem.find_all(recursive=False):
-                process_element(child, doc)
+    walker.inline(elem, para)
 
-    else:
-        # Unknown elements are recursively processed
-        for child in elem.find_all(recursive=False):
-            process_element(child, doc)
 
+def handle_unordered_list(elem, walker):
+    items = (child for child in elem.children if child.name == "li")
+    walker.each(items, lambda li: handle_paragraph(li, walker, style="List Bullet"))
 
-def handle_heading(elem, doc):
-    # Determine heading level (limit to Heading 1–3 for Word styles)
-    heading_level = min(int(elem.name[1]), 3)
 
-    # Create the heading paragraph
-    para = doc.add_paragraph(style=f"Heading {heading_level}")
+def handle_ordered_list(elem, walker):
+    items = (child for child in elem.children if child.name == "li")
+    walker.each(items, lambda li: handle_paragraph(li, walker, style="List Number"))
 
-    # Process inline contents (text, links, images inside heading)
-    process_inline_contents(elem, para, doc)
 
-    # Optional: add a little spacing after heading
-    para.paragraph_format.space_after = Pt(6)
+def handle_block_image(elem, walker):
+    if config.nomedia:
+        return
+
+    # Standalone block-level image
+    para = walker.doc.add_paragraph()
+    handle_image(elem, para, walker.doc)
 
 
-def handle_paragraph(elem, doc, style="Normal"):
-    para = doc.add_paragraph(style=style)
-    process_inline_contents(elem, para, doc)
+def handle_audio(elem, walker):
+    audio_name = "[Audio]"
+    name_span = elem.find("span", class_="audioloader__name")
+    if name_span and name_span.string:
+        audio_name = f"[{name_span.string.strip()}]"
+    walker.doc.add_paragraph(audio_name)
 
-    if para:
-        if style != "Normal":
-            para.paragraph_format.left_indent = Inches(0.5)
 
-        para.paragraph_format.space_after = Pt(10 if style == "Normal" else 4)
+def handle_video(elem, walker):
+    walker.doc.add_paragraph("[Video Here]")
 
 
-def handle_unordered_list(elem, doc):
-    for li in elem.find_all("li", recursive=False):
-        handle_paragraph(li, doc, style="List Bullet")
+# Inline SVGs are icons, inserted 0.3" wide; render them for ~200 dpi
+SVG_ICON_PIXELS = 60
+INLINE_PARENTS = ["p", "h1", "h2", "h3", "li"]
 
 
-def handle_ordered_list(elem, doc):
-    for li in elem.find_all("li", recursive=False):
-        handle_paragraph(li, doc, style="List Number")
+def inline_svgs(lesson_body):
+    """
+    Markup of the outermost SVGs that sit inside paragraphs, headings
+    or list items.
+    """
+    return [
+        str(svg)
+        for svg in lesson_body.find_all("svg")
+        if not svg.find_parent("svg") and svg.find_parent(INLINE_PARENTS)
+    ]
 
 
 def insert_png_into_paragraph(png_bytes, para, width_inches=0.3):
@@ -196,73 +187,58 @@ def insert_png_into_paragraph(png_bytes, para, width_inches=0.3):
         print("No PNG bytes — skipping insertion.")
         return
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp:
-        tmp.write(png_bytes)
-        tmp_path = tmp.name
-
-    print(f"Saved temporary PNG at {tmp_path}")  # <<== NEW
+    from docx.shared import Inches
 
     run = para.add_run()
-    run.add_picture(tmp_path, width=Inches(width_inches))
-
-    # Comment out delete for now
-    os.remove(tmp_path)
+    run.add_picture(io.BytesIO(png_bytes), width=Inches(width_inches))
 
 
 def process_inline_contents(elem, para, doc, bold=False, italic=False):
-    for child in elem.contents:
-        if isinstance(child, NavigableString):
-            text = child.strip()
-            if text and para:
-                run = para.add_run(text)
-                # run.font.size = Pt(11)
-                run.bold = bold
-                run.italic = italic
-
-        elif child.name == "a" and child.has_attr("href"):
-            link_text = child.get_text(strip=True) or child["href"]
-            href = child["href"]
-            if para:
-                para.add_run(" ")
-                add_hyperlink(para, link_text, href)
-                para.add_run(" ")
-
-        elif child.name == "strong":
-            if para:
-                para.add_run(" ")
-                process_inline_contents(child, para, doc, bold=True, italic=italic)
-                para.add_run(" ")
-
-        elif child.name == "em":
-            if para:
-                para.add_run(" ")
-                process_inline_contents(child, para, doc, bold=bold, italic=True)
-                para.add_run(" ")
-
-        elif child.name in ["span", "br"]:
-            process_inline_contents(child, para, doc, bold=bold, italic=italic)
-
-        elif child.name == "img":
-            if para:
-                handle_image(child, para, doc)
-
-        elif child.name == "svg":
-            continue  # Ignore SVGs in inline context
-            if para:
-               svg_html = str(child)
-               png_bytes = svg_to_png_bytes(svg_html)
-               if png_bytes:
-                   #width_inches, height_inches = 1.0, 1.0 #extract_svg_dimensions(svg_html)
-                   insert_png_into_paragraph(png_bytes, para)
-            continue
+    walker = DocumentWalker(doc)
+    walker.inline(elem, para, bold=bold, italic=italic)
+    walker.run()
 
-        elif child.name in ["math", "canvas"]:
-            continue  # Ignore weird inline things
 
-        else:
-            # BLOCK ELEMENT FOUND — flush para and delegate to block handler
-            para = None
-            process_element(child, doc)
+def handle_inline_link(elem, frame, walker):
+    if not elem.has_attr("href"):
+        walker.interrupt(elem, frame)
+        return
+
+    link_text = elem.get_text(strip=True) or elem["href"]
+    if frame.para:
+        frame.para.add_run(" ")
+        add_hyperlink(frame.para, link_text, elem["href"])
+        frame.para.add_run(" ")
+
+
+def handle_inline_strong(elem, frame, walker):
+    if frame.para:
+        frame.para.add_run(" ")
+        walker.defer(frame.para.add_run, " ")
+        walker.inline(elem, frame.para, bold=True, italic=frame.italic)
+
+
+def handle_inline_em(elem, frame, walker):
+    if frame.para:
+        frame.para.add_run(" ")
+        walker.defer(frame.para.add_run, " ")
+        walker.inline(elem, frame.para, bold=frame.bold, italic=True)
+
+
+def handle_inline_span(elem, frame, walker):
+    walker.inline(elem, frame.para, bold=frame.bold, italic=frame.italic)
+
+
+def handle_inline_image(elem, frame, walker):
+    if frame.para:
+        handle_image(elem, frame.para, walker.doc)
+
+
+def handle_inline_svg(elem, frame, walker):
+    if frame.para and config.inline_svg and not config.nomedia:
+        png_bytes = svg_to_png_bytes(str(elem), SVG_ICON_PIXELS)
+        if png_bytes:
+            insert_png_into_paragraph(png_bytes, frame.para)
 
 
 def parse_style_for_maxwidth(style_string):
@@ -341,28 +317,71 @@ def extract_image_dimensions(img_elem):
     return width, height
 
 
+def decode_data_uri(data_uri, decoded=None):
+    """
+    Decode the payload of a base64 data: URI. With a `decoded` dict,
+    memoized in it, so a screenshot repeated throughout a lesson is only
+    decoded once.
+    """
+    if decoded is not None and data_uri in decoded:
+        return decoded[data_uri]
+    header, base64_data = data_uri.split(",", 1)
+    data = base64.b64decode(base64_data)
+    if decoded is not None:
+        decoded[data_uri] = data
+    return data
+
+
+def read_image_bytes(image):
+    if isinstance(image, io.BytesIO):
+        return image.getvalue()
+    if not isinstance(image, str):
+        # A spooled --low-memory payload
+        image.seek(0)
+        return image.read()
+    with open(image, "rb") as f:
+        return f.read()
+
+
 def handle_image(elem, para, doc):
     img_src = elem.get("src")
     if not img_src:
         return
 
-    try:
-        if img_src.startswith("data:image"):
-            header, base64_data = img_src.split(",", 1)
-            image_data = base64.b64decode(base64_data)
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp:
-                tmp.write(image_data)
-                tmp_path = tmp.name
+    from docx.shared import Inches
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
 
-            temp_file_created = True
+    try:
+        if doc.image_spool is not None and img_src.startswith("data:"):
+            # Decoded into the spool when the page was read (--low-memory)
+            from harmony_tools.lowmem import is_spool_key
+
+            metrics.count("images.inline")
+            spool = doc.image_spool
+            if not is_spool_key(img_src):
+                # Missed when reading, e.g. an unquoted src
+                img_src = spool.add(base64.b64decode(img_src.split(",", 1)[1]))
+            image = spool.open(img_src)
+
+        elif img_src.startswith("data:image"):
+            # Fed to python-docx straight from memory, no temp file
+            metrics.count("images.inline")
+            with metrics.stage("image.decode"):
+                image = io.BytesIO(decode_data_uri(img_src, doc.decoded_images))
 
         else:
+            metrics.count("images.remote")
             img_url = urljoin(f"file://{doc.input_path}", img_src)
-            tmp_path = download_image(img_url, doc.images_folder)
-            temp_file_created = False
+            if img_url in doc.image_paths:
+                # Fetched ahead of time by the prefetch pass
+                image = doc.image_paths[img_url]
+            else:
+                with metrics.stage("image.fetch"):
+                    image = download_image(img_url)
 
-        if tmp_path:
+        if not image:
+            metrics.count("images.failed")
+        else:
             width_inches, height_inches = extract_image_dimensions(elem)
 
             # Only center if para is otherwise empty (block images)
@@ -372,28 +391,36 @@ def handle_image(elem, para, doc):
             run = para.add_run()
 
             if width_inches or height_inches:
-                run.add_picture(
-                    tmp_path,
-                    width=Inches(width_inches) if width_inches else None,
-                    height=Inches(height_inches) if height_inches else None,
-                )
+                width = Inches(width_inches) if width_inches else None
+                height = Inches(height_inches) if height_inches else None
             else:
                 # No size info, use 100% usable width
                 section = para.part.document.sections[0]
                 page_width = section.page_width
                 left_margin = section.left_margin
                 right_margin = section.right_margin
-                usable_width = page_width - left_margin - right_margin
-                run.add_picture(tmp_path, width=usable_width)
+                width = page_width - left_margin - right_margin
+                height = None
+
+            if config.optimize_images:
+                image = io.BytesIO(
+                    optimized_image(
+                        read_image_bytes(image),
+                        width.inches if width else None,
+                        height.inches if height else None,
+                    )
+                )
 
-            if temp_file_created:
-                os.remove(tmp_path)
+            with metrics.stage("add_picture"):
+                run.add_picture(image, width=width, height=height)
 
     except Exception as e:
         print(f"Failed to insert image {img_src}: {e}")
 
 
-def handle_pdf_embed(elem, doc):
+def handle_pdf_embed(elem, walker):
+    doc = walker.doc
+
     # Try to find the download block
     label_div = elem.find("div", class_="label")
     if label_div:
@@ -417,84 +444,1028 @@ def handle_pdf_embed(elem, doc):
         add_hyperlink(para, download_link, download_link)
 
 
-def process_file(filename):
-    input_path = str(config.input_folder / filename)
+# --- Dispatch tables ---
+for tag in ["h1", "h2", "h3"]:
+    register_block_handler(tag, handle_heading)
+register_block_handler("p", handle_paragraph)
+register_block_handler("ul", handle_unordered_list)
+register_block_handler("ol", handle_ordered_list)
+register_block_handler("img", handle_block_image)
 
-    with open(input_path, "r", encoding="utf-8") as file:
-        soup = BeautifulSoup(file, "html5lib")
+register_class_handler("lecture-attachment-type-pdf_embed", handle_pdf_embed)
+register_class_handler("lecture-attachment-type-audio", handle_audio)
+register_class_handler("lecture-attachment-type-video", handle_video)
 
-    body = soup.body
-    if not body:
-        print(f"Warning: No <body> tag found in {filename}. Skipping.")
-        return
+register_inline_handler("a", handle_inline_link)
+register_inline_handler("strong", handle_inline_strong)
+register_inline_handler("em", handle_inline_em)
+register_inline_handler("span", handle_inline_span)
+register_inline_handler("br", handle_inline_span)
+register_inline_handler("img", handle_inline_image)
+register_inline_handler("svg", handle_inline_svg)
+# Ignore weird inline things
+for tag in ["math", "canvas"]:
+    register_inline_handler(tag, ignore)
 
-    page_title = (
-        soup.title.string.strip()
-        if soup.title and soup.title.string
-        else filename.replace(".html", "")
-    )
-    lesson_folder_name = safe_filename(page_title)
-    lesson_folder = str(config.output_folder / lesson_folder_name)
-    os.makedirs(lesson_folder, exist_ok=True)
-    images_folder = os.path.join(lesson_folder, "images")
-    os.makedirs(images_folder, exist_ok=True)
 
-    doc = Document()
-    style = doc.styles["Normal"]
-    font = style.font
-    font.name = config.font
-
-    lesson_body = soup.find("div", class_="course-mainbar lecture-content")
-    if not lesson_body:
-        print(f"Warning: No lesson body found in {filename}. Skipping.")
-        return
+def build_lesson_document(lesson_body, input_path, image_paths=None, spool=None):
+    """
+    Build the Word document for a parsed lesson body. `image_paths` maps
+    image URLs already fetched by the caller to local paths; `spool` is
+    the lesson's ImageSpool in --low-memory mode.
+    """
+    doc = new_document(config.font, config.template)
+    doc.input_path = input_path
+    doc.image_paths = dict(image_paths or {})
+    doc.image_spool = spool
+    # Only for this lesson: long-lived workers shouldn't keep old pages' images
+    doc.decoded_images = {}
+    if spool is not None:
+        from harmony_tools.lowmem import spool_images
+
+        spool_images(doc, spool)
+
+    if not config.nomedia:
+        urls = collect_image_urls(lesson_body, input_path)
+        missing = [url for url in urls if url not in doc.image_paths]
+        with metrics.stage("image.fetch"):
+            doc.image_paths.update(prefetch_images(missing, get_image_cache()))
+        if config.inline_svg:
+            get_svg_cache().render_many(inline_svgs(lesson_body), SVG_ICON_PIXELS)
 
     print(
         f"Found {len(lesson_body.find_all('div', class_='lecture-attachment'))} lecture-attachment blocks."
     )
+    walker = DocumentWalker(doc)
     block_counter = 0
     for block in lesson_body.find_all(recursive=False):
         block_counter += 1
+        metrics.count("blocks")
         print(f"--- Processing content block {block_counter}---")
 
-        if block.name in ["script", "meta", "style"]:
-            continue
-
         first_child = block.find(recursive=False)
-        if (
+        if block.name in ["script", "meta", "style"]:
+            pass
+        elif (
             first_child
             and first_child.has_attr("class")
             and "comments" in first_child["class"]
         ):
             print("Skipping comment-only block.")
+        else:
+            walker.walk(block)
+
+        if config.low_memory:
+            # Done with it: free its subtree, data: URIs and all
+            block.decompose()
+        if config.memory_budget:
+            check_memory_budget(config.memory_budget)
+
+    doc.decoded_images.clear()
+    return doc
+
+
+# --- Parser backends ---
+PARSER_BACKENDS = ["html5lib", "lxml", "html.parser"]
+# Tried in order by --parser auto; html5lib is the spec-compliant fallback
+FAST_PARSERS = ["lxml", "html.parser"]
+LESSON_BODY_CLASS = "course-mainbar lecture-content"
+HANDLED_TAGS = {"h1", "h2", "h3", "p", "ul", "ol", "li", "img", "div"}
+
+_parser_validation = None
+
+
+def get_parser_validation():
+    """
+    Results of the last --validate-parsers run, keyed by markup_key.
+    """
+    global _parser_validation
+    path = config.state_folder / "parser_validation.json"
+    if _parser_validation is None or _parser_validation.path != path:
+        _parser_validation = Manifest(path)
+    return _parser_validation
+
+
+def parse_html(markup, parser):
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(markup, parser)
+
+
+def markup_key(markup):
+    """
+    Hash of the markup handed to the tree builder, which validation and
+    conversion both take from read_lesson_markup.
+    """
+    return hash_bytes(markup.encode("utf-8"))
+
+
+def choose_parser(markup):
+    """
+    Pick the tree builder for a lesson. In auto mode the fastest backend
+    that parser validation found to build this markup like html5lib is
+    used; markup that was never validated gets html5lib.
+    """
+    if config.parser != "auto":
+        return config.parser
+
+    validated = get_parser_validation().get(markup_key(markup), {})
+    for parser in FAST_PARSERS:
+        if validated.get(parser, False):
+            return parser
+    return "html5lib"
+
+
+# --- Targeted extraction ---
+# Comments and raw-text elements are skipped so markup inside them is not
+# mistaken for real <div> tags
+PAGE_TOKEN_RE = re.compile(
+    r"(?P<skip><!--.*?-->|<(?P<raw>script|style|textarea)\b.*?</(?P=raw)\s*>)"
+    r"|<(?P<close>/?)div\b(?P<attrs>(?:[^>\"']|\"[^\"]*\"|'[^']*')*)>",
+    re.S | re.I,
+)
+CLASS_ATTR_RE = re.compile(
+    r"""\bclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.I
+)
+# How far into a page peek_output_path looks for the <title>
+TITLE_PEEK_CHARS = 64 * 1024
+TITLE_RE = re.compile(r"<title\b[^>]*>(.*?)</title\s*>", re.S | re.I)
+BLOCK_TAG_RE = re.compile(
+    r"<!--.*?-->|<(?P<raw>script|style|textarea|title)\b.*?</(?P=raw)\s*>"
+    r"|<(?P<tag>h[1-3]|p|ul|ol|li|img|div)(?=[\s/>])",
+    re.S | re.I,
+)
+
+
+def _has_lesson_class(attrs):
+    match = CLASS_ATTR_RE.search(attrs)
+    if not match:
+        return False
+    value = next(group for group in match.groups() if group is not None)
+    return " ".join(value.split()) == LESSON_BODY_CLASS
+
+
+def extract_lesson_markup(markup):
+    """
+    Cut the <title> and the lesson body <div> out of a saved page without
+    building a tree, returning a minimal HTML document that holds only
+    those, or None when the container can't be located reliably.
+    """
+    start = None
+    depth = 0
+    for token in PAGE_TOKEN_RE.finditer(markup):
+        if token.group("skip"):
+            continue
+        if start is None:
+            if not token.group("close") and _has_lesson_class(token.group("attrs")):
+                start = token.start()
+                depth = 1
+            continue
+        depth += -1 if token.group("close") else 1
+        if depth == 0:
+            end = token.end()
+            break
+    else:
+        # Missing or unbalanced: let the tree builder sort it out
+        return None
+
+    title = TITLE_RE.search(markup, 0, start)
+    head = f"<title>{title.group(1)}</title>" if title else ""
+    return f"<html><head>{head}</head><body>{markup[start:end]}</body></html>"
+
+
+def read_lesson_markup(input_path, spool=None):
+    """
+    The part of a saved page that the tree builder needs to see. In
+    --low-memory mode inline images are moved out of it first, into
+    `spool` if there is one.
+    """
+    if config.low_memory:
+        from harmony_tools.lowmem import read_without_images
+
+        with metrics.stage("image.decode"):
+            markup = read_without_images(input_path, spool)
+    else:
+        with open(input_path, "r", encoding="utf-8") as file:
+            markup = file.read()
+
+    if not config.full_parse:
+        fragment = extract_lesson_markup(markup)
+        if fragment is not None:
+            metrics.count("parse.fragment")
+            return fragment
+
+    metrics.count("parse.full")
+    return markup
+
+
+def count_block_tags(markup):
+    """
+    How many handled block tags the markup opens, outside comments and
+    raw text, counted without building a tree.
+    """
+    return sum(1 for token in BLOCK_TAG_RE.finditer(markup) if token.group("tag"))
+
+
+def keeps_structure(soup, markup):
+    """
+    Cheap check on a fast backend's tree: the lesson body is there and it
+    holds every handled block tag the markup opens. Catches the blocks a
+    lenient builder drops or merges on broken markup, not every way its
+    tree can differ from html5lib's.
+    """
+    if LESSON_BODY_CLASS in markup and not soup.find("div", class_=LESSON_BODY_CLASS):
+        return False
+    return len(soup.find_all(HANDLED_TAGS)) == count_block_tags(markup)
+
+
+def parse_lesson(input_path, spool=None):
+    """
+    Parse a saved lesson page, returning (soup, parser used).
+    """
+    from bs4 import FeatureNotFound
+
+    markup = read_lesson_markup(input_path, spool)
+    parser = choose_parser(markup)
+
+    try:
+        soup = parse_html(markup, parser)
+    except FeatureNotFound:
+        print(f"Warning: Parser {parser} is not installed, using html5lib.")
+        parser = "html5lib"
+        soup = parse_html(markup, parser)
+
+    if parser != "html5lib" and not keeps_structure(soup, markup):
+        # The fast builder lost blocks, the spec-compliant one won't
+        metrics.count("parser.fallback")
+        parser = "html5lib"
+        soup = parse_html(markup, parser)
+
+    metrics.count(f"parser.{parser}")
+    return soup, parser
+
+
+def lesson_signature(markup, parser, input_path, spool=None):
+    """
+    Summarize what a backend produces for a page: the handled block tags
+    of the lesson body and the paragraphs of the resulting document.
+    """
+    from bs4 import FeatureNotFound
+
+    try:
+        soup = parse_html(markup, parser)
+    except FeatureNotFound:
+        return None
+
+    lesson_body = soup.find("div", class_=LESSON_BODY_CLASS)
+    if not lesson_body:
+        return None
+
+    # Before building, which decomposes the tree under --low-memory
+    blocks = [tag.name for tag in lesson_body.find_all(HANDLED_TAGS)]
+    doc = build_lesson_document(lesson_body, input_path, spool=spool)
+    return {
+        "blocks": blocks,
+        "paragraphs": [(p.style.name, p.text) for p in doc.paragraphs],
+        "images": len(doc.inline_shapes),
+    }
+
+
+def validate_parsers(filenames):
+    """
+    Convert every lesson in memory with each fast backend and with
+    html5lib, record per page whether the outputs match, and return
+    {filename: {parser: matches}}, with None for pages that failed.
+    """
+    validation = get_parser_validation()
+    results = {}
+
+    for filename in filenames:
+        input_path = str(config.input_folder / filename)
+        try:
+            # The same markup conversion parses, lesson fragment and all
+            spool = new_spool()
+            markup = read_lesson_markup(input_path, spool)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                reference = lesson_signature(markup, "html5lib", input_path, spool)
+                matches = {
+                    parser: lesson_signature(markup, parser, input_path, spool)
+                    == reference
+                    for parser in FAST_PARSERS
+                }
+        except Exception as e:
+            # Left unvalidated, so auto mode keeps it on html5lib
+            print(f"❌ {filename}: {e}")
+            results[filename] = None
             continue
 
-        process_element(block, doc)
+        validation.set(markup_key(markup), matches)
+        results[filename] = matches
+        verdict = ", ".join(
+            f"{parser} {'✅' if ok else '❌'}" for parser, ok in matches.items()
+        )
+        print(f"{filename}: {verdict}")
+
+    validation.save()
+
+    for parser in FAST_PARSERS:
+        agreeing = sum(1 for matches in results.values() if matches and matches[parser])
+        print(f"{parser}: {agreeing}/{len(results)} lessons match html5lib")
+    return results
+
+
+def lesson_title(soup, filename):
+    return (
+        soup.title.string.strip()
+        if soup.title and soup.title.string
+        else filename.replace(".html", "")
+    )
+
+
+def lesson_output_path(soup, filename):
+    """
+    Where a lesson's DOCX is saved: a folder named after the page title.
+    """
+    return title_output_path(lesson_title(soup, filename))
+
+
+def title_output_path(title):
+    lesson_folder_name = safe_filename(title)
+    lesson_folder = str(config.output_folder / lesson_folder_name)
+    return os.path.join(lesson_folder, f"{lesson_folder_name}.docx")
+
+
+def numbered_output_path(output_path, number):
+    """
+    The output path of the `number`th lesson sharing a title.
+    """
+    name = f"{os.path.splitext(os.path.basename(output_path))[0]} ({number})"
+    output_folder = os.path.dirname(os.path.dirname(output_path))
+    return os.path.join(output_folder, name, f"{name}.docx")
+
+
+def peek_output_path(filename):
+    """
+    Where a lesson would be saved, from the <title> at the start of the
+    page. None when it can't be read or the title isn't found there; the
+    conversion then names the lesson itself.
+    """
+    try:
+        with open(config.input_folder / filename, "r", encoding="utf-8") as file:
+            head = file.read(TITLE_PEEK_CHARS)
+    except (OSError, UnicodeDecodeError):
+        # Reported by the conversion
+        return None
+
+    match = TITLE_RE.search(head)
+    if not match:
+        return None
+    # As lesson_title reads it from the parsed page
+    title = match.group(1)
+    title = html.unescape(title).strip() if title else filename.replace(".html", "")
+    return title_output_path(title)
+
+
+class OutputClaims:
+    """
+    Which lesson each output path belongs to. Pages sharing a title
+    would save over each other's DOCX, so the parent hands out the paths
+    before converting: a lesson keeps the path it had in `manifest`, and
+    later lessons with the same title are numbered, "Title (2)".
+    """
+
+    def __init__(self, manifest=None):
+        self.owners = {}
+        for filename, entry in (manifest.entries if manifest else {}).items():
+            if entry.get("output"):
+                self.owners[entry["output"]] = filename
+
+    def claim(self, filename, output_path):
+        candidate = output_path
+        number = 1
+        while self.owners.get(candidate, filename) != filename:
+            number += 1
+            candidate = numbered_output_path(output_path, number)
+        self.owners[candidate] = filename
+        return candidate
+
+    def assign(self, filenames):
+        """
+        Claim output paths for `filenames`, in order.
+        """
+        outputs = {}
+        for filename in filenames:
+            output_path = peek_output_path(filename)
+            if output_path:
+                outputs[filename] = self.claim(filename, output_path)
+        return outputs
+
+
+def new_spool():
+    """
+    The ImageSpool a lesson's inline images go to in --low-memory mode.
+    """
+    if not config.low_memory:
+        return None
+    from harmony_tools.lowmem import ImageSpool
+
+    return ImageSpool()
+
+
+def process_file(filename, image_paths=None, output_path=None):
+    converted = convert_file(filename, image_paths, output_path)
+    return converted["output"] if converted else None
+
+
+def convert_file(filename, image_paths=None, output_path=None):
+    """
+    Convert one lesson, returning its output path and title, or None
+    when the page holds no lesson. The DOCX is saved to `output_path`,
+    or to a folder named after the title without one.
+    """
+    input_path = str(config.input_folder / filename)
+    spool = new_spool()
+
+    with metrics.stage("parse"):
+        soup, parser = parse_lesson(input_path, spool)
+
+    body = soup.body
+    if not body:
+        print(f"Warning: No <body> tag found in {filename}. Skipping.")
+        return None
+
+    title = lesson_title(soup, filename)
+    output_path = output_path or lesson_output_path(soup, filename)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-    output_path = os.path.join(lesson_folder, f"{lesson_folder_name}.docx")
-    doc.save(output_path)
+    with metrics.stage("extract"):
+        lesson_body = soup.find("div", class_=LESSON_BODY_CLASS)
+    if not lesson_body:
+        print(f"Warning: No lesson body found in {filename}. Skipping.")
+        return None
+
+    with metrics.stage("build"):
+        doc = build_lesson_document(lesson_body, input_path, image_paths, spool)
+    if config.low_memory:
+        soup.decompose()
+        del soup, body, lesson_body
+
+    if metrics.enabled:
+        metrics.count("xml.bytes_before", body_xml_size(doc))
+    with metrics.stage("coalesce"):
+        metrics.count("runs.coalesced", coalesce_runs(doc))
+    if metrics.enabled:
+        metrics.count("xml.bytes_after", body_xml_size(doc))
+
+    if config.memory_budget:
+        check_memory_budget(config.memory_budget)
+    with metrics.stage("save"):
+        doc.save(output_path)
     print(f"Saved: {output_path}")
 
+    if not config.keep_inputs:
+        with metrics.stage("move"):
+            move_to_processed(filename)
+
+    return {"output": output_path, "title": title}
+
+
+def move_to_processed(filename):
+    input_path = str(config.input_folder / filename)
     processed_path = str(config.processed_folder / filename)
     shutil.move(input_path, processed_path)
     print(f"Moved: {filename} -> Processed folder")
 
 
+# --- Incremental conversion ---
+def conversion_settings():
+    """
+    Settings that affect the generated DOCX. A change to any of them
+    invalidates every cached conversion.
+    """
+    return {
+        "font": config.font,
+        "nomedia": config.nomedia,
+        "parser": config.parser,
+        "inline_svg": config.inline_svg,
+        "optimize_images": config.optimize_images,
+        "image_dpi": config.image_dpi if config.optimize_images else None,
+        "template": hash_file(config.template) if config.template else None,
+    }
+
+
+def is_up_to_date(entry, content_hash, settings):
+    if not entry:
+        return False
+    if entry.get("hash") != content_hash or entry.get("settings") != settings:
+        return False
+    output = entry.get("output")
+    return output is None or os.path.isfile(output)
+
+
+# --- Batch conversion ---
+def _init_worker(options, metrics_enabled=False):
+    """
+    Load the parent's configuration in a pool worker process.
+    """
+    config.load(force=True, **options)
+    metrics.enabled = metrics_enabled
+
+
+def convert_lesson(filename, image_paths=None, output_path=None):
+    """
+    Convert a single lesson and report the outcome instead of raising,
+    so one broken lesson never takes down the rest of the batch.
+    """
+    metrics.reset()
+    track_memory = config.low_memory or config.memory_budget
+    if track_memory:
+        reset_peak_rss()
+    try:
+        converted = convert_file(filename, image_paths, output_path)
+        if converted:
+            # Hashed here, in parallel, for the parent's lesson index
+            lesson = lesson_entry(converted["output"], converted["title"], filename)
+    except MemoryBudgetExceeded as e:
+        print(f"❌ {filename}: {e}")
+        result = {"filename": filename, "status": "failed", "error": str(e)}
+    except Exception as e:
+        traceback.print_exc()
+        result = {"filename": filename, "status": "failed", "error": str(e)}
+    else:
+        if converted is None:
+            result = {"filename": filename, "status": "skipped"}
+        else:
+            result = {
+                "filename": filename,
+                "status": "converted",
+                "output": converted["output"],
+                "lesson": lesson,
+            }
+    finally:
+        get_image_cache().flush_stats()
+
+    if track_memory:
+        result["peak_rss"] = peak_rss()
+    if config.optimize_images:
+        result["image_savings"] = take_savings()
+    if metrics.enabled:
+        result["metrics"] = metrics.snapshot()
+    return result
+
+
+def create_pool(jobs, options=None):
+    return ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        # Without options, workers load the configuration of the parent
+        initargs=(options or config.options(), metrics.enabled),
+    )
+
+
+def convert_all(
+    filenames, jobs=1, options=None, on_result=None, pool=None, claims=None
+):
+    """
+    Convert lessons serially or across a process pool of `jobs` workers,
+    or on an already running `pool`. Results are returned in the same
+    order as `filenames`; `on_result` is called with each result as soon
+    as it is available. Output paths are handed out by `claims`.
+    """
+    results = {}
+    on_result = on_result or (lambda result: None)
+    own_pool = pool is None
+    outputs = (claims or OutputClaims()).assign(filenames)
+
+    if pool is None and (jobs <= 1 or len(filenames) <= 1):
+        for filename in filenames:
+            results[filename] = convert_lesson(filename, None, outputs.get(filename))
+            on_result(results[filename])
+    else:
+        with contextlib.ExitStack() as stack:
+            if pool is None:
+                pool = stack.enter_context(create_pool(jobs, options))
+            futures = {
+                pool.submit(
+                    convert_lesson, filename, None, outputs.get(filename)
+                ): filename
+                for filename in filenames
+            }
+            for future in as_completed(futures):
+                filename = futures[future]
+                try:
+                    results[filename] = future.result()
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool) and not own_pool:
+                        # Every later lesson would fail too; the caller's
+                        # pool has to be replaced
+                        raise
+                    # The worker itself died (e.g. killed by the OOM killer)
+                    results[filename] = {
+                        "filename": filename,
+                        "status": "failed",
+                        "error": str(e),
+                    }
+                on_result(results[filename])
+                status = results[filename]["status"]
+                print(f"[{len(results)}/{len(filenames)}] {filename}: {status}")
+
+    return [results[filename] for filename in filenames]
+
+
+def convert_changed(filenames, jobs=1, options=None, rebuild=False, pool=None):
+    """
+    Convert only lessons whose HTML or conversion settings changed since
+    the last run, as recorded in the workdir's conversion manifest.
+    """
+    manifest = Manifest(config.state_folder / "conversion_manifest.json")
+    lesson_index = get_lesson_index()
+    settings = conversion_settings()
+    hashes = {}
+    cached = {}
+    missing = {}
+    stale = []
+
+    for filename in filenames:
+        try:
+            hashes[filename] = hash_file(config.input_folder / filename)
+            entry = manifest.get(filename)
+            if not rebuild and is_up_to_date(entry, hashes[filename], settings):
+                cached[filename] = {
+                    "filename": filename,
+                    "status": "unchanged",
+                    "output": entry.get("output"),
+                }
+                if not config.keep_inputs:
+                    move_to_processed(filename)
+            else:
+                stale.append(filename)
+        except OSError as e:
+            # Deleted or renamed since it was listed, e.g. by the watcher
+            print(f"❌ {filename}: {e}")
+            missing[filename] = {
+                "filename": filename,
+                "status": "failed",
+                "error": str(e),
+            }
+
+    print(f"{len(stale)} lessons to convert, {len(cached)} unchanged.")
+
+    def record(result):
+        if result["status"] in ("converted", "skipped"):
+            manifest.set(
+                result["filename"],
+                {
+                    "hash": hashes[result["filename"]],
+                    "settings": settings,
+                    "output": result.get("output"),
+                },
+            )
+        if "lesson" in result:
+            lesson_index.set(result["output"], result["lesson"])
+
+    try:
+        converted = convert_all(
+            stale,
+            jobs=jobs,
+            options=options,
+            on_result=record,
+            pool=pool,
+            claims=OutputClaims(manifest),
+        )
+    finally:
+        manifest.save()
+        lesson_index.save()
+
+    results = {r["filename"]: r for r in converted}
+    results.update(cached)
+    results.update(missing)
+    return [results[filename] for filename in filenames]
+
+
+def print_summary(results):
+    counts = {}
+    print("\n📋 Summary")
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+        if result["status"] == "converted":
+            peak = (
+                f" (peak {format_bytes(result['peak_rss'])})"
+                if result.get("peak_rss")
+                else ""
+            )
+            print(f"  ✅ {result['filename']} -> {result['output']}{peak}")
+        elif result["status"] == "unchanged":
+            print(f"  💤 {result['filename']} (unchanged)")
+        elif result["status"] == "skipped":
+            print(f"  ⏭️  {result['filename']} (skipped)")
+        else:
+            print(f"  ❌ {result['filename']}: {result['error']}")
+
+    print(
+        "\n"
+        + ", ".join(
+            f"{counts.get(status, 0)} {status}"
+            for status in ("converted", "unchanged", "skipped", "failed")
+        )
+        + "."
+    )
+
+
+def convert_batch(filenames, jobs, options, rebuild, pool, requeues=1):
+    """
+    convert_changed on a long-lived `pool`. A pool whose worker died is
+    broken for good, so it is replaced and the lessons the batch hadn't
+    finished are requeued, up to `requeues` times. Returns (results, the
+    pool to keep using).
+    """
+    for attempt in range(requeues + 1):
+        try:
+            return convert_changed(filenames, jobs, options, rebuild, pool=pool), pool
+        except BrokenProcessPool:
+            pool.shutdown(wait=False, cancel_futures=True)
+            pool = create_pool(jobs, options)
+            # Finished lessons are recorded, and moved without --keep-inputs
+            filenames = [f for f in filenames if (config.input_folder / f).exists()]
+            if attempt < requeues:
+                print(
+                    f"⚠️ A worker process died, restarting the pool and "
+                    f"requeueing {len(filenames)} lessons"
+                )
+
+    print("❌ Worker processes keep dying on this batch, giving up on it")
+    failed = [
+        {"filename": f, "status": "failed", "error": "worker process died"}
+        for f in filenames
+    ]
+    return failed, pool
+
+
+def watch_inputs(
+    jobs=1,
+    options=None,
+    rebuild=False,
+    interval=DEFAULT_INTERVAL,
+    debounce=DEFAULT_DEBOUNCE,
+    stop=None,
+):
+    """
+    Convert lessons as they land in the input folder until interrupted
+    or `stop` is set. One long-lived process (or pool of workers) keeps
+    imports and caches warm between batches.
+    """
+    watcher = InputWatcher(config.input_folder, debounce=debounce)
+    stop = stop or threading.Event()
+    results = []
+    print(f"👀 Watching {config.input_folder} for lessons (Ctrl+C to stop)")
+
+    pool = create_pool(jobs, options) if jobs > 1 else None
+    try:
+        while not stop.is_set():
+            ready = watcher.poll()
+            if ready:
+                try:
+                    if pool is None:
+                        batch = convert_changed(ready, jobs, options, rebuild)
+                    else:
+                        batch, pool = convert_batch(ready, jobs, options, rebuild, pool)
+                except Exception:
+                    # One bad batch must not stop the watcher
+                    traceback.print_exc()
+                    print(f"❌ Failed to convert a batch of {len(ready)} lessons")
+                    watcher.forget(ready)
+                else:
+                    print_summary(batch)
+                    print_image_savings(batch)
+                    results.extend(batch)
+            stop.wait(interval)
+    except KeyboardInterrupt:
+        print("\n👋 Stopped watching.")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return results
+
+
+def print_image_savings(results):
+    totals = {"images": 0, "bytes_in": 0, "bytes_out": 0}
+    for result in results:
+        for key, value in result.get("image_savings", {}).items():
+            totals[key] += value
+    if not totals["images"]:
+        return
+
+    saved = totals["bytes_in"] - totals["bytes_out"]
+    share = saved / totals["bytes_in"] if totals["bytes_in"] else 0
+    print(
+        f"🗜️  Optimized {totals['images']} images: "
+        f"{format_bytes(totals['bytes_in'])} -> {format_bytes(totals['bytes_out'])} "
+        f"({format_bytes(saved)} saved, {share:.0%})"
+    )
+
+
 @click.command(help="Convert saved Teachable HTML lessons to DOCX")
 @click.option(
     "--nomedia", is_flag=True, default=False, help="Skip downloading and embed images"
 )
 @click.option("--font", default=None, help="Override default font Helvetica")
 @click.option("--workdir", default=None, help="Override default working directory")
-def main(nomedia, font, workdir):
-
-    config.load(workdir)
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of lessons to convert in parallel worker processes",
+)
+@click.option(
+    "--keep-inputs",
+    is_flag=True,
+    default=False,
+    help="Leave source HTML in place instead of moving it to processed_html",
+)
+@click.option(
+    "--rebuild",
+    is_flag=True,
+    default=False,
+    help="Ignore the conversion manifest and rebuild every lesson",
+)
+@click.option(
+    "--image-cache-size",
+    default=DEFAULT_MAX_BYTES // (1024 * 1024),
+    show_default=True,
+    type=click.IntRange(min=0),
+    help="Size limit of the shared image cache in MB",
+)
+@click.option(
+    "--metrics",
+    "metrics_mode",
+    type=click.Choice(["off", "jsonl", "summary"]),
+    default="off",
+    show_default=True,
+    help="Record per-stage timings and counters for every lesson",
+)
+@click.option(
+    "--metrics-file",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Where --metrics jsonl appends records (default: WORKDIR/.harmony/metrics.jsonl)",
+)
+@click.option(
+    "--parser",
+    type=click.Choice(PARSER_BACKENDS + ["auto"]),
+    default="html5lib",
+    show_default=True,
+    help="HTML tree builder; 'auto' uses the fastest one validated for each page",
+)
+@click.option(
+    "--validate-parsers",
+    "validate_only",
+    is_flag=True,
+    default=False,
+    help="Compare the output of every parser backend on the input lessons and exit",
+)
+@click.option(
+    "--full-parse",
+    is_flag=True,
+    default=False,
+    help="Parse the whole saved page instead of just the lesson content",
+)
+@click.option(
+    "--inline-svg",
+    is_flag=True,
+    default=False,
+    help="Rasterize SVG icons inside paragraphs instead of dropping them",
+)
+@click.option(
+    "--optimize-images",
+    is_flag=True,
+    default=False,
+    help="Downscale images to their display size and recompress them",
+)
+@click.option(
+    "--image-dpi",
+    type=click.IntRange(min=36),
+    default=150,
+    show_default=True,
+    help="Target resolution for --optimize-images",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    default=False,
+    help="Keep running and convert lessons as they are saved to the input folder",
+)
+@click.option(
+    "--poll-interval",
+    type=click.FloatRange(min=0.1),
+    default=DEFAULT_INTERVAL,
+    show_default=True,
+    help="Seconds between input folder scans in --watch mode",
+)
+@click.option(
+    "--debounce",
+    type=click.FloatRange(min=0),
+    default=DEFAULT_DEBOUNCE,
+    show_default=True,
+    help="Seconds a file must stay unchanged before --watch converts it",
+)
+@click.option(
+    "--template",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Word template (.dotx or .docx) whose styles and page setup lessons use",
+)
+@click.option(
+    "--low-memory",
+    is_flag=True,
+    default=False,
+    help="Free each part of a lesson once converted and keep images out of memory",
+)
+@click.option(
+    "--memory-budget",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Fail a lesson whose peak memory goes past this many MB (0: no limit)",
+)
+def main(
+    nomedia,
+    font,
+    workdir,
+    jobs,
+    keep_inputs,
+    rebuild,
+    image_cache_size,
+    metrics_mode,
+    metrics_file,
+    parser,
+    validate_only,
+    full_parse,
+    inline_svg,
+    optimize_images,
+    image_dpi,
+    watch,
+    poll_interval,
+    debounce,
+    template,
+    low_memory,
+    memory_budget,
+):
+
+    options = {
+        "workdir": workdir,
+        "font": font,
+        "nomedia": nomedia,
+        "keep_inputs": keep_inputs,
+        "parser": parser,
+        "full_parse": full_parse,
+        "inline_svg": inline_svg,
+        "optimize_images": optimize_images,
+        "image_dpi": image_dpi,
+        "template": template,
+        "low_memory": low_memory,
+        "memory_budget": memory_budget,
+    }
+    config.load(**options)
+    options["workdir"] = config.workdir
+    metrics.enabled = metrics_mode != "off"
+
+    filenames = sorted(path.name for path in config.input_folder.glob("*.html"))
+
+    if validate_only:
+        validate_parsers(filenames)
+        return
 
-    for file_path in config.input_folder.glob("*.html"):
-        process_file(file_path.name)
+    if watch:
+        results = watch_inputs(
+            jobs, options, rebuild, interval=poll_interval, debounce=debounce
+        )
+    else:
+        results = convert_changed(
+            filenames, jobs=jobs, options=options, rebuild=rebuild
+        )
+        print_summary(results)
+        print_image_savings(results)
+
+    if metrics_mode == "jsonl":
+        metrics_file = metrics_file or config.state_folder / "metrics.jsonl"
+        write_jsonl(results, metrics_file)
+        print(f"\n📈 Metrics appended to {metrics_file}")
+    elif metrics_mode == "summary":
+        print_summary_table(results)
+
+    removed, freed = get_image_cache().evict(image_cache_size * 1024 * 1024)
+    if removed:
+        print(f"🧹 Evicted {removed} cached images ({format_bytes(freed)})")
 
     print("\nAll lessons processed!")
 
+    if any(r["status"] == "failed" for r in results):
+        raise SystemExit(1)
+
 
 if __name__ == "__main__":
     print("🔔 RUNNING HTML --> DOCX SCRIPT")
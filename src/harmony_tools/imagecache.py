@@ -0,0 +1,303 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+import os
+import json
+import time
+import click
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+from harmony_tools.config import config
+from harmony_tools.manifest import hash_bytes, write_json_atomic
+
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+
+
+class ImageCache:
+    """
+    Content-addressed image store shared by every lesson in a workdir.
+
+    Image bytes live under objects/ named by their SHA-256, so an image
+    used by many lessons (or served from several URLs) is stored once.
+    urls/ maps each URL to its object plus the ETag/Last-Modified
+    validators, letting later runs revalidate with a conditional GET
+    instead of downloading again. Object mtimes track last use for LRU
+    eviction.
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.objects_folder = self.root / "objects"
+        self.urls_folder = self.root / "urls"
+        self.stats_file = self.root / "stats.jsonl"
+        self.max_bytes = max_bytes
+        self._resolved = {}
+        self._lock = threading.Lock()
+        self._reset_counters()
+
+        for folder in [self.objects_folder, self.urls_folder]:
+            folder.mkdir(parents=True, exist_ok=True)
+
+    def _reset_counters(self):
+        self.counters = {
+            "hits": 0,
+            "revalidated": 0,
+            "misses": 0,
+            "errors": 0,
+            "bytes_downloaded": 0,
+        }
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.counters[key] += amount
+
+    def object_path(self, digest):
+        return self.objects_folder / digest[:2] / digest
+
+    def _url_meta_path(self, url):
+        return (
+            self.urls_folder / f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json"
+        )
+
+    def _read_url_meta(self, url):
+        try:
+            with self._url_meta_path(url).open() as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def put(self, data):
+        """
+        Store bytes under their content hash and return the object path.
+        """
+        digest = hash_bytes(data)
+        path = self.object_path(digest)
+        if path.exists():
+            self._touch(path)
+            return path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # One temp file per writer: prefetch threads may store the same bytes
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{digest}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            os.remove(tmp_path)
+            if not path.exists():
+                raise
+            # Another writer stored the same content first
+            self._touch(path)
+        return path
+
+    def fetch(self, url, session=None):
+        """
+        Return a local path holding the image at `url`, downloading it only
+        when no valid cached copy exists. Returns None on failure.
+        """
+        parsed = urlparse(url)
+        if parsed.scheme == "file":
+            local_path = url2pathname(parsed.path)
+            return local_path if os.path.isfile(local_path) else None
+
+        # Already resolved during this run: no network, no index lookup
+        path = self._resolved.get(url)
+        if path and path.exists():
+            self._count("hits")
+            self._touch(path)
+            return path
+
+        meta = self._read_url_meta(url)
+        cached_path = self.object_path(meta["sha256"]) if meta else None
+        headers = {}
+        if cached_path and cached_path.exists():
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        if session is None:
+            import requests as session
+
+        try:
+            response = session.get(url, headers=headers, timeout=10)
+            if response.status_code == 304 and headers:
+                self._count("revalidated")
+                self._touch(cached_path)
+                self._resolved[url] = cached_path
+                return cached_path
+            response.raise_for_status()
+        except Exception as e:
+            self._count("errors")
+            print(f"Failed to download image {url}: {e}")
+            return None
+
+        data = response.content
+        path = self.put(data)
+        write_json_atomic(
+            self._url_meta_path(url),
+            {
+                "url": url,
+                "sha256": path.name,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "size": len(data),
+            },
+        )
+        self._count("misses")
+        self._count("bytes_downloaded", len(data))
+        self._resolved[url] = path
+        return path
+
+    def flush_stats(self):
+        """
+        Append this process's counters to the shared stats log and reset
+        them. Appending keeps concurrent workers from clobbering each other.
+        """
+        if not any(self.counters.values()):
+            return
+        with self._lock:
+            line = json.dumps({"time": time.time(), **self.counters})
+            self._reset_counters()
+        with self.stats_file.open("a") as f:
+            f.write(line + "\n")
+
+    def _objects(self):
+        for entry in os.scandir(self.objects_folder):
+            if not entry.is_dir():
+                continue
+            for obj in os.scandir(entry.path):
+                if obj.is_file() and not obj.name.startswith("."):
+                    yield obj
+
+    def usage(self):
+        count = 0
+        total = 0
+        for obj in self._objects():
+            count += 1
+            total += obj.stat().st_size
+        return count, total
+
+    def evict(self, max_bytes=None):
+        """
+        Delete least recently used objects until the store fits in
+        `max_bytes`. Returns (objects_removed, bytes_freed).
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        objects = [
+            (obj.stat().st_mtime, obj.stat().st_size, obj.path)
+            for obj in self._objects()
+        ]
+        total = sum(size for _, size, _ in objects)
+
+        removed = 0
+        freed = 0
+        for _, size, path in sorted(objects):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            freed += size
+            removed += 1
+
+        self._resolved.clear()
+        return removed, freed
+
+    def stats(self):
+        totals = {key: 0 for key in self.counters}
+        try:
+            with self.stats_file.open() as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    for key in totals:
+                        totals[key] += record.get(key, 0)
+        except FileNotFoundError:
+            pass
+
+        totals["objects"], totals["bytes_stored"] = self.usage()
+        return totals
+
+
+_cache = None
+
+
+def get_image_cache():
+    """
+    Return the image cache for the configured workdir, creating it on
+    first use in this process.
+    """
+    global _cache
+    root = config.state_folder / "image_cache"
+    if _cache is None or _cache.root != root:
+        _cache = ImageCache(root)
+    return _cache
+
+
+def format_bytes(size):
+    if size < 1024:
+        return f"{size} B"
+    for unit in ["KB", "MB", "GB"]:
+        size /= 1024
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}"
+
+
+@click.group(help="Inspect and maintain the shared image cache")
+@click.option("--workdir", default=None, help="Override default working directory")
+def main(workdir):
+    config.load(workdir)
+
+
+@main.command(help="Report image cache hit/miss statistics")
+def stats():
+    totals = get_image_cache().stats()
+    lookups = totals["hits"] + totals["revalidated"] + totals["misses"]
+    hit_rate = (totals["hits"] + totals["revalidated"]) / lookups if lookups else 0
+
+    rows = [
+        ("Lookups", lookups),
+        ("Hits", totals["hits"]),
+        ("Revalidated (304)", totals["revalidated"]),
+        ("Misses", totals["misses"]),
+        ("Errors", totals["errors"]),
+        ("Hit rate", f"{hit_rate:.1%}"),
+        ("Downloaded", format_bytes(totals["bytes_downloaded"])),
+        ("Stored images", totals["objects"]),
+        ("Stored size", format_bytes(totals["bytes_stored"])),
+    ]
+    for label, value in rows:
+        print(f"{label + ':':<20}{value}")
+
+
+@main.command(help="Evict least recently used images down to a size limit")
+@click.option(
+    "--max-size",
+    default=DEFAULT_MAX_BYTES // (1024 * 1024),
+    show_default=True,
+    type=click.IntRange(min=0),
+    help="Cache size limit in MB",
+)
+def prune(max_size):
+    removed, freed = get_image_cache().evict(max_size * 1024 * 1024)
+    print(f"🧹 Removed {removed} images, freed {format_bytes(freed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+import io
+import threading
+from harmony_tools.config import config
+from harmony_tools.instrument import metrics
+from harmony_tools.manifest import BlobCache, hash_bytes
+
+DEFAULT_DPI = 150
+JPEG_QUALITY = 85
+# PNGs with more distinct colours than this are treated as photographs
+PHOTO_MIN_COLORS = 4096
+
+_savings = {"images": 0, "bytes_in": 0, "bytes_out": 0}
+_savings_lock = threading.Lock()
+
+
+def target_size(image_size, width_inches, height_inches, dpi):
+    """
+    Pixel size an image needs to look sharp at its display size, or None
+    when it is already no bigger than that.
+    """
+    width, height = image_size
+    if width_inches:
+        scale = width_inches * dpi / width
+    elif height_inches:
+        scale = height_inches * dpi / height
+    else:
+        return None
+    if height_inches and width_inches:
+        scale = max(scale, height_inches * dpi / height)
+    if scale >= 1:
+        return None
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def is_photographic(image):
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        extrema = image.getchannel("A").getextrema() if "A" in image.mode else None
+        if extrema is None or extrema[0] < 255:
+            return False
+    return image.getcolors(maxcolors=PHOTO_MIN_COLORS) is None
+
+
+def optimize_image(data, width_inches=None, height_inches=None, dpi=DEFAULT_DPI):
+    """
+    Downscale image bytes to `dpi` at their display size, re-encode
+    photographic PNGs as JPEG and drop metadata. Returns the original
+    bytes whenever that does not make them smaller.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.format not in ("PNG", "JPEG") or getattr(image, "n_frames", 1) > 1:
+            return data
+        source_format = image.format
+
+        image = ImageOps.exif_transpose(image)
+        size = target_size(image.size, width_inches, height_inches, dpi)
+        if size:
+            image = image.resize(size, Image.LANCZOS)
+
+        as_jpeg = source_format == "JPEG" or (
+            image.mode in ("RGB", "RGBA", "P", "L") and is_photographic(image)
+        )
+        output = io.BytesIO()
+        if as_jpeg:
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            image.save(output, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        else:
+            image.save(output, format="PNG", optimize=True)
+    except Exception as e:
+        print(f"Could not optimize image: {e}")
+        return data
+
+    optimized = output.getvalue()
+    return optimized if len(optimized) < len(data) else data
+
+
+def _record(bytes_in, bytes_out):
+    with _savings_lock:
+        _savings["images"] += 1
+        _savings["bytes_in"] += bytes_in
+        _savings["bytes_out"] += bytes_out
+
+
+def take_savings():
+    """
+    Return and reset the byte savings recorded in this process.
+    """
+    with _savings_lock:
+        savings = dict(_savings)
+        for key in _savings:
+            _savings[key] = 0
+    return savings
+
+
+_cache = None
+
+
+def get_optimized_cache():
+    global _cache
+    root = config.state_folder / "optimized_images"
+    if _cache is None or _cache.root != root:
+        _cache = BlobCache(root, max_entries=128)
+    return _cache
+
+
+def optimized_image(data, width_inches=None, height_inches=None):
+    """
+    Optimized version of image bytes for the given display size, cached
+    by content hash so repeated images are only recompressed once.
+    """
+    dpi = config.image_dpi
+    size = f"{width_inches or 0:.3f}x{height_inches or 0:.3f}"
+    key = hash_bytes(f"{hash_bytes(data)}|{size}@{dpi}".encode())
+    cache = get_optimized_cache()
+
+    optimized, _ = cache.get(key)
+    if optimized is None:
+        metrics.count("images.optimized")
+        with metrics.stage("image.optimize"):
+            optimized = optimize_image(data, width_inches, height_inches, dpi)
+        # An empty entry records that the original was already best
+        cache.put(key, b"" if optimized is data else optimized)
+
+    optimized = optimized or data
+    _record(len(data), len(optimized))
+    return optimized
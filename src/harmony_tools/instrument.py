@@ -0,0 +1,176 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+import sys
+import json
+import time
+from contextlib import nullcontext
+
+_DISABLED = nullcontext()
+
+
+class _Stage:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        timings = self.metrics.timings
+        calls = self.metrics.calls
+        timings[self.name] = timings.get(self.name, 0.0) + elapsed
+        calls[self.name] = calls.get(self.name, 0) + 1
+        return False
+
+
+class Metrics:
+    """
+    Per-lesson stage timings and counters.
+
+    Disabled by default: stage() then hands back one shared no-op context
+    manager and count() returns immediately, so instrumented code costs
+    next to nothing unless a run asks for metrics.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.timings = {}
+        self.calls = {}
+        self.counters = {}
+
+    def stage(self, name):
+        if not self.enabled:
+            return _DISABLED
+        return _Stage(self, name)
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        return {
+            "timings": {name: round(t, 6) for name, t in self.timings.items()},
+            "calls": dict(self.calls),
+            "counters": dict(self.counters),
+        }
+
+
+# Global singleton instance
+metrics = Metrics()
+
+
+# --- Memory ---
+class MemoryBudgetExceeded(RuntimeError):
+    pass
+
+
+def reset_peak_rss():
+    """
+    Restart the kernel's count of this process's peak resident memory, so
+    peak_rss() covers only what follows. Pool workers convert many
+    lessons; without this every lesson would report the largest so far.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    """
+    Peak resident memory in bytes since reset_peak_rss(), or over the
+    process's lifetime where that can't be reset. None if unknown.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def check_memory_budget(budget):
+    """
+    Raise MemoryBudgetExceeded once peak memory has gone past `budget`
+    bytes, so a lesson is given up on before it takes the worker past
+    its container's limit.
+    """
+    peak = peak_rss()
+    if budget and peak and peak > budget:
+        raise MemoryBudgetExceeded(
+            f"peak memory {peak / 2**20:.0f} MB exceeds the "
+            f"{budget / 2**20:.0f} MB budget"
+        )
+    return peak
+
+
+def write_jsonl(results, path):
+    """
+    Append one JSON line per lesson result that carries metrics.
+    """
+    with open(path, "a") as f:
+        for result in results:
+            if "metrics" in result:
+                record = {
+                    "time": time.time(),
+                    "filename": result["filename"],
+                    "status": result["status"],
+                    **result["metrics"],
+                }
+                f.write(json.dumps(record) + "\n")
+
+
+def aggregate(results):
+    """
+    Sum stage timings, call counts and counters across lesson results.
+    """
+    totals = {"lessons": 0, "timings": {}, "calls": {}, "counters": {}}
+    for result in results:
+        snapshot = result.get("metrics")
+        if not snapshot:
+            continue
+        totals["lessons"] += 1
+        for section in ["timings", "calls", "counters"]:
+            for name, value in snapshot[section].items():
+                totals[section][name] = totals[section].get(name, 0) + value
+    return totals
+
+
+def print_summary_table(results):
+    totals = aggregate(results)
+    lessons = totals["lessons"]
+    if not lessons:
+        return
+
+    print(f"\n⏱️  Stage timings over {lessons} lessons")
+    print(f"{'stage':<20}{'total s':>10}{'s/lesson':>10}{'calls':>10}")
+    for name, seconds in sorted(totals["timings"].items(), key=lambda kv: -kv[1]):
+        print(
+            f"{name:<20}{seconds:>10.3f}{seconds / lessons:>10.4f}"
+            f"{totals['calls'][name]:>10}"
+        )
+
+    if totals["counters"]:
+        print(f"\n{'counter':<30}{'total':>10}")
+        for name, value in sorted(totals["counters"].items()):
+            print(f"{name:<30}{value:>10}")
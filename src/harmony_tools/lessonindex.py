@@ -0,0 +1,126 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+import os
+import re
+from harmony_tools.config import config
+from harmony_tools.manifest import Manifest, hash_docx
+
+DIGITS_RE = re.compile(r"(\d+)")
+
+
+def is_lesson_file(name):
+    """
+    .docx files that are lessons, not Word's ~$ lock files or the hidden
+    temp files of interrupted saves.
+    """
+    return name.lower().endswith(".docx") and not name.startswith(("~$", "."))
+
+
+def natural_key(name):
+    """
+    Sort key comparing runs of digits as numbers, so "Lesson 9" comes
+    before "Lesson 10".
+    """
+    return [
+        int(part) if part.isdigit() else part for part in DIGITS_RE.split(name.lower())
+    ]
+
+
+def get_lesson_index():
+    """
+    Lessons saved by html2doc, keyed by DOCX path.
+    """
+    return Manifest(config.state_folder / "lesson_index.json")
+
+
+def lesson_entry(path, title=None, source=None, stat=None, content_hash=True):
+    stat = stat or os.stat(path)
+    return {
+        "path": path,
+        "title": title or os.path.splitext(os.path.basename(path))[0],
+        "source": source,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": hash_docx(path) if content_hash else None,
+    }
+
+
+def is_current(entry, stat):
+    return (
+        entry is not None
+        and entry["size"] == stat.st_size
+        and entry["mtime_ns"] == stat.st_mtime_ns
+    )
+
+
+def lesson_hashes(docx_files):
+    """
+    Content hash of every lesson, taken from the index when it is
+    current and computed otherwise.
+    """
+    index = get_lesson_index()
+    hashes = []
+    for path in docx_files:
+        entry = index.get(os.path.abspath(path))
+        if entry and entry["hash"] and is_current(entry, os.stat(path)):
+            hashes.append(entry["hash"])
+        else:
+            hashes.append(hash_docx(path))
+    return hashes
+
+
+def _scan_lessons(folder):
+    """
+    (path, stat) of every lesson file under `folder`, from os.scandir and
+    the stat results of its entries.
+    """
+    found = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                # Not hidden ones, such as merge_tree's temp folder
+                if not entry.name.startswith("."):
+                    found.extend(_scan_lessons(entry.path))
+            elif entry.is_file() and is_lesson_file(entry.name):
+                found.append((entry.path, entry.stat()))
+    return found
+
+
+def scan_lessons(folder_path, index=None):
+    """
+    The lessons in `folder_path` as [(entry, stat)], with their entries
+    read from the index.
+
+    The tree is listed with os.scandir and each file is stat'ed once
+    through its directory entry; the stat results confirm the indexed
+    entries and are handed back for sorting. Files the index doesn't
+    know (converted before it existed, or copied in by hand) are added
+    to it, and entries whose files are gone are dropped.
+    """
+    index = index or get_lesson_index()
+    folder_path = os.path.abspath(folder_path)
+    lessons = _scan_lessons(folder_path)
+
+    found = {path for path, _ in lessons}
+    for path in list(index.entries):
+        if path.startswith(folder_path + os.sep) and path not in found:
+            index.remove(path)
+
+    results = []
+    for path, stat in lessons:
+        entry = index.get(path)
+        if not is_current(entry, stat):
+            # New to the index, or changed outside html2doc: hash unknown
+            entry = lesson_entry(
+                path,
+                entry and entry["title"],
+                entry and entry["source"],
+                stat,
+                content_hash=False,
+            )
+            index.set(path, entry)
+        results.append((entry, stat))
+
+    index.save()
+    return results
@@ -0,0 +1,148 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+import io
+import re
+import base64
+import tempfile
+from docx.image.image import Image
+from docx.package import ImageParts
+from docx.parts.image import ImagePart
+
+# Image bytes of a lesson kept in memory before the spool moves to disk
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+# A multiple of 4, so each chunk of base64 decodes on its own
+DECODE_CHUNK = 256 * 1024
+# Keys stand in for data: URIs, so prefetching skips them like the real thing
+SPOOL_PREFIX = "data:spool,"
+DATA_URI_SRC_RE = re.compile(
+    rb"""(\bsrc\s*=\s*)(["'])data:image/[\w.+-]+;base64,([A-Za-z0-9+/=\s]*)\2""",
+    re.I,
+)
+
+
+class ImageSpool:
+    """
+    The image bytes of one lesson, appended to a single spooled file that
+    stays in memory up to `max_size` bytes and moves to disk past it.
+    Each payload is handed back as a short key to read it by.
+    """
+
+    def __init__(self, max_size=SPOOL_MAX_BYTES):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_size)
+
+    def add(self, data):
+        offset = self.file.seek(0, io.SEEK_END)
+        self.file.write(data)
+        return f"{SPOOL_PREFIX}{offset},{len(data)}"
+
+    def decode(self, page, start, end):
+        """
+        Spool the base64 payload page[start:end] a chunk at a time,
+        instead of decoding it into one bytes object next to the page.
+        """
+        offset = self.file.seek(0, io.SEEK_END)
+        carry = b""
+        for chunk_start in range(start, end, DECODE_CHUNK):
+            chunk_end = min(chunk_start + DECODE_CHUNK, end)
+            # Saved pages may wrap the payload; whitespace would misalign chunks
+            chunk = carry + b"".join(page[chunk_start:chunk_end].split())
+            usable = len(chunk) - len(chunk) % 4
+            self.file.write(base64.b64decode(chunk[:usable]))
+            carry = chunk[usable:]
+        if carry:
+            self.file.write(base64.b64decode(carry))
+        return f"{SPOOL_PREFIX}{offset},{self.file.tell() - offset}"
+
+    def read(self, key):
+        _, offset, length = key.split(",")
+        offset, length = int(offset), int(length)
+        self.file.seek(offset)
+        return self.file.read(length)
+
+    def open(self, key):
+        return io.BytesIO(self.read(key))
+
+    def strip_data_uris(self, page):
+        """
+        Move the payloads of <img src="data:..."> into the spool, leaving
+        their keys in the page, so the parsed tree never holds them.
+        """
+
+        def spool_payload(match):
+            key = self.decode(page, match.start(3), match.end(3))
+            quote = match.group(2)
+            return match.group(1) + quote + key.encode("ascii") + quote
+
+        return DATA_URI_SRC_RE.sub(spool_payload, page)
+
+
+def read_without_images(path, spool=None):
+    """
+    Read a saved page with the payloads of its inline images moved into
+    `spool`, or dropped without one. The page is cut down while still
+    raw bytes, so it is never held a second time as text.
+    """
+    with open(path, "rb") as file:
+        page = file.read()
+    if spool is None:
+        page = DATA_URI_SRC_RE.sub(rb"\1\2data:,\2", page)
+    else:
+        page = spool.strip_data_uris(page)
+    # Newlines as reading in text mode would give them
+    return page.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def is_spool_key(src):
+    return src.startswith(SPOOL_PREFIX)
+
+
+class SpooledImagePart(ImagePart):
+    """
+    An image part whose bytes wait in the lesson's spool until the
+    document is saved. python-docx otherwise keeps every image of a
+    lesson in memory, twice while the document is open: in the part and
+    in its Image.
+    """
+
+    def __init__(self, partname, image, spool):
+        # Only the header is kept, add_picture sizes pictures from it
+        header = Image(None, image.filename, image._image_header)
+        super().__init__(partname, image.content_type, None, header)
+        self._sha1 = image.sha1
+        self._spool = spool
+        self._key = spool.add(image.blob)
+
+    @property
+    def blob(self):
+        return self._spool.read(self._key)
+
+    @property
+    def sha1(self):
+        # Compared for every picture added, so don't read the spool back
+        return self._sha1
+
+
+class SpooledImageParts(ImageParts):
+    def __init__(self, spool):
+        super().__init__()
+        self.spool = spool
+
+    def _add_image_part(self, image):
+        partname = self._next_image_partname(image.ext)
+        image_part = SpooledImagePart(partname, image, self.spool)
+        self.append(image_part)
+        return image_part
+
+
+def spool_images(doc, spool):
+    """
+    Have pictures added to `doc` from now on kept in `spool`.
+    """
+    package = doc.part.package
+    image_parts = SpooledImageParts(spool)
+    for image_part in package.image_parts:
+        image_parts.append(image_part)
+    # Package.image_parts is a lazyproperty, cached in the instance dict
+    package.__dict__["image_parts"] = image_parts
+    return doc
@@ -0,0 +1,159 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+import os
+import json
+import hashlib
+import zipfile
+import tempfile
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """
+    Return the SHA-256 hex digest of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_docx(path):
+    """
+    Hash the members of a .docx package rather than the zip file itself.
+    Zip entries carry write timestamps, so two saves of the same document
+    differ byte-for-byte while their contents are identical. Anything
+    that is not a zip package falls back to a plain file hash.
+    """
+    digest = hashlib.sha256()
+    try:
+        with zipfile.ZipFile(path) as package:
+            for name in sorted(package.namelist()):
+                digest.update(name.encode("utf-8") + b"\0")
+                digest.update(hashlib.sha256(package.read(name)).digest())
+    except zipfile.BadZipFile:
+        return hash_file(path)
+    return digest.hexdigest()
+
+
+def write_json_atomic(path, data):
+    """
+    Write JSON to a temp file next to `path` and rename it into place,
+    so an interrupted run never leaves a half-written file behind.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+class Manifest:
+    """
+    A JSON-backed key/value store kept in the working directory. Safe to
+    share between threads of one process.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = self._load()
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def _load(self):
+        try:
+            with self.path.open() as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                return data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable manifest {self.path}: {e}")
+        return {}
+
+    def get(self, key, default=None):
+        return self.entries.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self.entries[key] = value
+            self._dirty = True
+
+    def remove(self, key):
+        with self._lock:
+            if self.entries.pop(key, None) is not None:
+                self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if self._dirty:
+                write_json_atomic(self.path, self.entries)
+                self._dirty = False
+
+
+class BlobCache:
+    """
+    Derived bytes (rendered or recompressed images) keyed by a digest.
+    Entries are kept in a small in-memory LRU and, when a root folder is
+    given, as files shared by later runs and worker processes.
+    """
+
+    def __init__(self, root=None, max_entries=512):
+        self.root = Path(root) if root else None
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if self.root:
+            self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.root / key[:2] / key
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Return (data, tier) with tier "memory" or "disk", or (None, None).
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data, "memory"
+
+        if self.root:
+            try:
+                data = self._path(key).read_bytes()
+            except FileNotFoundError:
+                return None, None
+            self._remember(key, data)
+            return data, "disk"
+        return None, None
+
+    def put(self, key, data, persist=True):
+        self._remember(key, data)
+        if persist and self.root:
+            path = self._path(key)
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
@@ -0,0 +1,625 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+import os
+import time
+import click
+import asyncio
+import threading
+import contextlib
+from harmony_tools import html2doc
+from harmony_tools.config import config
+from harmony_tools.manifest import Manifest, hash_file
+from harmony_tools.imagecache import get_image_cache
+from harmony_tools.lessonindex import get_lesson_index
+from harmony_tools.prefetch import collect_image_urls, prefetch_images
+from harmony_tools.upload2drive import (
+    CHUNK_UNIT,
+    DEFAULT_CHUNK_SIZE,
+    UPLOAD_WORKERS,
+    add_table_of_contents,
+    collect_lesson_files,
+    fetch_file_metadata,
+    get_upload_ledger,
+    load_credentials,
+    print_upload_results,
+    upload_if_changed,
+    upload_lesson,
+)
+
+DEFAULT_QUEUE_SIZE = 4
+FETCH_WORKERS = 2
+# Lessons are only scanned for images and titles, any backend will do
+SCAN_PARSER = "html.parser"
+# Marks the end of a queue's items
+DONE = None
+
+
+class StageStats:
+    """
+    Throughput of one pipeline stage: items handled, seconds spent
+    working on them and seconds spent waiting for room in the next
+    stage's queue (backpressure).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.started = None
+        self.finished = None
+
+    @contextlib.contextmanager
+    def working(self, items=1):
+        start = time.perf_counter()
+        if self.started is None:
+            self.started = start
+        try:
+            yield
+        finally:
+            self.finished = time.perf_counter()
+            self.busy += self.finished - start
+            self.items += items
+
+    async def put(self, queue, item):
+        start = time.perf_counter()
+        await queue.put(item)
+        self.blocked += time.perf_counter() - start
+
+    def report(self):
+        span = self.finished - self.started if self.started is not None else 0.0
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "busy": round(self.busy, 3),
+            "blocked": round(self.blocked, 3),
+            "per_second": round(self.items / span, 2) if span else None,
+        }
+
+
+def print_throughput(reports, elapsed):
+    print(f"\n🚦 Pipeline throughput ({elapsed:.1f}s total)")
+    print(f"{'stage':<10}{'items':>8}{'busy s':>10}{'blocked s':>11}{'items/s':>10}")
+    for report in reports:
+        rate = report["per_second"]
+        print(
+            f"{report['stage']:<10}{report['items']:>8}{report['busy']:>10.3f}"
+            f"{report['blocked']:>11.3f}{'-' if rate is None else f'{rate:.2f}':>10}"
+        )
+
+
+def scan_lesson(filename):
+    """
+    Quick look at a lesson ahead of its conversion: the images it needs
+    and where its DOCX will be saved.
+    """
+    input_path = str(config.input_folder / filename)
+    try:
+        markup = html2doc.read_lesson_markup(input_path)
+    except (OSError, UnicodeDecodeError):
+        # Reported by the build stage
+        return {"urls": [], "output": None}
+
+    soup = html2doc.parse_html(markup, SCAN_PARSER)
+    lesson_body = soup.find("div", class_=html2doc.LESSON_BODY_CLASS)
+    if not soup.body or not lesson_body:
+        return {"urls": [], "output": None}
+
+    return {
+        "urls": [] if config.nomedia else collect_image_urls(lesson_body, input_path),
+        "output": html2doc.lesson_output_path(soup, filename),
+    }
+
+
+class StreamingMerge:
+    """
+    Merge lessons into one document while others are still converting.
+
+    Lessons are appended in file name order, like upload2drive's merge
+    of the output folder, as soon as every lesson sorting before them is
+    ready. The order is only final once every lesson has been scanned,
+    so nothing is appended before seal().
+    """
+
+    def __init__(self, output_path, existing=()):
+        self.output_path = output_path
+        self.paths = set(existing)
+        self.pending = set()
+        self.ready = {}
+        self.order = None
+        self.position = 0
+        self.appended = set()
+        self.master = None
+        self.composer = None
+
+    def expect(self, path):
+        self.paths.add(path)
+        self.pending.add(path)
+
+    def seal(self):
+        self.order = sorted(self.paths, key=lambda path: os.path.basename(path).lower())
+
+    def arrive(self, expected, actual=None):
+        self.pending.discard(expected)
+        self.ready[expected] = actual or expected
+
+    def next_ready(self):
+        """
+        Paths that can be appended now, in merge order.
+        """
+        batch = []
+        while self.order is not None and self.position < len(self.order):
+            path = self.order[self.position]
+            if path in self.pending:
+                break
+            self.position += 1
+            path = self.ready.get(path, path)
+            if path not in self.appended and os.path.isfile(path):
+                self.appended.add(path)
+                batch.append(path)
+        return batch
+
+    def append(self, path):
+        from docx import Document
+        from harmony_tools.composer import LessonComposer
+
+        if self.composer is None:
+            self.master = Document(path)
+            self.composer = LessonComposer(self.master)
+        else:
+            self.master.add_page_break()
+            self.composer.append(Document(path))
+
+    def save(self):
+        if self.composer is None:
+            print("❌ No .docx files found to merge.")
+            return None
+        add_table_of_contents(self.master)
+        self.composer.save(self.output_path)
+        print(f"✅ Merged {len(self.appended)} lessons into: {self.output_path}")
+        return self.output_path
+
+
+class Pipeline:
+    """
+    Convert, merge and upload lessons in one run, with the stages
+    overlapping instead of running one after the other.
+
+    Each lesson moves through parse (scan for images and the output
+    name), fetch (download its images), build (the DOCX conversion) and
+    then either into the merged document or straight to Drive. The
+    stages are connected by bounded queues, so a slow stage holds back
+    the ones before it instead of letting work pile up in memory. CPU
+    work runs on a process pool; downloads, merging and uploads run in
+    threads driven by asyncio.
+    """
+
+    def __init__(
+        self,
+        filenames,
+        jobs=1,
+        options=None,
+        rebuild=False,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        merge=None,
+        upload=None,
+    ):
+        self.filenames = filenames
+        self.jobs = jobs
+        self.options = options or {}
+        self.rebuild = rebuild
+        self.queue_size = queue_size
+        self.merge = merge
+        self.upload = upload
+        self.manifest = Manifest(config.state_folder / "conversion_manifest.json")
+        self.lesson_index = get_lesson_index()
+        self.claims = html2doc.OutputClaims(self.manifest)
+        self.settings = html2doc.conversion_settings()
+        self.stats = {
+            name: StageStats(name)
+            for name in ["parse", "fetch", "build", "merge", "upload"]
+        }
+        self.results = [None] * len(filenames)
+        self.uploads = []
+        self.merged = None
+        self.pool = None
+
+    # --- Stages ---
+    async def parse(self, item):
+        loop = asyncio.get_running_loop()
+        filename = item["filename"]
+        item["hash"] = await asyncio.to_thread(
+            hash_file, config.input_folder / filename
+        )
+        entry = self.manifest.get(filename)
+
+        if not self.rebuild and html2doc.is_up_to_date(
+            entry, item["hash"], self.settings
+        ):
+            item["output"] = entry.get("output")
+            item["result"] = {
+                "filename": filename,
+                "status": "unchanged",
+                "output": item["output"],
+            }
+            if not config.keep_inputs:
+                await asyncio.to_thread(html2doc.move_to_processed, filename)
+        else:
+            item.update(await loop.run_in_executor(self.pool, scan_lesson, filename))
+            if item["output"]:
+                # Handed out here, in file order, so titles can't collide
+                item["output"] = self.claims.claim(filename, item["output"])
+
+        if self.merge and item["output"]:
+            self.merge.expect(item["output"])
+        return item
+
+    async def fetch(self, item):
+        if "result" not in item and item["urls"]:
+            item["image_paths"] = await asyncio.to_thread(
+                prefetch_images, item["urls"], get_image_cache()
+            )
+        return item
+
+    async def build(self, item):
+        if "result" in item:
+            return item
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            self.pool,
+            html2doc.convert_lesson,
+            item["filename"],
+            item.get("image_paths"),
+            item["output"],
+        )
+        if result["status"] in ("converted", "skipped"):
+            self.manifest.set(
+                item["filename"],
+                {
+                    "hash": item["hash"],
+                    "settings": self.settings,
+                    "output": result.get("output"),
+                },
+            )
+        if "lesson" in result:
+            self.lesson_index.set(result["output"], result["lesson"])
+        print(
+            f"[{item['index'] + 1}/{len(self.filenames)}] "
+            f"{item['filename']}: {result['status']}"
+        )
+        item["result"] = result
+        return item
+
+    async def merge_lessons(self, inbox):
+        stats = self.stats["merge"]
+        while True:
+            item = await inbox.get()
+            if item is not DONE:
+                self.results[item["index"]] = item["result"]
+                if item["output"]:
+                    self.merge.arrive(item["output"], item["result"].get("output"))
+            for path in self.merge.next_ready():
+                with stats.working():
+                    await asyncio.to_thread(self.merge.append, path)
+            if item is DONE:
+                break
+
+        with stats.working(items=0):
+            self.merged = await asyncio.to_thread(self.merge.save)
+
+        if self.merged and self.upload:
+            with self.stats["upload"].working():
+                uploaded = await asyncio.to_thread(
+                    upload_if_changed,
+                    self.merged,
+                    get_upload_ledger(),
+                    force=self.upload["force"],
+                    chunksize=self.upload["chunksize"],
+                    service=self.upload["service"],
+                )
+            self.uploads.append(uploaded)
+
+    async def upload_lessons(self, inbox):
+        """
+        Upload every converted lesson as its own Google Doc as soon as it
+        is ready, at most `workers` at a time.
+        """
+        upload = self.upload
+        stats = self.stats["upload"]
+        local = threading.local()
+        ledger = get_upload_ledger()
+        sessions = Manifest(config.state_folder / "upload_sessions.json")
+
+        def thread_http():
+            if not hasattr(local, "http"):
+                local.http = upload["http_factory"]()
+            return local.http
+
+        def send(path):
+            return upload_lesson(
+                path,
+                upload["service"],
+                thread_http(),
+                ledger,
+                sessions,
+                upload["chunksize"],
+                upload["force"],
+            )
+
+        async def upload_one(path):
+            with stats.working():
+                self.uploads.append(await asyncio.to_thread(send, path))
+
+        running = set()
+        while (item := await inbox.get()) is not DONE:
+            result = self.results[item["index"]] = item["result"]
+            if result.get("output"):
+                if len(running) >= upload["workers"]:
+                    # Uploads are the bottleneck: stop taking lessons
+                    _, running = await asyncio.wait(
+                        running, return_when=asyncio.FIRST_COMPLETED
+                    )
+                running.add(asyncio.create_task(upload_one(result["output"])))
+        await asyncio.gather(*running)
+
+        ids = [uploaded["id"] for uploaded in self.uploads if "id" in uploaded]
+        if ids:
+            links = await asyncio.to_thread(
+                fetch_file_metadata, upload["service"], ids, http=thread_http()
+            )
+            print_upload_results(self.uploads, links)
+
+    async def collect(self, inbox):
+        while (item := await inbox.get()) is not DONE:
+            self.results[item["index"]] = item["result"]
+
+    # --- Plumbing ---
+    async def feed(self, outbox):
+        for index, filename in enumerate(self.filenames):
+            await outbox.put({"index": index, "filename": filename, "output": None})
+        await outbox.put(DONE)
+
+    async def stage(self, name, inbox, outbox, work, workers=1):
+        """
+        Pass the items of `inbox` through `work` into `outbox` until
+        DONE, with up to `workers` items in progress.
+        """
+        stats = self.stats[name]
+
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is DONE:
+                    # Leave it for the other workers
+                    await inbox.put(DONE)
+                    return
+                with stats.working():
+                    item = await work(item)
+                await stats.put(outbox, item)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if name == "parse" and self.merge:
+            self.merge.seal()
+        await outbox.put(DONE)
+
+    async def run(self):
+        if self.upload and not self.merge:
+            finish = self.upload_lessons
+        else:
+            finish = self.merge_lessons if self.merge else self.collect
+
+        queues = [asyncio.Queue(self.queue_size) for _ in range(4)]
+        try:
+            with html2doc.create_pool(self.jobs, self.options) as pool:
+                self.pool = pool
+                await asyncio.gather(
+                    self.feed(queues[0]),
+                    self.stage("parse", queues[0], queues[1], self.parse),
+                    self.stage(
+                        "fetch", queues[1], queues[2], self.fetch, FETCH_WORKERS
+                    ),
+                    self.stage("build", queues[2], queues[3], self.build, self.jobs),
+                    finish(queues[3]),
+                )
+        finally:
+            self.manifest.save()
+            self.lesson_index.save()
+            get_image_cache().flush_stats()
+        return self.results
+
+    def throughput(self):
+        return [stats.report() for stats in self.stats.values() if stats.items]
+
+
+def run_pipeline(filenames, **kwargs):
+    """
+    Run a Pipeline to completion and print its throughput, returning the
+    lesson results and the pipeline.
+    """
+    pipeline = Pipeline(filenames, **kwargs)
+    start = time.perf_counter()
+    results = asyncio.run(pipeline.run())
+    elapsed = time.perf_counter() - start
+    print_throughput(pipeline.throughput(), elapsed)
+    return results, pipeline
+
+
+@click.command(help="Convert, merge and upload lessons in one overlapping pipeline")
+@click.option(
+    "--nomedia", is_flag=True, default=False, help="Skip downloading and embed images"
+)
+@click.option("--font", default=None, help="Override default font Helvetica")
+@click.option("--workdir", default=None, help="Override default working directory")
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Worker processes for parsing and conversion",
+)
+@click.option(
+    "--keep-inputs",
+    is_flag=True,
+    default=False,
+    help="Leave source HTML in place instead of moving it to processed_html",
+)
+@click.option(
+    "--rebuild",
+    is_flag=True,
+    default=False,
+    help="Ignore the conversion manifest and rebuild every lesson",
+)
+@click.option(
+    "--parser",
+    type=click.Choice(html2doc.PARSER_BACKENDS + ["auto"]),
+    default="html5lib",
+    show_default=True,
+    help="HTML tree builder used for the conversion",
+)
+@click.option(
+    "--template",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Word template (.dotx or .docx) whose styles and page setup lessons use",
+)
+@click.option(
+    "--low-memory",
+    is_flag=True,
+    default=False,
+    help="Free each part of a lesson once converted and keep images out of memory",
+)
+@click.option(
+    "--memory-budget",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Fail a lesson whose peak memory goes past this many MB (0: no limit)",
+)
+@click.option(
+    "--queue-size",
+    default=DEFAULT_QUEUE_SIZE,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Lessons that may wait between two stages before the earlier one pauses",
+)
+@click.option(
+    "--merged-name",
+    default=None,
+    help="Filename for merged output (default: foldername.docx)",
+)
+@click.option(
+    "--per-lesson",
+    is_flag=True,
+    default=False,
+    help="Upload every lesson as its own Google Doc instead of merging",
+)
+@click.option(
+    "--workers",
+    default=UPLOAD_WORKERS,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Concurrent uploads in --per-lesson mode",
+)
+@click.option(
+    "--chunk-size",
+    default=DEFAULT_CHUNK_SIZE // CHUNK_UNIT,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Resumable upload chunk size, in units of 256 KB",
+)
+@click.option(
+    "--upload/--no-upload",
+    default=True,
+    show_default=True,
+    help="Upload to Google Drive, or stop after converting and merging",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    default=False,
+    help="Upload even if the document is unchanged since the last upload",
+)
+def main(
+    nomedia,
+    font,
+    workdir,
+    jobs,
+    keep_inputs,
+    rebuild,
+    parser,
+    template,
+    low_memory,
+    memory_budget,
+    queue_size,
+    merged_name,
+    per_lesson,
+    workers,
+    chunk_size,
+    upload,
+    force,
+):
+    options = {
+        "workdir": workdir,
+        "font": font,
+        "nomedia": nomedia,
+        "keep_inputs": keep_inputs,
+        "parser": parser,
+        "template": template,
+        "low_memory": low_memory,
+        "memory_budget": memory_budget,
+    }
+    config.load(**options)
+    options["workdir"] = config.workdir
+
+    filenames = sorted(path.name for path in config.input_folder.glob("*.html"))
+
+    drive = None
+    if upload:
+        # Sign in before any work starts, the browser flow can't wait
+        creds = load_credentials()
+        if not creds:
+            return
+
+        from googleapiclient.discovery import build
+        from googleapiclient.http import build_http
+        from google_auth_httplib2 import AuthorizedHttp
+
+        drive = {
+            "service": build("drive", "v3", credentials=creds),
+            "http_factory": lambda: AuthorizedHttp(creds, http=build_http()),
+            "workers": workers,
+            "chunksize": chunk_size * CHUNK_UNIT,
+            "force": force,
+        }
+
+    merge = None
+    if not per_lesson:
+        folder_path = str(config.output_folder)
+        merged_name = (
+            merged_name or os.path.basename(os.path.normpath(folder_path)) + ".docx"
+        )
+        merge = StreamingMerge(
+            config.workdir / merged_name,
+            existing=collect_lesson_files(folder_path),
+        )
+
+    results, _ = run_pipeline(
+        filenames,
+        jobs=jobs,
+        options=options,
+        rebuild=rebuild,
+        queue_size=queue_size,
+        merge=merge,
+        upload=drive,
+    )
+    html2doc.print_summary(results)
+
+    if any(r["status"] == "failed" for r in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
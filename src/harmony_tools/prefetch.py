@@ -0,0 +1,92 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+PREFETCH_WORKERS = 8
+PER_HOST_LIMIT = 4
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+
+
+def create_session(pool_size=PREFETCH_WORKERS, retries=RETRIES, backoff=BACKOFF_FACTOR):
+    """
+    Build a requests Session whose connection pool is large enough for the
+    prefetch workers and which retries transient failures with backoff.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_session = None
+
+
+def get_session():
+    """
+    Return this process's shared session, creating it on first use.
+    """
+    global _session
+    if _session is None:
+        _session = create_session()
+    return _session
+
+
+def collect_image_urls(lesson_body, input_path):
+    """
+    Resolve every <img src> in the lesson to an absolute URL, in document
+    order and without duplicates. Inline data: images are left out.
+    """
+    urls = []
+    seen = set()
+    for img in lesson_body.find_all("img", src=True):
+        src = img["src"]
+        if src.startswith("data:"):
+            continue
+        url = urljoin(f"file://{input_path}", src)
+        if url not in seen:
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+
+def prefetch_images(
+    urls, cache, session=None, max_workers=PREFETCH_WORKERS, per_host=PER_HOST_LIMIT
+):
+    """
+    Download `urls` into `cache` concurrently, allowing at most `per_host`
+    requests in flight to any one host. Returns {url: local path or None}.
+    """
+    if not urls:
+        return {}
+
+    session = session or get_session()
+    host_limits = defaultdict(lambda: threading.BoundedSemaphore(per_host))
+    for url in urls:
+        host_limits[urlparse(url).netloc]
+
+    def fetch(url):
+        with host_limits[urlparse(url).netloc]:
+            path = cache.fetch(url, session=session)
+        return url, str(path) if path else None
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as pool:
+        return dict(pool.map(fetch, urls))
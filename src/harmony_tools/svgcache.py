@@ -0,0 +1,162 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+import os
+import re
+import atexit
+import hashlib
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from harmony_tools.config import config
+from harmony_tools.instrument import metrics
+from harmony_tools.manifest import BlobCache
+
+MEMORY_ENTRIES = 512
+# Spawning a pool only pays off for more than a handful of renders
+POOL_MIN_JOBS = 8
+SVG_NAMESPACES = (
+    'xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"'
+)
+_FAILED = b""
+
+
+def normalize_svg(svg_html):
+    """
+    Canonical form of an SVG snippet: whitespace between tags collapsed
+    and the namespace the rasterizer needs added when it is missing.
+    """
+    svg_html = re.sub(r">\s+<", "><", svg_html.strip())
+    if "<svg" in svg_html and "xmlns=" not in svg_html:
+        svg_html = svg_html.replace("<svg", f"<svg {SVG_NAMESPACES}", 1)
+    return svg_html
+
+
+def render_svg(markup, width=None):
+    """
+    Rasterize normalized SVG markup to PNG bytes, `width` pixels wide
+    (natural size when None). Returns None on failure.
+    """
+    try:
+        # Pulls in playwright; only worth it once an SVG needs rendering
+        import nocairosvg
+
+        return nocairosvg.svg2png(bytestring=markup.encode("utf-8"), output_width=width)
+    except Exception as e:
+        print(f"Failed to convert SVG to PNG: {e}")
+        return None
+
+
+def _render_job(job):
+    return render_svg(*job)
+
+
+class SvgCache:
+    """
+    Rasterized SVGs keyed on normalized markup and target width.
+
+    Icons repeat across every lesson of a course, so each distinct SVG
+    is rendered once and kept in a BlobCache. Failed renders are only
+    remembered in memory, so a later run tries them again. The process
+    pool render_many uses is started once and kept for the whole run.
+    """
+
+    def __init__(self, root=None, max_entries=MEMORY_ENTRIES):
+        self.root = Path(root) if root else None
+        self.blobs = BlobCache(root, max_entries)
+        self._executor = None
+
+    def executor(self, max_workers=None):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count() or 1
+            )
+            atexit.register(self.close)
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @staticmethod
+    def key(markup, width=None):
+        return hashlib.sha256(f"{width}|{markup}".encode("utf-8")).hexdigest()
+
+    def lookup(self, key):
+        """
+        Cached PNG bytes for key, _FAILED for a known bad SVG, or None.
+        """
+        png, tier = self.blobs.get(key)
+        if png is not None:
+            metrics.count("svg.disk_hits" if tier == "disk" else "svg.hits")
+        return png
+
+    def store(self, key, png):
+        self.blobs.put(key, png or _FAILED, persist=bool(png))
+
+    def render(self, svg_html, width=None):
+        """
+        PNG bytes for an SVG snippet, rendering it only on a cache miss.
+        """
+        markup = normalize_svg(svg_html)
+        key = self.key(markup, width)
+        png = self.lookup(key)
+        if png is None:
+            metrics.count("svg.misses")
+            with metrics.stage("svg.render"):
+                png = render_svg(markup, width)
+            self.store(key, png)
+        return png or None
+
+    def render_many(self, svgs, width=None, max_workers=None):
+        """
+        Warm the cache for a batch of SVG snippets. Distinct uncached ones
+        are rendered in the cache's process pool, unless this already is a
+        worker process of a parallel conversion.
+        """
+        pending = {}
+        for svg_html in svgs:
+            markup = normalize_svg(svg_html)
+            key = self.key(markup, width)
+            if key not in pending and self.lookup(key) is None:
+                pending[key] = markup
+        if not pending:
+            return 0
+
+        metrics.count("svg.misses", len(pending))
+        jobs = [(markup, width) for markup in pending.values()]
+        with metrics.stage("svg.render"):
+            pngs = None
+            if len(jobs) >= POOL_MIN_JOBS and multiprocessing.parent_process() is None:
+                try:
+                    pngs = list(self.executor(max_workers).map(_render_job, jobs))
+                except BrokenProcessPool:
+                    # A renderer took its worker down; the next batch gets
+                    # a fresh pool
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = None
+            if pngs is None:
+                pngs = [_render_job(job) for job in jobs]
+
+        for key, png in zip(pending, pngs):
+            self.store(key, png)
+        return len(pending)
+
+
+_cache = None
+
+
+def get_svg_cache():
+    """
+    Return the SVG cache for the configured workdir, creating it on
+    first use in this process.
+    """
+    global _cache
+    root = config.state_folder / "svg_cache"
+    if _cache is None or _cache.root != root:
+        if _cache is not None:
+            _cache.close()
+        _cache = SvgCache(root)
+    return _cache
@@ -0,0 +1,164 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+import io
+import os
+import zipfile
+from functools import lru_cache
+
+CONTENT_TYPES = "[Content_Types].xml"
+TEMPLATE_TYPE = (
+    b"application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml"
+)
+DOCUMENT_TYPE = (
+    b"application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"
+)
+HYPERLINK_COLOR = "0000FF"
+# Point sizes of the headings added to templates that lack them
+HEADING_SIZES = {1: 16, 2: 13, 3: 12}
+LIST_STYLES = ["List Bullet", "List Number"]
+
+
+def template_as_document(path):
+    """
+    Read a .dotx (or .docx) as .docx package bytes. Word templates only
+    differ from documents in the content type of their main part, which
+    python-docx refuses to open.
+    """
+    source = zipfile.ZipFile(path)
+    output = io.BytesIO()
+    with source, zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename == CONTENT_TYPES:
+                data = data.replace(TEMPLATE_TYPE, DOCUMENT_TYPE)
+            target.writestr(item, data)
+    return output.getvalue()
+
+
+def clear_body(doc):
+    """
+    Drop any body content a template carries, keeping the section
+    properties (page size, margins, headers and footers).
+    """
+    body = doc.element.body
+    for child in list(body):
+        if not child.tag.endswith("}sectPr"):
+            body.remove(child)
+
+
+def _heading_format(style):
+    from docx.shared import Pt
+
+    style.paragraph_format.space_after = Pt(6)
+
+
+def _list_format(style):
+    from docx.shared import Inches, Pt
+
+    style.paragraph_format.left_indent = Inches(0.5)
+    style.paragraph_format.space_after = Pt(4)
+
+
+def apply_house_styles(doc):
+    """
+    Heading spacing and list indentation used for lessons, set once on
+    the styles instead of on every paragraph.
+    """
+    for level in [1, 2, 3]:
+        _heading_format(doc.styles[f"Heading {level}"])
+    for name in LIST_STYLES:
+        _list_format(doc.styles[name])
+
+
+def ensure_lesson_styles(doc):
+    """
+    Add the heading and list styles lessons are written with to a
+    template that lacks them. Word leaves styles that were never used
+    out of the templates it saves.
+    """
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+    from docx.shared import Pt
+
+    names = {style.name for style in doc.styles}
+    normal = doc.styles["Normal"]
+
+    for level, size in HEADING_SIZES.items():
+        name = f"Heading {level}"
+        if name in names:
+            continue
+        style = doc.styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+        style.base_style = normal
+        style.next_paragraph_style = normal
+        style.font.bold = True
+        style.font.size = Pt(size)
+        style.paragraph_format.space_before = Pt(12)
+        style.paragraph_format.keep_with_next = True
+        _heading_format(style)
+        # The outline level is what puts headings in the table of contents
+        outline = OxmlElement("w:outlineLvl")
+        outline.set(qn("w:val"), str(level - 1))
+        style.element.get_or_add_pPr().append(outline)
+
+    for name in LIST_STYLES:
+        if name in names:
+            continue
+        style = doc.styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+        style.base_style = normal
+        _list_format(style)
+
+
+def ensure_hyperlink_style(doc):
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.enum.text import WD_UNDERLINE
+    from docx.shared import RGBColor
+
+    if "Hyperlink" in [style.name for style in doc.styles]:
+        return
+    style = doc.styles.add_style("Hyperlink", WD_STYLE_TYPE.CHARACTER)
+    style.font.color.rgb = RGBColor.from_string(HYPERLINK_COLOR)
+    style.font.underline = WD_UNDERLINE.SINGLE
+
+
+@lru_cache(maxsize=4)
+def _prepare(font, template_path, template_mtime_ns):
+    from docx import Document
+
+    if template_path:
+        doc = Document(io.BytesIO(template_as_document(template_path)))
+        clear_body(doc)
+        ensure_lesson_styles(doc)
+    else:
+        doc = Document()
+        apply_house_styles(doc)
+
+    doc.styles["Normal"].font.name = font
+    ensure_hyperlink_style(doc)
+
+    output = io.BytesIO()
+    doc.save(output)
+    return output.getvalue()
+
+
+def prepared_template(font, template_path=None):
+    """
+    Package bytes of the base lesson document: the user's template, or
+    python-docx's default one with the house styles, plus the configured
+    font, a Hyperlink character style and any heading or list style the
+    template lacks. Built once per process and
+    settings; a changed template file is picked up by its mtime.
+    """
+    template_path = str(template_path) if template_path else None
+    mtime_ns = os.stat(template_path).st_mtime_ns if template_path else None
+    return _prepare(font, template_path, mtime_ns)
+
+
+def new_document(font, template_path=None):
+    """
+    A fresh lesson document cloned from the prepared template.
+    """
+    from docx import Document
+
+    return Document(io.BytesIO(prepared_template(font, template_path)))
@@ -2,36 +2,61 @@
 # Copyright (c) 2025 Scott Joiner
 
 import os
+import json
+import math
+import time
 import click
 import pickle
+import random
 import tempfile
-from docx import Document
-from docxcompose.composer import Composer
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from harmony_tools.config import config, SCOPES
+from harmony_tools.manifest import Manifest, hash_docx
+from harmony_tools.lessonindex import lesson_hashes, natural_key, scan_lessons
+
+# python-docx and the Google client libraries take longer to import than
+# most runs take to finish, so they are imported by the functions that
+# need them rather than here.
+
+# Drive requires chunk sizes in multiples of 256 KB
+CHUNK_UNIT = 256 * 1024
+DEFAULT_CHUNK_SIZE = 32 * CHUNK_UNIT
+UPLOAD_RETRIES = 5
+UPLOAD_WORKERS = 4
+BACKOFF_ATTEMPTS = 6
+BACKOFF_BASE_DELAY = 1.0
+DRIVE_BATCH_LIMIT = 100
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+# Courses smaller than this are merged sequentially even with --merge-jobs
+MERGE_TREE_MIN = 32
 
 
 def collect_lesson_files(folder_path, sort_by="name"):
-    lesson_files = []
-    for root, _, files in os.walk(folder_path):
-        for file in files:
-            if file.lower().endswith(".docx"):
-                lesson_files.append(os.path.join(root, file))
+    """
+    Lesson .docx files in `folder_path`, found through the lesson index
+    html2doc keeps, sorted by file name, ctime or source page order.
+    """
+    lessons = scan_lessons(folder_path)
 
     if sort_by == "ctime":
-        lesson_files.sort(key=lambda f: os.path.getctime(f))
+        lessons.sort(key=lambda lesson: lesson[1].st_ctime)
+    elif sort_by == "source":
+        lessons.sort(
+            key=lambda lesson: natural_key(
+                lesson[0]["source"] or os.path.basename(lesson[0]["path"])
+            )
+        )
     else:
-        lesson_files.sort(key=lambda f: os.path.basename(f).lower())
+        lessons.sort(key=lambda lesson: os.path.basename(lesson[0]["path"]).lower())
 
-    return lesson_files
+    return [entry["path"] for entry, _ in lessons]
 
 
 def add_table_of_contents(doc):
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
     paragraph = doc.add_paragraph()
     run = paragraph.add_run()
     fldChar = OxmlElement("w:fldChar")
@@ -53,50 +78,154 @@ def add_table_of_contents(doc):
     run._r.append(fldChar3)
 
 
-def prepare_docs_with_breaks(docx_files):
-    temp_paths = []
-    for i, path in enumerate(docx_files):
-        doc = Document(path)
-        if i != len(docx_files) - 1:
-            doc.add_page_break()
-        temp_fd, temp_path = tempfile.mkstemp(suffix=".docx", prefix=f"lesson_{i}_")
-        os.close(temp_fd)
-        doc.save(temp_path)
-        temp_paths.append(temp_path)
-    return temp_paths
+def compose_lessons(docx_files, restart_numbering=True, restart_first=False):
+    """
+    Stream documents through a single Composer with page breaks between
+    them, so only the output document and one input are in memory at a
+    time. Returns the Composer holding the result.
+
+    Each appended lesson's numbered lists start again at 1. Documents
+    that are merges themselves already carry those restarts, and are
+    composed with `restart_numbering` off. `restart_first` restarts the
+    lists of the first document too, as if it had been appended.
+    """
+    from docx import Document
+    from harmony_tools.composer import LessonComposer
+
+    master = Document(docx_files[0])
+    composer = LessonComposer(master)
+    composer.restart_numbering = restart_numbering
+    if restart_first:
+        for element in master.element.body:
+            composer.restart_first_numbering(master, element)
+
+    for path in docx_files[1:]:
+        master.add_page_break()
+        composer.append(Document(path))
+
+    return composer
 
 
 def merge_with_images(docx_files, output_filename):
+    """
+    Merge lessons into one document, in order, without writing any
+    intermediate copies.
+    """
     if not docx_files:
         print("❌ No .docx files found to merge.")
         return None
 
     print(f"Merging {len(docx_files)} files into {output_filename}...")
-    temp_paths = prepare_docs_with_breaks(docx_files)
 
-    master = Document(temp_paths[0])
-    composer = Composer(master)
+    composer = compose_lessons(docx_files)
+    add_table_of_contents(composer.doc)
+    composer.save(output_filename)
+    print(f"✅ Merged lessons into: {output_filename}")
+
+    return output_filename
 
-    for path in temp_paths[1:]:
-        composer.append(Document(path))
 
-    add_table_of_contents(master)
+def _merge_group(docx_files, output_filename, level=0, first=True):
+    """
+    Merge one group of merge_tree. Lessons are only composed at level 0;
+    a group that doesn't start the merge restarts its first lesson's
+    lists there, as the sequential merge would when appending it.
+    """
+    composer = compose_lessons(
+        docx_files, restart_numbering=level == 0, restart_first=level == 0 and not first
+    )
     composer.save(output_filename)
-    print(f"✅ Merged lessons into: {output_filename}")
+    return output_filename
 
-    # Cleanup temp files
-    for temp_file in temp_paths:
-        try:
-            os.remove(temp_file)
-        except Exception as e:
-            print(f"⚠️ Could not delete temp file {temp_file}: {e}")
 
+def merge_tree(docx_files, output_filename, jobs=2, fan_in=None):
+    """
+    Merge lessons like merge_with_images, but in parallel. Runs of
+    `fan_in` consecutive documents are merged in worker processes, then
+    those results in turn, until few enough are left for one last merge.
+    The order is kept and the table of contents is only added once, to
+    the final document.
+
+    The default of about sqrt(n) lessons per group keeps both the group
+    merges and the final one short, and needs a single extra level.
+    """
+    if fan_in is None:
+        if len(docx_files) < MERGE_TREE_MIN:
+            jobs = 1
+        fan_in = math.ceil(math.sqrt(len(docx_files)))
+    if jobs <= 1 or len(docx_files) <= fan_in:
+        return merge_with_images(docx_files, output_filename)
+
+    print(
+        f"Merging {len(docx_files)} files into {output_filename} "
+        f"with {jobs} workers..."
+    )
+
+    folder = os.path.dirname(os.path.abspath(output_filename))
+    with tempfile.TemporaryDirectory(dir=folder, prefix=".merge-") as tmp:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            paths = list(docx_files)
+            level = 0
+            while len(paths) > fan_in:
+                groups = []
+                outputs = []
+                for start in range(0, len(paths), fan_in):
+                    end = start + fan_in
+                    groups.append(paths[start:end])
+                    outputs.append(os.path.join(tmp, f"{level}-{len(outputs)}.docx"))
+                levels = [level] * len(groups)
+                firsts = [index == 0 for index in range(len(groups))]
+                paths = list(pool.map(_merge_group, groups, outputs, levels, firsts))
+                level += 1
+
+        composer = compose_lessons(paths, restart_numbering=False)
+        add_table_of_contents(composer.doc)
+        composer.save(output_filename)
+
+    print(f"✅ Merged lessons into: {output_filename}")
     return output_filename
 
 
-def upload_to_google_drive(filepath):
+def merge_if_changed(docx_files, output_filename, jobs=1, manifest=None):
+    """
+    merge_tree, unless the output was merged from these very lessons and
+    hasn't been touched since. A merge rewrites the zip's timestamps,
+    which would make an interrupted upload of it start over.
+    """
+    manifest = manifest or Manifest(config.state_folder / "merged_outputs.json")
+    key = os.path.abspath(output_filename)
+    lessons = [
+        [os.path.abspath(path), digest]
+        for path, digest in zip(docx_files, lesson_hashes(docx_files))
+    ]
+
+    recorded = manifest.get(key)
+    if recorded and recorded["lessons"] == lessons and os.path.isfile(key):
+        stat = os.stat(key)
+        if (stat.st_size, stat.st_mtime_ns) == (recorded["size"], recorded["mtime_ns"]):
+            print(f"💤 {output_filename} is up to date")
+            return output_filename
+
+    merged = merge_tree(docx_files, output_filename, jobs=jobs)
+    if merged:
+        stat = os.stat(key)
+        manifest.set(
+            key,
+            {"lessons": lessons, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns},
+        )
+        manifest.save()
+    return merged
+
+
+def load_credentials():
+    """
+    Return Google credentials, refreshing or creating the saved token,
+    or None if credentials.json is missing.
+    """
+    from google.auth.transport.requests import Request
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     creds = None
-    filepath = os.path.abspath(filepath)
 
     if os.path.exists(config.token_file):
         with open(config.token_file, "rb") as token:
@@ -110,7 +239,7 @@ def upload_to_google_drive(filepath):
                 print(
                     "❌ Missing 'credentials.json'. Download it from Google Cloud Console."
                 )
-                return
+                return None
             flow = InstalledAppFlow.from_client_secrets_file(
                 config.google_credentials_path, SCOPES
             )
@@ -119,24 +248,318 @@ def upload_to_google_drive(filepath):
         with open(config.token_file, "wb") as token:
             pickle.dump(creds, token)
 
-    service = build("drive", "v3", credentials=creds)
+    return creds
+
+
+def get_drive_service():
+    """
+    Return an authenticated Drive v3 service, or None if credentials are
+    missing.
+    """
+    from googleapiclient.discovery import build
+
+    creds = load_credentials()
+    if not creds:
+        return None
+    return build("drive", "v3", credentials=creds)
+
+
+def is_rate_limited(error):
+    if error.resp.status == 429:
+        return True
+    if error.resp.status != 403:
+        return False
+    try:
+        errors = json.loads(error.content)["error"]["errors"]
+    except (ValueError, KeyError, TypeError):
+        return False
+    return any(e.get("reason") in RATE_LIMIT_REASONS for e in errors)
+
+
+def with_backoff(call, attempts=BACKOFF_ATTEMPTS, base_delay=BACKOFF_BASE_DELAY):
+    """
+    Run `call`, retrying with exponential backoff and jitter when Drive
+    answers with a rate limit (403/429) or a server error.
+    """
+    from googleapiclient.errors import HttpError
+
+    for attempt in range(attempts):
+        try:
+            return call()
+        except HttpError as e:
+            retriable = is_rate_limited(e) or e.resp.status >= 500
+            if not retriable or attempt == attempts - 1:
+                raise
+            delay = base_delay * 2**attempt + random.uniform(0, base_delay)
+            print(f"⏳ Drive returned {e.resp.status}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def query_upload_status(request, http=None):
+    """
+    Ask Drive how far the resumable upload at request.resumable_uri got,
+    and move `request` on to the first byte it is missing. Returns the
+    upload's response if it had already finished.
+    """
+    from googleapiclient.errors import HttpError
+
+    headers = {
+        "Content-Range": f"bytes */{request.resumable.size()}",
+        "Content-Length": "0",
+    }
+    resp, content = (http or request.http).request(
+        request.resumable_uri, "PUT", headers=headers
+    )
+    if resp.status in (200, 201):
+        return request.postproc(resp, content)
+    if resp.status != 308:
+        raise HttpError(resp, content, uri=request.resumable_uri)
+
+    # "bytes=0-<last byte received>", left out when nothing arrived yet
+    received = resp.get("range")
+    request.resumable_progress = int(received.rsplit("-", 1)[1]) + 1 if received else 0
+    return None
+
+
+def run_resumable_upload(make_request, filepath, sessions=None, http=None):
+    """
+    Drive a resumable upload chunk by chunk, printing progress. The
+    session URI is saved in the workdir after every chunk so an
+    interrupted run resumes from the last byte the server confirmed.
+    """
+    from googleapiclient.errors import HttpError
+
+    sessions = sessions or Manifest(config.state_folder / "upload_sessions.json")
+    # By content, so a re-merge of the same lessons can still resume
+    fingerprint = {"size": os.path.getsize(filepath), "hash": hash_docx(filepath)}
+
+    request = make_request()
+    saved = sessions.get(filepath)
+    resuming = bool(saved and saved.get("fingerprint") == fingerprint)
+    if resuming:
+        request.resumable_uri = saved["uri"]
+        print(f"↩️  Resuming upload of {os.path.basename(filepath)}")
+
+    response = None
+    while response is None:
+        try:
+            if resuming:
+                resuming = False
+                response = query_upload_status(request, http)
+                continue
+            status, response = request.next_chunk(http=http, num_retries=UPLOAD_RETRIES)
+        except HttpError as e:
+            if saved and e.resp.status in (404, 410):
+                print("⚠️ Saved upload session expired, starting over.")
+                sessions.remove(filepath)
+                sessions.save()
+                saved = None
+                request = make_request()
+                continue
+            raise
+
+        if response is None and request.resumable_uri:
+            sessions.set(
+                filepath,
+                {
+                    "uri": request.resumable_uri,
+                    "fingerprint": fingerprint,
+                    "progress": status.resumable_progress if status else 0,
+                },
+            )
+            sessions.save()
+
+        if status:
+            print(
+                f"⬆️  {os.path.basename(filepath)}: {status.progress():.0%} "
+                f"({status.resumable_progress}/{status.total_size} bytes)"
+            )
+
+    sessions.remove(filepath)
+    sessions.save()
+    return response
+
+
+def upload_to_google_drive(
+    filepath,
+    service=None,
+    chunksize=DEFAULT_CHUNK_SIZE,
+    http=None,
+    sessions=None,
+    fields="id,webViewLink",
+    file_id=None,
+):
+    """
+    Upload a .docx as a Google Doc. With `file_id`, the existing Doc's
+    content is replaced in place instead of creating a new file.
+    """
+    from googleapiclient.http import MediaFileUpload
+
+    filepath = os.path.abspath(filepath)
+
+    service = service or get_drive_service()
+    if not service:
+        return None
 
     file_metadata = {
         "name": os.path.splitext(os.path.basename(filepath))[0],
         "mimeType": "application/vnd.google-apps.document",
     }
 
-    media = MediaFileUpload(
-        filepath,
-        mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-    )
+    def make_request():
+        media = MediaFileUpload(
+            filepath,
+            mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            chunksize=chunksize,
+            resumable=True,
+        )
+        if file_id:
+            return service.files().update(
+                fileId=file_id, media_body=media, fields=fields
+            )
+        return service.files().create(
+            body=file_metadata, media_body=media, fields=fields
+        )
+
+    uploaded = run_resumable_upload(make_request, filepath, sessions, http)
+    if "webViewLink" in uploaded:
+        print(f"\n📤 Uploaded to Google Docs: {uploaded.get('webViewLink')}")
+    return uploaded
 
-    uploaded = (
-        service.files()
-        .create(body=file_metadata, media_body=media, fields="id,webViewLink")
-        .execute()
-    )
-    print(f"\n📤 Uploaded to Google Docs: {uploaded.get('webViewLink')}")
+
+def upload_if_changed(filepath, ledger, force=False, **kwargs):
+    """
+    Upload `filepath` unless the ledger shows this exact content was
+    already uploaded. Changed files update their existing Drive file.
+    Returns the upload result with a "skipped" flag.
+    """
+    from googleapiclient.errors import HttpError
+
+    filepath = os.path.abspath(filepath)
+    digest = hash_docx(filepath)
+    entry = ledger.get(filepath) or {}
+
+    if entry.get("hash") == digest and not force:
+        print(f"💤 {os.path.basename(filepath)} unchanged since last upload, skipping")
+        return {"id": entry["file_id"], "skipped": True}
+
+    try:
+        uploaded = upload_to_google_drive(
+            filepath, file_id=entry.get("file_id"), **kwargs
+        )
+    except HttpError as e:
+        if not entry.get("file_id") or e.resp.status != 404:
+            raise
+        print(f"⚠️ {os.path.basename(filepath)} no longer exists in Drive, re-creating")
+        uploaded = upload_to_google_drive(filepath, **kwargs)
+
+    if uploaded:
+        ledger.set(filepath, {"hash": digest, "file_id": uploaded["id"]})
+        ledger.save()
+        uploaded["skipped"] = False
+    return uploaded
+
+
+def get_upload_ledger():
+    return Manifest(config.state_folder / "upload_ledger.json")
+
+
+def fetch_file_metadata(service, file_ids, fields="id,webViewLink", http=None):
+    """
+    Look up metadata for many Drive files using batch requests of up to
+    DRIVE_BATCH_LIMIT calls each. Returns {file_id: metadata}.
+    """
+    metadata = {}
+
+    def collect(request_id, response, exception):
+        if exception is None:
+            metadata[response["id"]] = response
+        else:
+            print(f"⚠️ Could not fetch metadata for {request_id}: {exception}")
+
+    for start in range(0, len(file_ids), DRIVE_BATCH_LIMIT):
+        end = start + DRIVE_BATCH_LIMIT
+        batch = service.new_batch_http_request(callback=collect)
+        for file_id in file_ids[start:end]:
+            batch.add(
+                service.files().get(fileId=file_id, fields=fields), request_id=file_id
+            )
+        with_backoff(lambda: batch.execute(http=http))
+
+    return metadata
+
+
+def upload_lesson(path, service, http, ledger, sessions, chunksize, force=False):
+    """
+    Upload one lesson as its own Google Doc, reporting the outcome
+    instead of raising.
+    """
+    try:
+        uploaded = with_backoff(
+            lambda: upload_if_changed(
+                path,
+                ledger,
+                force=force,
+                service=service,
+                chunksize=chunksize,
+                http=http,
+                sessions=sessions,
+                fields="id",
+            )
+        )
+        return {"path": path, "id": uploaded["id"], "skipped": uploaded["skipped"]}
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+
+
+def print_upload_results(results, links):
+    for result in results:
+        if "id" in result:
+            result["webViewLink"] = links.get(result["id"], {}).get("webViewLink")
+            icon = "💤" if result["skipped"] else "📤"
+            print(f"{icon} {os.path.basename(result['path'])}: {result['webViewLink']}")
+        else:
+            print(f"❌ {os.path.basename(result['path'])}: {result['error']}")
+
+
+def upload_lessons(
+    lesson_paths,
+    service,
+    http_factory=None,
+    workers=UPLOAD_WORKERS,
+    chunksize=DEFAULT_CHUNK_SIZE,
+    force=False,
+):
+    """
+    Upload every lesson as its own Google Doc through one shared service,
+    at most `workers` at a time. httplib2 connections are not thread
+    safe, so each worker thread gets its own from `http_factory`.
+    """
+    if http_factory is None:
+        from googleapiclient.http import build_http as http_factory
+
+    local = threading.local()
+    sessions = Manifest(config.state_folder / "upload_sessions.json")
+    ledger = get_upload_ledger()
+
+    def thread_http():
+        if not hasattr(local, "http"):
+            local.http = http_factory()
+        return local.http
+
+    def upload(path):
+        return upload_lesson(
+            path, service, thread_http(), ledger, sessions, chunksize, force
+        )
+
+    print(f"Uploading {len(lesson_paths)} lessons with {workers} workers...")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(upload, lesson_paths))
+
+    uploaded_ids = [r["id"] for r in results if "id" in r]
+    links = fetch_file_metadata(service, uploaded_ids, http=thread_http())
+    print_upload_results(results, links)
+    return results
 
 
 @click.command(help="Merge and upload DOCX lessons to Google Drive")
@@ -154,25 +577,107 @@ def upload_to_google_drive(filepath):
 )
 @click.option(
     "--sort",
-    type=click.Choice(["name", "ctime"]),
+    type=click.Choice(["name", "ctime", "source"]),
     default="name",
-    help="How to sort lessons: 'name' or 'ctime' (default: name)",
+    help="How to sort lessons: 'name', 'ctime' or 'source' page order (default: name)",
+)
+@click.option(
+    "--chunk-size",
+    default=DEFAULT_CHUNK_SIZE // CHUNK_UNIT,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Resumable upload chunk size, in units of 256 KB",
+)
+@click.option(
+    "--per-lesson",
+    is_flag=True,
+    default=False,
+    help="Upload every lesson as its own Google Doc instead of merging",
+)
+@click.option(
+    "--workers",
+    default=UPLOAD_WORKERS,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Concurrent uploads in --per-lesson mode",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    default=False,
+    help="Upload even if the document is unchanged since the last upload",
 )
-def main(folder_path, merged_name, sort):
+@click.option(
+    "--incremental",
+    is_flag=True,
+    default=False,
+    help="Keep the merged document split by lesson and only re-merge changed lessons",
+)
+@click.option(
+    "--merge-jobs",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Worker processes for a tree merge of large courses (1 merges sequentially)",
+)
+def main(
+    folder_path,
+    merged_name,
+    sort,
+    chunk_size,
+    per_lesson,
+    workers,
+    force,
+    incremental,
+    merge_jobs,
+):
     config.load()
 
     folder_path = folder_path or config.output_folder
 
+    if per_lesson:
+        lesson_paths = collect_lesson_files(folder_path, sort_by=sort)
+        if not lesson_paths:
+            print("❌ No .docx files found to upload.")
+            return
+        creds = load_credentials()
+        if not creds:
+            return
+
+        from googleapiclient.discovery import build
+        from googleapiclient.http import build_http
+        from google_auth_httplib2 import AuthorizedHttp
+
+        upload_lessons(
+            lesson_paths,
+            build("drive", "v3", credentials=creds),
+            http_factory=lambda: AuthorizedHttp(creds, http=build_http()),
+            workers=workers,
+            chunksize=chunk_size * CHUNK_UNIT,
+            force=force,
+        )
+        return
+
     merged_name = (
         merged_name or os.path.basename(os.path.normpath(folder_path)) + ".docx"
     )
     lesson_paths = collect_lesson_files(folder_path, sort_by=sort)
 
     output_path = config.workdir / merged_name
-    merged_file = merge_with_images(lesson_paths, output_path)
+    if incremental:
+        from harmony_tools.deltamerge import merge_delta
+
+        merged_file = merge_delta(lesson_paths, output_path)
+    else:
+        merged_file = merge_if_changed(lesson_paths, output_path, jobs=merge_jobs)
 
     if merged_file:
-        upload_to_google_drive(merged_file)
+        upload_if_changed(
+            merged_file,
+            get_upload_ledger(),
+            force=force,
+            chunksize=chunk_size * CHUNK_UNIT,
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,156 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+from harmony_tools.instrument import metrics
+
+# tag name -> handler(elem, walker)
+BLOCK_HANDLERS = {}
+# div class -> handler(elem, walker), checked in registration order
+CLASS_HANDLERS = {}
+# tag name -> handler(elem, frame, walker)
+INLINE_HANDLERS = {}
+
+
+def register_block_handler(tag, handler):
+    """
+    Handle <tag> elements met in block context with handler(elem, walker).
+    """
+    BLOCK_HANDLERS[tag] = handler
+
+
+def register_class_handler(css_class, handler):
+    """
+    Handle <div> elements carrying css_class, e.g. Teachable's
+    lecture-attachment-type-* wrappers, with handler(elem, walker).
+    Class handlers win over the plain div behaviour of descending into
+    the children.
+    """
+    CLASS_HANDLERS[css_class] = handler
+
+
+def register_inline_handler(tag, handler):
+    """
+    Handle <tag> elements met inside a paragraph with
+    handler(elem, frame, walker). frame.para is the paragraph being
+    filled (None once a block element has interrupted it) and
+    frame.bold/frame.italic the current run formatting.
+    """
+    INLINE_HANDLERS[tag] = handler
+
+
+def ignore(elem, *args):
+    pass
+
+
+def _tag_children(elem):
+    # Strings, comments and CDATA are the nodes without a tag name
+    return (child for child in elem.children if child.name is not None)
+
+
+class Frame:
+    __slots__ = ("children", "visit", "para", "bold", "italic")
+
+    def __init__(self, children, visit=None, para=None, bold=False, italic=False):
+        self.children = children
+        self.visit = visit
+        self.para = para
+        self.bold = bold
+        self.italic = italic
+
+
+class DocumentWalker:
+    """
+    Depth-first traversal of a lesson body into a python-docx Document.
+
+    Work lives on an explicit stack of frames instead of the Python call
+    stack, so deeply nested wrapper divs cost one frame each rather than
+    a recursion level. Handlers push more work with descend(), each(),
+    inline() and defer(); it runs before the rest of the current frame,
+    which keeps the document order of the recursive version.
+    """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.stack = []
+
+    def walk(self, elem):
+        self.block(elem)
+        self.run()
+
+    def run(self):
+        stack = self.stack
+        while stack:
+            frame = stack[-1]
+            if frame.children is None:
+                stack.pop()
+                frame.visit()
+                continue
+
+            child = next(frame.children, None)
+            if child is None:
+                stack.pop()
+            elif frame.visit is None:
+                self._inline_child(child, frame)
+            else:
+                frame.visit(child)
+
+    # --- Block context ---
+    def block(self, elem):
+        if metrics.enabled:
+            metrics.count(f"tag.{elem.name}")
+
+        if elem.name == "div" and CLASS_HANDLERS:
+            elem_classes = elem.get("class", [])
+            for css_class, handler in CLASS_HANDLERS.items():
+                if css_class in elem_classes:
+                    handler(elem, self)
+                    return
+
+        handler = BLOCK_HANDLERS.get(elem.name)
+        if handler is None:
+            # Wrappers and unknown elements: process their children
+            self.descend(elem)
+        else:
+            handler(elem, self)
+
+    def descend(self, elem):
+        self.stack.append(Frame(_tag_children(elem), self.block))
+
+    def each(self, children, visit):
+        """
+        Call visit(child) for every child, interleaved with the work it pushes.
+        """
+        self.stack.append(Frame(iter(children), visit))
+
+    def defer(self, func, *args):
+        """
+        Run func(*args) once the work pushed after this call is done.
+        """
+        self.stack.append(Frame(None, lambda: func(*args)))
+
+    # --- Inline context ---
+    def inline(self, elem, para, bold=False, italic=False):
+        self.stack.append(Frame(iter(elem.contents), None, para, bold, italic))
+
+    def interrupt(self, elem, frame):
+        """
+        A block element inside a paragraph: later inline content of this
+        frame is dropped and elem is handled as a block.
+        """
+        frame.para = None
+        self.block(elem)
+
+    def _inline_child(self, child, frame):
+        if child.name is None:
+            text = child.strip()
+            if text and frame.para:
+                run = frame.para.add_run(text)
+                run.bold = frame.bold
+                run.italic = frame.italic
+            return
+
+        handler = INLINE_HANDLERS.get(child.name)
+        if handler is None:
+            self.interrupt(child, frame)
+        else:
+            handler(child, frame, self)
@@ -0,0 +1,77 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2025 Scott Joiner
+
+import os
+import time
+from pathlib import Path
+
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_INTERVAL = 1.0
+
+
+class InputWatcher:
+    """
+    Polls a folder for new or modified .html files.
+
+    A file is only handed out once its size and mtime have stayed the
+    same for `debounce` seconds, so pages still being written by the
+    browser or scraper are left alone until they are complete. Files
+    that disappear (moved to processed_html) are forgotten, and come
+    back as new if they are saved again.
+    """
+
+    def __init__(self, folder, debounce=DEFAULT_DEBOUNCE, clock=time.time):
+        self.folder = Path(folder)
+        self.debounce = debounce
+        self.clock = clock
+        self._pending = {}
+        self._dispatched = {}
+
+    def scan(self):
+        signatures = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name.endswith(".html") and entry.is_file():
+                    stat = entry.stat()
+                    signatures[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return signatures
+
+    def poll(self):
+        """
+        Return the sorted names of files that are new or changed since
+        they were last handed out and have settled.
+        """
+        now = self.clock()
+        current = self.scan()
+        ready = []
+
+        for name, signature in current.items():
+            if self._dispatched.get(name) == signature:
+                continue
+            size, mtime_ns = signature
+            seen = self._pending.get(name)
+            if seen is None or seen[0] != signature:
+                # Old enough on first sight, e.g. files present at startup
+                settled = now - mtime_ns / 1e9 >= self.debounce
+                self._pending[name] = (signature, now)
+            else:
+                settled = now - seen[1] >= self.debounce
+
+            if settled and size:
+                ready.append(name)
+                self._dispatched[name] = signature
+                del self._pending[name]
+
+        for known in [self._pending, self._dispatched]:
+            for name in [name for name in known if name not in current]:
+                del known[name]
+
+        return sorted(ready)
+
+    def forget(self, names):
+        """
+        Hand `names` out again on the next poll, e.g. after their batch
+        failed.
+        """
+        for name in names:
+            self._dispatched.pop(name, None)
@@ -0,0 +1,153 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import build_http
+
+
+class FakeDriveHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the Drive v3 resumable upload protocol.
+    """
+
+    def _reply(self, status, body=None, headers=None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self):
+        drive = self.server.drive
+        body = self._read_body()
+        if self.path.startswith("/batch/"):
+            return self._reply_batch(body)
+        if "uploadType=resumable" not in self.path:
+            return self._reply(400)
+        with drive.lock:
+            if drive.rate_limit_posts:
+                drive.rate_limit_posts -= 1
+                return self._reply(429, {"error": {"code": 429, "message": "slow"}})
+            drive.sessions_started += 1
+            session_id = str(drive.sessions_started)
+            drive.received[session_id] = b""
+            drive.session_files[session_id] = f"file-{session_id}"
+        location = f"http://{self.headers['Host']}/upload/session/{session_id}"
+        self._reply(200, headers={"Location": location})
+
+    def do_PATCH(self):
+        drive = self.server.drive
+        self._read_body()
+        file_id = self.path.split("?")[0].rsplit("/", 1)[-1]
+        with drive.lock:
+            drive.updates.append(file_id)
+            if file_id in drive.deleted:
+                return self._reply(404, {"error": {"code": 404, "message": "gone"}})
+            drive.sessions_started += 1
+            session_id = str(drive.sessions_started)
+            drive.received[session_id] = b""
+            drive.session_files[session_id] = file_id
+        location = f"http://{self.headers['Host']}/upload/session/{session_id}"
+        self._reply(200, headers={"Location": location})
+
+    def do_PUT(self):
+        drive = self.server.drive
+        session_id = self.path.rsplit("/", 1)[-1]
+        data = self._read_body()
+        content_range = self.headers.get("Content-Range", "")
+        received = drive.received[session_id]
+
+        with drive.lock:
+            drive.puts += 1
+            fail = drive.fail_puts.pop(drive.puts, False)
+        if fail:
+            return self._reply(400, {"error": {"code": 400, "message": "boom"}})
+
+        match = re.match(r"bytes (\d+)-(\d+)/(\d+)", content_range)
+        if match:
+            start, end, total = map(int, match.groups())
+            if start == len(received):
+                received += data
+                drive.received[session_id] = received
+        else:
+            total = int(content_range.rsplit("/", 1)[-1])
+
+        if len(received) >= total:
+            file_id = drive.session_files[session_id]
+            return self._reply(
+                200, {"id": file_id, "webViewLink": f"https://docs/{file_id}"}
+            )
+        headers = {"Range": f"bytes=0-{len(received) - 1}"} if received else {}
+        self._reply(308, headers=headers)
+
+    def _reply_batch(self, body):
+        """
+        Answer a multipart/mixed batch of files.get calls.
+        """
+        drive = self.server.drive
+        drive.batches += 1
+        boundary = "fake_batch_boundary"
+        parts = []
+        for content_id, file_id in re.findall(
+            rb"Content-ID: <([^>]+)>.*?GET /drive/v3/files/([\w-]+)", body, re.S
+        ):
+            payload = json.dumps(
+                {
+                    "id": file_id.decode(),
+                    "webViewLink": f"https://docs/{file_id.decode()}",
+                }
+            )
+            parts.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id.decode()}>\r\n\r\n"
+                "HTTP/1.1 200 OK\r\n"
+                "Content-Type: application/json\r\n\r\n"
+                f"{payload}\r\n"
+            )
+        payload = ("".join(parts) + f"--{boundary}--\r\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/mixed; boundary={boundary}")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeDrive:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions_started = 0
+        self.received = {}
+        self.puts = 0
+        self.fail_puts = {}
+        self.rate_limit_posts = 0
+        self.session_files = {}
+        self.updates = []
+        self.deleted = set()
+        self.batches = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeDriveHandler)
+        self.server.drive = self
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+    def service(self):
+        document = json.loads(get_static_doc("drive", "v3"))
+        document["rootUrl"] = self.url
+        return build_from_document(document, http=build_http())
@@ -0,0 +1,81 @@
+import random
+from harmony_tools import benchmark
+
+
+def test_generate_lesson_kinds_have_lesson_body():
+    for kind in benchmark.LESSON_KINDS:
+        html = benchmark.generate_lesson(kind, 1, random.Random(0))
+        assert "course-mainbar lecture-content" in html
+
+
+def test_benchmark_corpus_times_every_stage():
+    timings = benchmark.benchmark_corpus("text", 2)
+
+    assert [t["stage"] for t in timings] == [
+        "process_file",
+        "process_element",
+        "save_uncoalesced",
+        "coalesce_runs",
+        "save_coalesced",
+        "collect_lesson_files",
+        "merge_with_images",
+        "merge_tree",
+    ]
+    assert all(t["items"] == 2 and t["seconds"] >= 0 for t in timings)
+    assert timings[-2]["output_bytes"] > 0
+    assert timings[-1]["output_bytes"] > 0
+    stages = {t["stage"]: t for t in timings}
+    assert (
+        stages["save_coalesced"]["output_bytes"]
+        <= stages["save_uncoalesced"]["output_bytes"]
+    )
+
+
+def test_measure_reports_the_peak_of_each_stage_alone():
+    _, big = benchmark.measure("big", 1, lambda: len(bytearray(64 * 1024 * 1024)))
+    _, small = benchmark.measure("small", 1, lambda: None)
+
+    if big["peak_rss_mb"] is None:
+        return  # the peak can't be reset on this platform
+    assert small["peak_rss_mb"] < big["peak_rss_mb"] - 32
+
+
+def test_compare_reports_pairs_matching_results():
+    baseline = {
+        "results": [
+            {"kind": "text", "size": 2, "stage": "merge_with_images", "seconds": 2.0}
+        ]
+    }
+    current = {
+        "results": [
+            {"kind": "text", "size": 2, "stage": "merge_with_images", "seconds": 1.0}
+        ]
+    }
+
+    rows = benchmark.compare_reports(baseline, current)
+    assert rows == [(("text", 2, "merge_with_images"), 2.0, 1.0, 0.5)]
+
+
+def test_cli_modules_import_without_heavy_dependencies():
+    for timing in benchmark.benchmark_startup(repeat=1):
+        assert timing["heavy_modules"] == [], timing["stage"]
+        assert timing["seconds"] > 0
+
+
+def test_help_does_not_load_heavy_dependencies():
+    import subprocess
+    import sys
+
+    code = (
+        "import sys\n"
+        "from harmony_tools import html2doc\n"
+        "try:\n"
+        "    html2doc.main(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"print(sorted(set({benchmark.HEAVY_MODULES!r}) & set(sys.modules)))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip().endswith("[]")
@@ -0,0 +1,52 @@
+from harmony_tools import compact, html2doc, template
+
+
+def test_coalescing_merges_runs_and_keeps_text():
+    doc = template.new_document("Helvetica")
+    para = doc.add_paragraph()
+    for text, bold in [("Hello", False), (" ", False), ("there", False)]:
+        para.add_run(text).bold = bold
+    para.add_run(" ")
+    para.add_run("bold").bold = True
+    para.add_run("er").bold = True
+
+    before = compact.body_xml_size(doc)
+    removed = compact.coalesce_runs(doc)
+
+    assert para.text == "Hello there bolder"
+    assert [run.text for run in para.runs] == ["Hello there ", "bolder"]
+    assert [run.bold for run in para.runs] == [False, True]
+    assert removed == 4
+    assert compact.body_xml_size(doc) < before
+
+
+def test_coalescing_leaves_hyperlinks_and_pictures_alone():
+    doc = template.new_document("Helvetica")
+    para = doc.add_paragraph()
+    para.add_run("See")
+    html2doc.add_hyperlink(para, "the docs", "https://example.com")
+    para.add_run("now")
+    tab = para.add_run("x")
+    tab.add_tab()
+
+    assert compact.coalesce_runs(doc) == 0
+    assert para._p.xpath("string(.)") == "Seethe docsnowx"
+
+
+def test_links_share_one_relationship_and_the_hyperlink_style():
+    doc = template.new_document("Helvetica")
+    para = doc.add_paragraph()
+    html2doc.add_hyperlink(para, "one", "https://example.com/a")
+    html2doc.add_hyperlink(para, "two", "https://example.com/a")
+    html2doc.add_hyperlink(para, "three", "https://example.com/b")
+
+    rids = [link.get(compact.R_ID) for link in para._p.iter(f"{compact.W}hyperlink")]
+    assert rids[0] == rids[1] != rids[2]
+    links = [
+        rel.target_ref
+        for rel in doc.part.rels.values()
+        if rel.reltype == compact.HYPERLINK_RELTYPE
+    ]
+    assert sorted(links) == ["https://example.com/a", "https://example.com/b"]
+    styles = para._p.xpath(".//w:hyperlink/w:r/w:rPr/w:rStyle/@w:val")
+    assert styles == [doc.styles["Hyperlink"].style_id] * 3
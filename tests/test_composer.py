@@ -0,0 +1,47 @@
+import io
+import zipfile
+from docx import Document
+from docx.shared import Inches
+from docxcompose.composer import Composer
+from harmony_tools import html2doc, template
+from harmony_tools.benchmark import PIXEL_PNG
+from harmony_tools.composer import LessonComposer
+
+
+def lesson(tmp_path, index):
+    doc = template.new_document("Helvetica")
+    doc.add_heading(f"Lesson {index}", level=1)
+    for item in ["first", "second"]:
+        doc.add_paragraph(item, style="List Number")
+    para = doc.add_paragraph("See ")
+    html2doc.add_hyperlink(para, "the notes", f"https://example.com/{index}")
+    doc.add_picture(io.BytesIO(PIXEL_PNG), width=Inches(1))
+    path = tmp_path / f"lesson{index}.docx"
+    doc.save(path)
+    return path
+
+
+def merge(composer_class, paths, output):
+    master = Document(paths[0])
+    composer = composer_class(master)
+    for path in paths[1:]:
+        master.add_page_break()
+        composer.append(Document(path))
+    composer.save(output)
+    return zipfile.ZipFile(output)
+
+
+def test_lesson_composer_output_matches_docxcompose(tmp_path):
+    paths = [lesson(tmp_path, index) for index in range(3)]
+    # A lesson from a plain document brings styles the others don't have
+    other = Document()
+    other.add_paragraph("Quoted", style="Intense Quote")
+    other.save(tmp_path / "other.docx")
+    paths.append(tmp_path / "other.docx")
+
+    expected = merge(Composer, paths, tmp_path / "expected.docx")
+    merged = merge(LessonComposer, paths, tmp_path / "merged.docx")
+
+    assert sorted(merged.namelist()) == sorted(expected.namelist())
+    for name in expected.namelist():
+        assert merged.read(name) == expected.read(name), name
@@ -0,0 +1,105 @@
+import io
+import os
+from docx import Document
+from docx.shared import Inches
+from PIL import Image
+from harmony_tools import deltamerge, html2doc, template, upload2drive
+from harmony_tools.config import config
+
+
+def png(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), color).save(buffer, format="PNG")
+    buffer.seek(0)
+    return buffer
+
+
+def write_lesson(folder, name, text, color):
+    doc = template.new_document("Helvetica")
+    doc.add_heading(name, level=1)
+    for item in ["one", "two"]:
+        doc.add_paragraph(f"{text} {item}", style="List Number")
+    para = doc.add_paragraph("Read ")
+    html2doc.add_hyperlink(para, "more", f"https://example.com/{text}")
+    doc.add_picture(png(color), width=Inches(1))
+    path = folder / f"{name}.docx"
+    doc.save(path)
+    return str(path)
+
+
+def outline(path):
+    doc = Document(path)
+    body = doc.element.body
+    return {
+        "paragraphs": [(p.style.name, p.text) for p in doc.paragraphs],
+        "images": len(doc.inline_shapes),
+        "image_rels": sum("image" in rel.reltype for rel in doc.part.rels.values()),
+        "link_rels": sum("hyperlink" in rel.reltype for rel in doc.part.rels.values()),
+        "num_ids": set(body.xpath(".//w:numId/@w:val")),
+        "nums": set(doc.part.numbering_part.element.xpath("./w:num/@w:numId")),
+    }
+
+
+def test_merge_delta_splices_changed_lessons(tmp_path, capsys):
+    config.load(tmp_path, force=True)
+    lessons = tmp_path / "lessons"
+    lessons.mkdir()
+    colors = ["red", "orange", "yellow", "purple"]
+    paths = [write_lesson(lessons, f"L{i}", f"text{i}", colors[i]) for i in range(4)]
+    merged = str(tmp_path / "course.docx")
+
+    def check(expected_paths):
+        expected = str(tmp_path / "expected.docx")
+        upload2drive.merge_with_images(expected_paths, expected)
+        got, want = outline(merged), outline(expected)
+        assert got["paragraphs"] == want["paragraphs"]
+        assert got["images"] == want["images"] == got["image_rels"]
+        assert got["link_rels"] == want["link_rels"]
+        # Every list refers to a definition, and splices don't pile them up
+        assert got["num_ids"] <= got["nums"]
+        assert len(got["nums"]) <= len(want["nums"])
+        names = Document(merged).element.body.xpath(".//w:bookmarkStart/@w:name")
+        assert len(names) == len(expected_paths) + 1
+
+    deltamerge.merge_delta(paths, merged)
+    check(paths)
+
+    # An edited lesson is replaced in place
+    write_lesson(lessons, "L2", "edited", color="blue")
+    deltamerge.merge_delta(paths, merged)
+    assert "Spliced 1 lessons" in capsys.readouterr().out
+    check(paths)
+
+    # One lesson removed, one added in the middle
+    os.remove(paths[1])
+    extra = write_lesson(lessons, "L2b", "extra", color="green")
+    paths = [paths[0], paths[2], extra, paths[3]]
+    deltamerge.merge_delta(paths, merged)
+    assert "Spliced 1 lessons" in capsys.readouterr().out
+    check(paths)
+
+    deltamerge.merge_delta(paths, merged)
+    assert "up to date" in capsys.readouterr().out
+
+    # The first lesson carries the document setup: rebuild
+    write_lesson(lessons, "L0", "changed first", "black")
+    deltamerge.merge_delta(paths, merged)
+    assert "Merged lessons" in capsys.readouterr().out
+    check(paths)
+
+
+def test_merge_delta_rebuilds_when_output_changed(tmp_path, capsys):
+    config.load(tmp_path, force=True)
+    paths = [write_lesson(tmp_path, f"L{i}", f"text{i}", "red") for i in range(3)]
+    merged = str(tmp_path / "course.docx")
+    deltamerge.merge_delta(paths, merged)
+
+    # Overwritten by a plain merge: the recorded segments are gone
+    upload2drive.merge_with_images(paths, merged)
+    write_lesson(tmp_path, "L1", "edited", "blue")
+    capsys.readouterr()
+    deltamerge.merge_delta(paths, merged)
+
+    assert "Merged lessons" in capsys.readouterr().out
+    texts = [p.text for p in Document(merged).paragraphs]
+    assert "edited one" in texts
@@ -26,3 +26,278 @@ def test_process_file_creates_output(monkeypatch):
         # Expected behavior is a folder is created based on the name of the html doc
         expected_doc = str(config.output_folder / "test" / "test.docx")
         assert os.path.isfile(expected_doc)
+
+
+def test_convert_all_parallel_reports_each_lesson(tmp_path):
+    config.load(tmp_path, force=True)
+
+    for name in ["b.html", "a.html"]:
+        (config.input_folder / name).write_text(
+            "<html><head><title>" + name[0] + "</title></head><body>"
+            "<div class='course-mainbar lecture-content'><p>Hi</p></div></body></html>"
+        )
+    # Invalid UTF-8 makes this lesson fail without stopping the batch
+    (config.input_folder / "broken.html").write_bytes(b"\xff\xfe<html>")
+
+    filenames = ["a.html", "b.html", "broken.html"]
+    results = html2doc.convert_all(
+        filenames, jobs=2, options={"workdir": config.workdir}
+    )
+
+    assert [r["filename"] for r in results] == filenames
+    assert [r["status"] for r in results] == ["converted", "converted", "failed"]
+    assert os.path.isfile(config.output_folder / "a" / "a.docx")
+    assert os.path.isfile(config.output_folder / "b" / "b.docx")
+
+
+def test_lessons_sharing_a_title_get_their_own_output(tmp_path):
+    from harmony_tools.lessonindex import get_lesson_index
+
+    config.load(tmp_path, force=True, keep_inputs=True)
+
+    def write(name, text):
+        (config.input_folder / name).write_text(
+            "<html><head><title>Intro</title></head><body>"
+            f"<div class='course-mainbar lecture-content'><p>{text}</p></div>"
+            "</body></html>"
+        )
+
+    write("a.html", "First")
+    write("b.html", "Second")
+    results = html2doc.convert_changed(
+        ["a.html", "b.html"],
+        jobs=2,
+        options={"workdir": config.workdir, "keep_inputs": True},
+    )
+    first = str(config.output_folder / "Intro" / "Intro.docx")
+    second = str(config.output_folder / "Intro (2)" / "Intro (2).docx")
+    assert [r["output"] for r in results] == [first, second]
+
+    # Later batches and rebuilds keep the paths handed out before
+    write("c.html", "Third")
+    html2doc.convert_changed(["c.html"])
+    results = html2doc.convert_changed(["b.html", "a.html"], rebuild=True)
+    assert [r["output"] for r in results] == [second, first]
+
+    index = get_lesson_index()
+    assert index.get(first)["source"] == "a.html"
+    assert index.get(second)["source"] == "b.html"
+    third = str(config.output_folder / "Intro (3)" / "Intro (3).docx")
+    assert index.get(third)["source"] == "c.html"
+
+
+def test_peek_output_path_reads_the_title_from_the_start_of_the_page(tmp_path):
+    config.load(tmp_path, force=True)
+    (config.input_folder / "lesson.html").write_text(
+        "<html><head><title> Scales &amp; Modes </title></head><body></body></html>"
+    )
+    (config.input_folder / "late.html").write_text(
+        "<html><head><style>"
+        + " " * html2doc.TITLE_PEEK_CHARS
+        + "</style><title>Late</title></head></html>"
+    )
+
+    assert html2doc.peek_output_path("lesson.html") == str(
+        config.output_folder / "Scales  Modes" / "Scales  Modes.docx"
+    )
+    # Left for the conversion to name
+    assert html2doc.peek_output_path("late.html") is None
+    assert html2doc.peek_output_path("missing.html") is None
+
+
+def test_pool_workers_load_the_parents_config(tmp_path):
+    config.load(tmp_path, force=True, keep_inputs=True)
+    for name in ["a.html", "b.html"]:
+        (config.input_folder / name).write_text(
+            f"<html><head><title>{name[0]}</title></head><body>"
+            "<div class='course-mainbar lecture-content'><p>Hi</p></div></body></html>"
+        )
+
+    results = html2doc.convert_all(["a.html", "b.html"], jobs=2)
+
+    assert [r["status"] for r in results] == ["converted", "converted"]
+    assert os.path.isfile(config.output_folder / "a" / "a.docx")
+    assert sorted(os.listdir(config.input_folder)) == ["a.html", "b.html"]
+
+
+def test_convert_changed_skips_unchanged_lessons(tmp_path):
+    config.load(tmp_path, force=True, keep_inputs=True)
+    html_path = config.input_folder / "lesson.html"
+    html_path.write_text(
+        "<html><body><div class='course-mainbar lecture-content'>"
+        "<p>Hello</p></div></body></html>"
+    )
+
+    first = html2doc.convert_changed(["lesson.html"])
+    second = html2doc.convert_changed(["lesson.html"])
+    assert first[0]["status"] == "converted"
+    assert second[0]["status"] == "unchanged"
+    assert html_path.exists()
+
+    # A font change invalidates the cached conversion
+    config.load(tmp_path, force=True, keep_inputs=True, font="Arial")
+    assert html2doc.convert_changed(["lesson.html"])[0]["status"] == "converted"
+
+    # So does an edit to the source HTML
+    html_path.write_text(html_path.read_text().replace("Hello", "Hi"))
+    assert html2doc.convert_changed(["lesson.html"])[0]["status"] == "converted"
+
+
+def test_inline_images_are_decoded_once_in_memory(tmp_path, monkeypatch):
+    import base64
+    import io
+    from docx import Document
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), "blue").save(buffer, format="PNG")
+    data_uri = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+    def no_temp_files(*args, **kwargs):
+        raise AssertionError("images should not touch temp files")
+
+    monkeypatch.setattr(tempfile, "NamedTemporaryFile", no_temp_files)
+    decodes = []
+    b64decode = base64.b64decode
+    monkeypatch.setattr(
+        base64, "b64decode", lambda data: decodes.append(data) or b64decode(data)
+    )
+
+    config.load(tmp_path, force=True)
+    (config.input_folder / "lesson.html").write_text(
+        "<html><body><div class='course-mainbar lecture-content'>"
+        + f"<p><img src='{data_uri}'></p>" * 3
+        + "</div></body></html>"
+    )
+    output = html2doc.process_file("lesson.html")
+
+    assert len(Document(output).inline_shapes) == 3
+    assert len(decodes) == 1
+
+    # The memo belongs to the lesson: the next one decodes again
+    (config.input_folder / "lesson.html").write_text(
+        f"<html><body><div class='course-mainbar lecture-content'><p><img src='{data_uri}'>"
+        "</p></div></body></html>"
+    )
+    html2doc.process_file("lesson.html")
+    assert len(decodes) == 2
+
+
+def test_auto_parser_uses_validated_backend(tmp_path):
+    config.load(tmp_path, force=True, keep_inputs=True, parser="auto")
+    html = (
+        "<html><head><title>Fast</title></head><body>"
+        "<div class='course-mainbar lecture-content'><h2>Intro</h2>"
+        "<ul><li>One</li><li>Two</li></ul><p>Text <strong>bold</strong></p>"
+        "</div></body></html>"
+    )
+    (config.input_folder / "fast.html").write_text(html, encoding="utf-8")
+
+    results = html2doc.validate_parsers(["fast.html"])
+    assert results["fast.html"] == {"lxml": True, "html.parser": True}
+
+    markup = html2doc.read_lesson_markup(str(config.input_folder / "fast.html"))
+    assert html2doc.choose_parser(markup) == "lxml"
+
+    # A backend flagged as diverging is skipped for that page
+    validation = html2doc.get_parser_validation()
+    validation.set(html2doc.markup_key(markup), {"lxml": False, "html.parser": True})
+    assert html2doc.choose_parser(markup) == "html.parser"
+
+    # Pages that were never validated stay on html5lib
+    assert html2doc.choose_parser(markup.replace("Intro", "Other")) == "html5lib"
+
+    output = html2doc.process_file("fast.html")
+    assert output and os.path.exists(output)
+
+
+def test_fast_parser_falls_back_when_blocks_go_missing(tmp_path, monkeypatch):
+    config.load(tmp_path, force=True, keep_inputs=True, parser="lxml")
+    (config.input_folder / "lesson.html").write_text(
+        "<html><body><div class='course-mainbar lecture-content'>"
+        "<p>One</p><!-- <p>not a block</p> --><p>Two</p></div></body></html>"
+    )
+    input_path = str(config.input_folder / "lesson.html")
+    assert html2doc.parse_lesson(input_path)[1] == "lxml"
+
+    parse_html = html2doc.parse_html
+
+    def lossy_lxml(markup, parser):
+        soup = parse_html(markup, parser)
+        if parser == "lxml":
+            soup.find_all("p")[-1].decompose()
+        return soup
+
+    monkeypatch.setattr(html2doc, "parse_html", lossy_lxml)
+    soup, parser = html2doc.parse_lesson(input_path)
+    assert parser == "html5lib"
+    assert [p.text for p in soup.find_all("p")] == ["One", "Two"]
+
+
+def test_validate_parsers_reports_unreadable_pages_and_goes_on(tmp_path):
+    config.load(tmp_path, force=True, keep_inputs=True, low_memory=True)
+    (config.input_folder / "bad.html").write_bytes(b"\xff\xfe<html>")
+    (config.input_folder / "good.html").write_text(
+        "<html><body><div class='course-mainbar lecture-content'>"
+        "<h2>Intro</h2><p>Text</p></div></body></html>"
+    )
+
+    results = html2doc.validate_parsers(["bad.html", "good.html"])
+    assert results == {
+        "bad.html": None,
+        "good.html": {"lxml": True, "html.parser": True},
+    }
+
+    # The block structure is taken before --low-memory decomposes the tree
+    markup = html2doc.read_lesson_markup(str(config.input_folder / "good.html"))
+    signature = html2doc.lesson_signature(markup, "html5lib", "good.html")
+    assert signature["blocks"] == ["h2", "p"]
+
+
+def test_extract_lesson_markup_matches_full_parse(tmp_path):
+    from docx import Document
+
+    page = (
+        "<html><head><title>Scales &amp; Modes</title>"
+        "<script>var s = '<div class=\"course-mainbar lecture-content\">';</script>"
+        "</head><body><div class='course-sidebar'><div>Nav</div></div>"
+        "<!-- <div class='course-mainbar lecture-content'> -->"
+        "<div class='course-mainbar lecture-content'><h2>Intro</h2>"
+        "<div class='lecture-text-container'><p>One <em>two</em></p></div>"
+        "<ul><li>Three</li></ul></div><footer><div>Footer</div></footer>"
+        "</body></html>"
+    )
+    fragment = html2doc.extract_lesson_markup(page)
+    assert "Footer" not in fragment and "course-sidebar" not in fragment
+    assert fragment.count("<div") == 2
+    assert html2doc.extract_lesson_markup(page.replace("</div><footer>", "")) is None
+
+    def convert(full_parse):
+        config.load(tmp_path, force=True, keep_inputs=True, full_parse=full_parse)
+        (config.input_folder / "lesson.html").write_text(page, encoding="utf-8")
+        output = html2doc.process_file("lesson.html")
+        return [(p.style.name, p.text) for p in Document(output).paragraphs], output
+
+    fast, fast_output = convert(False)
+    full, full_output = convert(True)
+    assert fast == full
+    assert fast_output == full_output
+
+
+def test_inline_svg_flag_embeds_icons(tmp_path, monkeypatch):
+    from docx import Document
+    from harmony_tools import svgcache
+    from test_svgcache import fake_render
+
+    monkeypatch.setattr(svgcache, "render_svg", fake_render)
+
+    icon = "<svg width='8' height='8'><circle cx='4' cy='4' r='4'/></svg>"
+    html = (
+        "<html><body><div class='course-mainbar lecture-content'>"
+        f"<p>{icon} Play</p><p>{icon} Pause</p></div></body></html>"
+    )
+    for inline_svg, expected in [(False, 0), (True, 2)]:
+        config.load(tmp_path, force=True, keep_inputs=True, inline_svg=inline_svg)
+        (config.input_folder / "icons.html").write_text(html)
+        output = html2doc.process_file("icons.html")
+        assert len(Document(output).inline_shapes) == expected
@@ -0,0 +1,88 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from harmony_tools.imagecache import ImageCache
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append(self.path)
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(PNG)))
+        self.end_headers()
+        self.wfile.write(PNG)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve():
+    server = HTTPServer(("127.0.0.1", 0), ImageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def test_fetch_dedupes_within_and_across_runs(tmp_path):
+    server, base = serve()
+    ImageHandler.requests_seen = []
+    try:
+        cache = ImageCache(tmp_path)
+        first = cache.fetch(f"{base}/logo.png")
+        assert cache.fetch(f"{base}/logo.png") == first
+        # Same bytes from another URL share one stored object
+        assert cache.fetch(f"{base}/banner.png") == first
+        assert len(ImageHandler.requests_seen) == 2
+
+        # A later run revalidates with the stored ETag instead of downloading
+        rerun = ImageCache(tmp_path)
+        assert rerun.fetch(f"{base}/logo.png") == first
+        assert rerun.counters["revalidated"] == 1
+        cache.flush_stats()
+        rerun.flush_stats()
+    finally:
+        server.shutdown()
+
+    stats = ImageCache(tmp_path).stats()
+    assert (stats["hits"], stats["misses"], stats["revalidated"]) == (1, 2, 1)
+    assert stats["objects"] == 1
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = ImageCache(tmp_path)
+    old = cache.put(b"a" * 100)
+    new = cache.put(b"b" * 100)
+    os.utime(old, (1, 1))
+
+    assert cache.evict(150) == (1, 100)
+    assert not old.exists()
+    assert new.exists()
+
+
+def test_concurrent_puts_of_the_same_bytes(tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache = ImageCache(tmp_path)
+    barrier = threading.Barrier(8)
+    replace = os.replace
+
+    def racing_replace(src, dst):
+        # Every writer has its file ready before any of them renames it
+        barrier.wait(timeout=5)
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", racing_replace)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        paths = list(pool.map(lambda _: cache.put(PNG), range(8)))
+
+    assert len(set(paths)) == 1
+    assert paths[0].read_bytes() == PNG
+    assert os.listdir(paths[0].parent) == [paths[0].name]
@@ -0,0 +1,78 @@
+import io
+import os
+import base64
+import random
+from PIL import Image
+from harmony_tools import html2doc, imageopt
+from harmony_tools.config import config
+
+
+def png_bytes(image, **kwargs):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", **kwargs)
+    return buffer.getvalue()
+
+
+def photo(width=1200, height=800):
+    rng = random.Random(1)
+    image = Image.new("RGB", (width, height))
+    image.putdata(
+        [
+            (x % 256, (x * y) % 256, rng.randrange(64))
+            for y in range(height)
+            for x in range(width)
+        ]
+    )
+    return image
+
+
+def test_photographic_png_becomes_downscaled_jpeg():
+    data = png_bytes(photo())
+    optimized = imageopt.optimize_image(data, width_inches=2, dpi=150)
+
+    result = Image.open(io.BytesIO(optimized))
+    assert result.format == "JPEG"
+    assert result.size == (300, 200)
+    assert len(optimized) < len(data)
+
+
+def test_screenshot_png_stays_png_without_metadata():
+    from PIL.PngImagePlugin import PngInfo
+
+    image = Image.new("RGB", (1000, 500), "white")
+    image.paste((30, 30, 200), (100, 100, 600, 300))
+    info = PngInfo()
+    info.add_text("Software", "x" * 5000)
+    data = png_bytes(image, pnginfo=info)
+
+    optimized = imageopt.optimize_image(data, width_inches=5, dpi=100)
+    result = Image.open(io.BytesIO(optimized))
+    assert result.format == "PNG"
+    assert result.size == (500, 250)
+    assert "Software" not in result.info
+
+
+def test_small_images_are_not_resized():
+    data = png_bytes(Image.new("RGB", (20, 20), "red"))
+    optimized = imageopt.optimize_image(data, width_inches=3)
+    assert Image.open(io.BytesIO(optimized)).size == (20, 20)
+    assert len(optimized) <= len(data)
+
+
+def test_process_file_reports_savings(tmp_path):
+    from docx import Document
+
+    config.load(tmp_path, force=True, optimize_images=True, image_dpi=96)
+    data_uri = "data:image/png;base64," + base64.b64encode(png_bytes(photo())).decode()
+    (config.input_folder / "lesson.html").write_text(
+        "<html><body><div class='course-mainbar lecture-content'>"
+        f"<p><img src='{data_uri}' width='400'></p>"
+        f"<p><img src='{data_uri}' width='400'></p></div></body></html>"
+    )
+    result = html2doc.convert_lesson("lesson.html")
+
+    savings = result["image_savings"]
+    assert savings["images"] == 2
+    assert savings["bytes_out"] < savings["bytes_in"] / 4
+    assert len(Document(result["output"]).inline_shapes) == 2
+    assert os.listdir(config.state_folder / "optimized_images")
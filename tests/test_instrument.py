@@ -0,0 +1,34 @@
+from harmony_tools import html2doc
+from harmony_tools.config import config
+from harmony_tools.instrument import Metrics, aggregate, metrics
+
+
+def test_disabled_metrics_record_nothing():
+    recorder = Metrics()
+    with recorder.stage("parse"):
+        recorder.count("blocks")
+    assert recorder.snapshot() == {"timings": {}, "calls": {}, "counters": {}}
+
+
+def test_convert_lesson_reports_stage_timings(tmp_path):
+    config.load(tmp_path, force=True)
+    (config.input_folder / "lesson.html").write_text(
+        "<html><body><div class='course-mainbar lecture-content'>"
+        "<div><h2>Title</h2><p>Hello</p><p>World</p></div></div></body></html>"
+    )
+
+    metrics.enabled = True
+    try:
+        result = html2doc.convert_lesson("lesson.html")
+    finally:
+        metrics.enabled = False
+
+    snapshot = result["metrics"]
+    for stage in ["parse", "extract", "build", "save", "move"]:
+        assert snapshot["calls"][stage] == 1
+    assert snapshot["counters"]["tag.p"] == 2
+    assert snapshot["counters"]["blocks"] == 1
+
+    totals = aggregate([result, result])
+    assert totals["lessons"] == 2
+    assert totals["counters"]["tag.p"] == 4
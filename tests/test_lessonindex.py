@@ -0,0 +1,87 @@
+import os
+from docx import Document
+from harmony_tools import html2doc, lessonindex
+from harmony_tools.config import config
+from harmony_tools.upload2drive import collect_lesson_files
+
+
+def write_lesson(name, title):
+    (config.input_folder / name).write_text(
+        f"<html><head><title>{title}</title></head><body>"
+        f"<div class='course-mainbar lecture-content'><p>{title}</p></div></body></html>"
+    )
+
+
+def test_html2doc_indexes_lessons_for_collect_lesson_files(tmp_path):
+    config.load(tmp_path, force=True)
+    write_lesson("Lesson 10.html", "Alpha")
+    write_lesson("Lesson 2.html", "Beta")
+    html2doc.convert_changed(["Lesson 10.html", "Lesson 2.html"])
+
+    entry = lessonindex.get_lesson_index().get(
+        str(config.output_folder / "Beta" / "Beta.docx")
+    )
+    assert entry["title"] == "Beta"
+    assert entry["source"] == "Lesson 2.html"
+    assert entry["size"] > 0 and len(entry["hash"]) == 64
+
+    # Word lock files and temp files are not lessons
+    (config.output_folder / "Beta" / "~$Beta.docx").write_bytes(b"lock")
+    (config.output_folder / ".merge.docx").write_bytes(b"temp")
+
+    by_name = collect_lesson_files(str(config.output_folder))
+    by_source = collect_lesson_files(str(config.output_folder), sort_by="source")
+    assert [os.path.basename(p) for p in by_name] == ["Alpha.docx", "Beta.docx"]
+    assert [os.path.basename(p) for p in by_source] == ["Beta.docx", "Alpha.docx"]
+
+
+def test_index_recovers_unindexed_and_deleted_lessons(tmp_path):
+    config.load(tmp_path, force=True)
+    write_lesson("a.html", "Alpha")
+    html2doc.convert_changed(["a.html"])
+
+    # Converted before the index existed
+    legacy = config.output_folder / "Legacy" / "Legacy.docx"
+    legacy.parent.mkdir()
+    Document().save(legacy)
+    loose = config.output_folder / "Loose.docx"
+    Document().save(loose)
+
+    paths = collect_lesson_files(str(config.output_folder))
+    assert [os.path.basename(p) for p in paths] == [
+        "Alpha.docx",
+        "Legacy.docx",
+        "Loose.docx",
+    ]
+    assert lessonindex.get_lesson_index().get(str(legacy))["source"] is None
+
+    os.remove(config.output_folder / "Alpha" / "Alpha.docx")
+    paths = collect_lesson_files(str(config.output_folder))
+    assert [os.path.basename(p) for p in paths] == ["Legacy.docx", "Loose.docx"]
+    index = lessonindex.get_lesson_index()
+    assert index.get(str(config.output_folder / "Alpha" / "Alpha.docx")) is None
+
+
+def test_unindexed_files_in_indexed_folders_are_collected(tmp_path):
+    config.load(tmp_path, force=True)
+    write_lesson("a.html", "Alpha")
+    html2doc.convert_changed(["a.html"])
+
+    # Copied in by hand next to an indexed lesson
+    extra = config.output_folder / "Alpha" / "Alpha extra.docx"
+    Document().save(extra)
+    (config.output_folder / ".merge-tmp").mkdir()
+    Document().save(config.output_folder / ".merge-tmp" / "0-0.docx")
+
+    paths = collect_lesson_files(str(config.output_folder))
+    assert [os.path.basename(p) for p in paths] == ["Alpha extra.docx", "Alpha.docx"]
+    assert lessonindex.get_lesson_index().get(str(extra))["size"] > 0
+
+
+def test_natural_key_orders_numbers_by_value():
+    names = ["Lesson 10.html", "lesson 2.html", "Lesson 1.html"]
+    assert sorted(names, key=lessonindex.natural_key) == [
+        "Lesson 1.html",
+        "lesson 2.html",
+        "Lesson 10.html",
+    ]
@@ -0,0 +1,89 @@
+import base64
+import io
+import re
+import textwrap
+import zipfile
+from docx import Document
+from PIL import Image
+from harmony_tools import html2doc
+from harmony_tools.config import config
+from harmony_tools.lowmem import ImageSpool, read_without_images
+
+
+def data_uri(color, size=4):
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), color).save(buffer, format="BMP")
+    return "data:image/bmp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def write_lesson(colors):
+    blocks = "".join(
+        f"<div><h2>Part {i}</h2><p>Look <img src='{data_uri(color)}'></p></div>"
+        for i, color in enumerate(colors)
+    )
+    (config.input_folder / "lesson.html").write_text(
+        "<html><head><title>Big</title></head><body>"
+        f"<div class='course-mainbar lecture-content'>{blocks}</div></body></html>"
+    )
+
+
+def media(path):
+    with zipfile.ZipFile(path) as docx:
+        return {
+            name: docx.read(name)
+            for name in docx.namelist()
+            if name.startswith("word/media/")
+        }
+
+
+def test_inline_images_are_spooled_out_of_the_page(tmp_path):
+    uri = data_uri("green", size=300)
+    header, payload = uri.split(",", 1)
+    wrapped = header + "," + "\n".join(textwrap.wrap(payload, 76))
+    page = tmp_path / "page.html"
+    page.write_text(f"<p><img alt='x' src='{wrapped}'>\r\n<img src=\"{uri}\"></p>")
+
+    spool = ImageSpool(max_size=1024)
+    markup = read_without_images(page, spool)
+
+    keys = re.findall(r"src=.(data:spool,[^'\"]*)", markup)
+    assert len(keys) == 2 and "\r" not in markup
+    assert all(spool.read(key) == base64.b64decode(payload) for key in keys)
+    assert spool.file._rolled
+    assert "src='data:,'" in read_without_images(page)
+
+
+def test_low_memory_output_matches_regular_conversion(tmp_path):
+    colors = ["red", "green", "blue", "red"]
+    outputs = {}
+    for low_memory in [False, True]:
+        config.load(
+            tmp_path / str(low_memory),
+            force=True,
+            keep_inputs=True,
+            low_memory=low_memory,
+        )
+        write_lesson(colors)
+        result = html2doc.convert_lesson("lesson.html")
+        assert result["status"] == "converted"
+        outputs[low_memory] = result["output"]
+
+    assert result["peak_rss"] > 0
+    regular, low = (Document(outputs[mode]) for mode in [False, True])
+    assert [p.text for p in low.paragraphs] == [p.text for p in regular.paragraphs]
+    assert len(low.inline_shapes) == 4
+    # Repeated images still share one part
+    assert media(outputs[True]) == media(outputs[False])
+    assert len(media(outputs[True])) == 3
+
+
+def test_memory_budget_fails_the_lesson(tmp_path, capsys):
+    config.load(tmp_path, force=True, keep_inputs=True, memory_budget=1)
+    write_lesson(["red"])
+
+    result = html2doc.convert_lesson("lesson.html")
+
+    assert result["status"] == "failed"
+    assert "budget" in result["error"]
+    html2doc.print_summary([result])
+    assert "1 MB budget" in capsys.readouterr().out
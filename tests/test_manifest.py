@@ -0,0 +1,21 @@
+from harmony_tools.manifest import Manifest, hash_file
+
+
+def test_manifest_round_trip(tmp_path):
+    manifest = Manifest(tmp_path / "state" / "manifest.json")
+    manifest.set("lesson.html", {"hash": "abc"})
+    manifest.save()
+
+    reloaded = Manifest(tmp_path / "state" / "manifest.json")
+    assert reloaded.get("lesson.html") == {"hash": "abc"}
+    assert reloaded.get("missing") is None
+
+
+def test_hash_file_matches_content(tmp_path):
+    a = tmp_path / "a.html"
+    b = tmp_path / "b.html"
+    a.write_text("same")
+    b.write_text("same")
+    assert hash_file(a) == hash_file(b)
+    b.write_text("different")
+    assert hash_file(a) != hash_file(b)
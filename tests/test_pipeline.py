@@ -0,0 +1,67 @@
+from docx import Document
+from harmony_tools import pipeline
+from harmony_tools.config import config
+from harmony_tools.upload2drive import collect_lesson_files
+
+
+def write_lesson(name, title, text):
+    (config.input_folder / name).write_text(
+        f"<html><head><title>{title}</title></head><body>"
+        f"<div class='course-mainbar lecture-content'><p>{text}</p></div></body></html>"
+    )
+
+
+def run(merged, **kwargs):
+    merge = pipeline.StreamingMerge(
+        merged, existing=collect_lesson_files(str(config.output_folder))
+    )
+    filenames = sorted(path.name for path in config.input_folder.glob("*.html"))
+    return pipeline.run_pipeline(
+        filenames,
+        options={"workdir": config.workdir, "keep_inputs": True, "nomedia": True},
+        merge=merge,
+        **kwargs,
+    )
+
+
+def test_pipeline_converts_and_merges_in_name_order(tmp_path):
+    config.load(tmp_path, force=True, keep_inputs=True, nomedia=True)
+    existing = config.output_folder / "Middle" / "Middle.docx"
+    existing.parent.mkdir(parents=True)
+    doc = Document()
+    doc.add_paragraph("Middle text")
+    doc.save(existing)
+
+    write_lesson("1.html", "Zulu", "Zulu text")
+    write_lesson("2.html", "Alpha", "Alpha text")
+    merged = tmp_path / "merged.docx"
+
+    results, runner = run(merged, jobs=2, queue_size=1)
+
+    assert [r["status"] for r in results] == ["converted", "converted"]
+    texts = [p.text for p in Document(merged).paragraphs if p.text]
+    assert texts == ["Alpha text", "Middle text", "Zulu text"]
+    report = {r["stage"]: r["items"] for r in runner.throughput()}
+    assert report == {"parse": 2, "fetch": 2, "build": 2, "merge": 3}
+
+    results, _ = run(tmp_path / "again.docx")
+    assert [r["status"] for r in results] == ["unchanged", "unchanged"]
+    texts = [p.text for p in Document(tmp_path / "again.docx").paragraphs if p.text]
+    assert texts == ["Alpha text", "Middle text", "Zulu text"]
+
+
+def test_streaming_merge_waits_for_earlier_lessons(tmp_path):
+    paths = {name: str(tmp_path / f"{name}.docx") for name in "abc"}
+    for path in paths.values():
+        open(path, "wb").close()
+
+    merge = pipeline.StreamingMerge(tmp_path / "out.docx", existing=[paths["b"]])
+    merge.expect(paths["a"])
+    merge.expect(paths["c"])
+    merge.arrive(paths["c"])
+    assert merge.next_ready() == []
+
+    merge.seal()
+    assert merge.next_ready() == []
+    merge.arrive(paths["a"])
+    assert merge.next_ready() == [paths["a"], paths["b"], paths["c"]]
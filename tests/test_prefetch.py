@@ -0,0 +1,106 @@
+import io
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bs4 import BeautifulSoup
+from PIL import Image
+from docx import Document
+from harmony_tools import html2doc
+from harmony_tools.config import config
+from harmony_tools.imagecache import ImageCache
+from harmony_tools.prefetch import collect_image_urls, create_session, prefetch_images
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), "red").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    failures = {}
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            fail = cls.failures.pop(self.path, False)
+        time.sleep(0.05)
+        # Done before replying: once the client has the response it may
+        # start its next request before this thread would get to it
+        with cls.lock:
+            cls.in_flight -= 1
+        if fail:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = png_bytes()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve():
+    StandInHandler.in_flight = 0
+    StandInHandler.max_in_flight = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def test_collect_image_urls_resolves_and_dedupes():
+    soup = BeautifulSoup(
+        "<div><img src='a.png'><img src='http://x/b.png'><img src='a.png'>"
+        "<img src='data:image/png;base64,AAAA'></div>",
+        "html.parser",
+    )
+    assert collect_image_urls(soup.div, "/lessons/l.html") == [
+        "file:///lessons/a.png",
+        "http://x/b.png",
+    ]
+
+
+def test_prefetch_bounds_per_host_and_retries(tmp_path):
+    server, base = serve()
+    StandInHandler.failures = {"/img3.png": True}
+    urls = [f"{base}/img{i}.png" for i in range(10)]
+    try:
+        paths = prefetch_images(
+            urls,
+            ImageCache(tmp_path),
+            session=create_session(backoff=0),
+            max_workers=8,
+            per_host=2,
+        )
+    finally:
+        server.shutdown()
+
+    assert all(paths[url] for url in urls)
+    assert StandInHandler.max_in_flight <= 2
+
+
+def test_process_file_embeds_prefetched_images(tmp_path):
+    server, base = serve()
+    try:
+        config.load(tmp_path, force=True)
+        (config.input_folder / "lesson.html").write_text(
+            "<html><body><div class='course-mainbar lecture-content'>"
+            f"<p>Logo <img src='{base}/logo.png'></p><img src='{base}/logo.png'>"
+            "</div></body></html>"
+        )
+        output = html2doc.process_file("lesson.html")
+    finally:
+        server.shutdown()
+
+    doc = Document(output)
+    assert len(doc.inline_shapes) == 2
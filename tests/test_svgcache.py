@@ -0,0 +1,82 @@
+import io
+import pytest
+from PIL import Image
+from harmony_tools import svgcache
+from harmony_tools.svgcache import SvgCache, normalize_svg
+
+ICON = "<svg width='10' height='10'><rect width='10' height='10' fill='red'/></svg>"
+
+
+def fake_render(markup, width=None):
+    """
+    Stand-in for nocairosvg, which drives a headless browser.
+    """
+    if not markup.endswith("</svg>"):
+        print("Failed to convert SVG to PNG: parse error")
+        return None
+    buffer = io.BytesIO()
+    Image.new("RGB", (width or 10, width or 10), "red").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def no_browser(monkeypatch):
+    monkeypatch.setattr(svgcache, "render_svg", fake_render)
+
+
+def test_render_is_cached_on_normalized_markup(tmp_path, monkeypatch):
+    calls = []
+
+    def counting_render(markup, width=None):
+        calls.append(markup)
+        return fake_render(markup, width)
+
+    monkeypatch.setattr(svgcache, "render_svg", counting_render)
+    cache = SvgCache(tmp_path)
+    png = cache.render(ICON, 20)
+    assert png.startswith(b"\x89PNG")
+    assert cache.render(ICON.replace("><", ">\n  <"), 20) == png
+    assert len(calls) == 1
+    assert "xmlns=" in normalize_svg(ICON)
+
+    # A different size is a different entry; a fresh process hits the disk tier
+    cache.render(ICON, 40)
+    assert len(calls) == 2
+    assert SvgCache(tmp_path).render(ICON, 20) == png
+    assert len(calls) == 2
+
+
+def test_render_many_renders_distinct_svgs_once(monkeypatch):
+    monkeypatch.setattr(svgcache, "POOL_MIN_JOBS", 2)
+    icons = [ICON.replace("red", color) for color in ["red", "blue", "green"]]
+    cache = SvgCache()
+    assert cache.render_many(icons * 3, 16) == 3
+    assert cache.render_many(icons, 16) == 0
+    assert all(cache.render(icon, 16) for icon in icons)
+
+
+def test_render_many_keeps_one_pool_for_the_run(monkeypatch):
+    monkeypatch.setattr(svgcache, "POOL_MIN_JOBS", 2)
+    started = []
+
+    class CountingPool(svgcache.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            started.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(svgcache, "ProcessPoolExecutor", CountingPool)
+    cache = SvgCache()
+    for lesson in range(3):
+        icons = [ICON.replace("10", str(lesson * 10 + size)) for size in [1, 2]]
+        assert cache.render_many(icons, 16) == 2
+    cache.close()
+
+    assert len(started) == 1
+    assert cache._executor is None
+
+
+def test_broken_svg_is_not_retried(tmp_path, capsys):
+    cache = SvgCache(tmp_path)
+    assert cache.render("<svg><rect", 16) is None
+    assert cache.render("<svg><rect", 16) is None
+    assert capsys.readouterr().out.count("Failed to convert SVG") == 1
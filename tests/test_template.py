@@ -0,0 +1,78 @@
+import io
+import zipfile
+from docx import Document
+from docx.shared import Inches, Pt, RGBColor
+from harmony_tools import html2doc, template
+from harmony_tools.config import config
+
+
+def make_dotx(path, drop_styles=()):
+    doc = Document()
+    doc.styles["Heading 1"].font.color.rgb = RGBColor.from_string("AA0000")
+    doc.add_paragraph("Template boilerplate")
+    for name in drop_styles:
+        doc.styles.element.remove(doc.styles[name].element)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+
+    with zipfile.ZipFile(buffer) as source, zipfile.ZipFile(path, "w") as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename == template.CONTENT_TYPES:
+                data = data.replace(template.DOCUMENT_TYPE, template.TEMPLATE_TYPE)
+            target.writestr(item, data)
+
+
+def test_prepared_template_is_built_once_and_cloned():
+    template._prepare.cache_clear()
+    first = template.new_document("Arial")
+    first.add_paragraph("Only in the first lesson")
+    second = template.new_document("Arial")
+
+    assert template._prepare.cache_info().misses == 1
+    assert len(second.paragraphs) == 0
+    assert second.styles["Normal"].font.name == "Arial"
+    assert second.styles["Heading 2"].paragraph_format.space_after == Pt(6)
+    assert second.styles["List Bullet"].paragraph_format.left_indent == Inches(0.5)
+    assert second.styles["Hyperlink"].font.underline
+
+
+def test_lessons_use_a_dotx_template(tmp_path):
+    dotx = tmp_path / "house.dotx"
+    make_dotx(dotx)
+    config.load(tmp_path, force=True, template=str(dotx))
+    (config.input_folder / "lesson.html").write_text(
+        "<html><head><title>Styled</title></head><body>"
+        "<div class='course-mainbar lecture-content'><h1>Title</h1><p>Body</p>"
+        "</div></body></html>"
+    )
+
+    doc = Document(html2doc.process_file("lesson.html"))
+    assert [p.text for p in doc.paragraphs] == ["Title", "Body"]
+    assert doc.styles["Heading 1"].font.color.rgb == RGBColor.from_string("AA0000")
+    assert html2doc.conversion_settings()["template"]
+
+
+def test_template_without_lesson_styles_gets_them_added(tmp_path):
+    # Like a .dotx saved by Word, which leaves out styles never used
+    missing = ["Heading 2", "Heading 3", "List Bullet", "List Number"]
+    dotx = tmp_path / "bare.dotx"
+    make_dotx(dotx, drop_styles=missing)
+    config.load(tmp_path, force=True, template=str(dotx))
+    (config.input_folder / "lesson.html").write_text(
+        "<html><head><title>Bare</title></head><body>"
+        "<div class='course-mainbar lecture-content'><h2>Part</h2><h3>Step</h3>"
+        "<ul><li>Dot</li></ul><ol><li>First</li></ol></div></body></html>"
+    )
+
+    doc = Document(html2doc.process_file("lesson.html"))
+    assert [(p.style.name, p.text) for p in doc.paragraphs] == [
+        ("Heading 2", "Part"),
+        ("Heading 3", "Step"),
+        ("List Bullet", "Dot"),
+        ("List Number", "First"),
+    ]
+    assert doc.styles["List Bullet"].paragraph_format.left_indent == Inches(0.5)
+    assert doc.styles["Heading 2"].paragraph_format.space_after == Pt(6)
+    # Styles the template does have are left alone
+    assert doc.styles["Heading 1"].font.color.rgb == RGBColor.from_string("AA0000")
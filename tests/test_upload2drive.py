@@ -6,8 +6,8 @@ import harmony_tools.config as config_module
 
 @patch("harmony_tools.upload2drive.os.path.exists", return_value=True)
 @patch("harmony_tools.upload2drive.pickle.load", return_value=MagicMock(valid=True))
-@patch("harmony_tools.upload2drive.build")
-@patch("harmony_tools.upload2drive.MediaFileUpload")
+@patch("googleapiclient.discovery.build")
+@patch("googleapiclient.http.MediaFileUpload")
 def test_upload_to_google_drive(
     mock_media, mock_build, mock_pickle, mock_exists, monkeypatch, tmp_path
 ):
@@ -30,9 +30,10 @@ def test_upload_to_google_drive(
 
     # Configure mocks
     mock_service = MagicMock()
-    mock_service.files.return_value.create.return_value.execute.return_value = {
-        "id": "fake-id"
-    }
+    mock_service.files.return_value.create.return_value.next_chunk.return_value = (
+        None,
+        {"id": "fake-id"},
+    )
     mock_build.return_value = mock_service
 
     upload2drive.upload_to_google_drive(str(test_doc))
@@ -42,6 +43,250 @@ def test_upload_to_google_drive(
     mock_media.assert_called_once_with(
         str(test_doc),
         mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        chunksize=upload2drive.DEFAULT_CHUNK_SIZE,
+        resumable=True,
     )
     mock_service.files.assert_called_once()
     # assert "fake-id" in result
+
+
+def test_merge_with_images_adds_breaks_between_lessons(tmp_path, monkeypatch):
+    from docx import Document
+
+    def no_temp_files(*args, **kwargs):
+        raise AssertionError("merge should not write intermediate documents")
+
+    monkeypatch.setattr("tempfile.mkstemp", no_temp_files)
+
+    paths = []
+    for name in ["one", "two", "three"]:
+        doc = Document()
+        doc.add_paragraph(f"Lesson {name}")
+        path = tmp_path / f"{name}.docx"
+        doc.save(path)
+        paths.append(str(path))
+
+    output = tmp_path / "merged.docx"
+    assert upload2drive.merge_with_images(paths, output) == output
+
+    merged = Document(output)
+    texts = [p.text for p in merged.paragraphs if p.text]
+    assert texts == ["Lesson one", "Lesson two", "Lesson three"]
+    assert len(merged.element.body.xpath('.//w:br[@w:type="page"]')) == 2
+
+
+def test_resumable_upload_resumes_after_interruption(tmp_path):
+    import os
+    import pytest
+    from googleapiclient.errors import HttpError
+    from fake_drive import FakeDrive
+
+    config.load(tmp_path, force=True)
+    doc_path = tmp_path / "course.docx"
+    content = os.urandom(5 * upload2drive.CHUNK_UNIT // 2)
+    doc_path.write_bytes(content)
+
+    with FakeDrive() as drive:
+        # The second chunk fails, interrupting the first run
+        drive.fail_puts = {2: True}
+        with pytest.raises(HttpError):
+            upload2drive.upload_to_google_drive(
+                str(doc_path),
+                service=drive.service(),
+                chunksize=upload2drive.CHUNK_UNIT,
+            )
+        assert (config.state_folder / "upload_sessions.json").exists()
+
+        # Rewritten with the same content, like a re-merge of the same lessons
+        doc_path.write_bytes(content)
+        stat = doc_path.stat()
+        os.utime(doc_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        uploaded = upload2drive.upload_to_google_drive(
+            str(doc_path), service=drive.service(), chunksize=upload2drive.CHUNK_UNIT
+        )
+
+    assert uploaded["id"] == "file-1"
+    assert drive.sessions_started == 1
+    assert drive.received["1"] == content
+    sessions = upload2drive.Manifest(config.state_folder / "upload_sessions.json")
+    assert sessions.get(str(doc_path)) is None
+
+
+def test_upload_lessons_in_parallel_with_rate_limit_backoff(tmp_path, monkeypatch):
+    from fake_drive import FakeDrive
+    from googleapiclient.http import build_http
+
+    config.load(tmp_path, force=True)
+    monkeypatch.setattr(upload2drive, "UPLOAD_RETRIES", 0)
+    monkeypatch.setattr(upload2drive.time, "sleep", lambda seconds: None)
+
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"lesson{i}.docx"
+        path.write_bytes(b"lesson %d" % i)
+        paths.append(str(path))
+
+    with FakeDrive() as drive:
+        drive.rate_limit_posts = 2
+        results = upload2drive.upload_lessons(
+            paths, drive.service(), http_factory=build_http, workers=3
+        )
+
+    assert [r["path"] for r in results] == paths
+    assert all(r["webViewLink"] == f"https://docs/{r['id']}" for r in results)
+    assert len({r["id"] for r in results}) == 5
+    assert drive.sessions_started == 5
+    assert drive.batches == 1
+
+
+def test_upload_ledger_skips_unchanged_and_updates_in_place(tmp_path):
+    from docx import Document
+    from fake_drive import FakeDrive
+
+    config.load(tmp_path, force=True)
+    path = tmp_path / "course.docx"
+    doc = Document()
+    doc.add_paragraph("Version one")
+    doc.save(path)
+
+    ledger = upload2drive.get_upload_ledger()
+    with FakeDrive() as drive:
+        service = drive.service()
+        first = upload2drive.upload_if_changed(str(path), ledger, service=service)
+        # Re-saving produces different zip bytes but the same content
+        Document(path).save(path)
+        second = upload2drive.upload_if_changed(str(path), ledger, service=service)
+
+        doc.add_paragraph("Version two")
+        doc.save(path)
+        third = upload2drive.upload_if_changed(str(path), ledger, service=service)
+        forced = upload2drive.upload_if_changed(
+            str(path), ledger, force=True, service=service
+        )
+
+        # A Doc deleted from Drive is re-created rather than failing
+        drive.deleted.add(first["id"])
+        doc.add_paragraph("Version three")
+        doc.save(path)
+        recreated = upload2drive.upload_if_changed(str(path), ledger, service=service)
+
+    assert second == {"id": first["id"], "skipped": True}
+    assert third["id"] == forced["id"] == first["id"]
+    assert drive.updates == [first["id"]] * 3
+    assert recreated["id"] != first["id"]
+    assert upload2drive.get_upload_ledger().get(str(path))["file_id"] == recreated["id"]
+
+
+def test_merge_tree_matches_sequential_merge(tmp_path):
+    import io
+    from docx import Document
+    from docx.shared import Inches
+    from harmony_tools.benchmark import PIXEL_PNG
+
+    paths = []
+    for i in range(11):
+        doc = Document()
+        doc.add_heading(f"Lesson {i}", level=1)
+        doc.add_paragraph(f"Body {i}")
+        if i % 3 == 0:
+            doc.add_picture(io.BytesIO(PIXEL_PNG), width=Inches(1))
+        path = tmp_path / f"lesson{i:02}.docx"
+        doc.save(path)
+        paths.append(str(path))
+
+    sequential = tmp_path / "sequential.docx"
+    tree = tmp_path / "tree.docx"
+    upload2drive.merge_with_images(paths, sequential)
+    upload2drive.merge_tree(paths, tree, jobs=2, fan_in=3)
+
+    expected, merged = Document(sequential), Document(tree)
+    assert [(p.style.name, p.text) for p in merged.paragraphs] == [
+        (p.style.name, p.text) for p in expected.paragraphs
+    ]
+    assert len(merged.inline_shapes) == len(expected.inline_shapes) == 4
+    breaks = './/w:br[@w:type="page"]'
+    assert len(merged.element.body.xpath(breaks)) == 10
+    assert len(merged.element.body.xpath(".//w:instrText")) == 1
+    assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".")] == []
+
+
+def list_numbering(path):
+    """
+    For every numbered paragraph: its text, numId and start overrides,
+    plus the w:num entries no paragraph or style uses.
+    """
+    from docx import Document
+    from harmony_tools.compact import W
+
+    doc = Document(path)
+    nums = {
+        num.get(f"{W}numId"): num
+        for num in doc.part.numbering_part.element.findall(f"{W}num")
+    }
+    used = set(doc.styles.element.xpath(".//w:numPr/w:numId/@w:val"))
+    paragraphs = []
+    for p in doc.paragraphs:
+        num_id = p._p.xpath("./w:pPr/w:numPr/w:numId/@w:val") or p.style.element.xpath(
+            ".//w:numPr/w:numId/@w:val"
+        )
+        if num_id:
+            used.add(num_id[0])
+            starts = nums[num_id[0]].xpath(".//w:startOverride/@w:val")
+            paragraphs.append((p.text, num_id[0], starts))
+    return paragraphs, sorted(set(nums) - used)
+
+
+def test_merge_tree_numbers_lists_like_the_sequential_merge(tmp_path):
+    from docx import Document
+
+    paths = []
+    for i in range(11):
+        doc = Document()
+        doc.add_heading(f"Lesson {i}", level=1)
+        # Lists at the start, middle and end of the groups of three
+        for j in range(3 if i % 3 != 2 or i == 8 else 0):
+            doc.add_paragraph(f"Step {i}.{j}", style="List Number")
+        path = tmp_path / f"lesson{i:02}.docx"
+        doc.save(path)
+        paths.append(str(path))
+
+    sequential = tmp_path / "sequential.docx"
+    upload2drive.merge_with_images(paths, sequential)
+    expected, orphans = list_numbering(sequential)
+    # The first lesson keeps the style's list, every later one restarts it
+    assert [starts for text, _, starts in expected if text.endswith(".0")] == [[]] + [
+        ["1"]
+    ] * 8
+
+    for fan_in in [3, 2]:
+        tree = tmp_path / f"tree{fan_in}.docx"
+        upload2drive.merge_tree(paths, tree, jobs=2, fan_in=fan_in)
+        assert list_numbering(tree) == (expected, orphans)
+
+
+def test_merge_if_changed_keeps_the_merged_file_of_the_same_lessons(tmp_path, capsys):
+    from docx import Document
+
+    config.load(tmp_path, force=True)
+    paths = []
+    for name in ["one", "two"]:
+        doc = Document()
+        doc.add_paragraph(f"Lesson {name}")
+        doc.save(tmp_path / f"{name}.docx")
+        paths.append(str(tmp_path / f"{name}.docx"))
+    output = tmp_path / "merged.docx"
+
+    upload2drive.merge_if_changed(paths, output)
+    mtime_ns = output.stat().st_mtime_ns
+    capsys.readouterr()
+    upload2drive.merge_if_changed(paths, output)
+    assert "up to date" in capsys.readouterr().out
+    assert output.stat().st_mtime_ns == mtime_ns
+
+    doc = Document()
+    doc.add_paragraph("Lesson two, edited")
+    doc.save(paths[1])
+    upload2drive.merge_if_changed(paths, output)
+    assert "up to date" not in capsys.readouterr().out
+    assert "Lesson two, edited" in [p.text for p in Document(output).paragraphs]
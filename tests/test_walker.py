@@ -0,0 +1,49 @@
+import sys
+from bs4 import BeautifulSoup
+from harmony_tools import html2doc, walker
+from harmony_tools.config import config
+
+
+def build(html, tmp_path):
+    config.load(tmp_path, force=True)
+    body = BeautifulSoup(html, "html.parser").div
+    return html2doc.build_lesson_document(body, str(tmp_path / "lesson.html"))
+
+
+def test_deeply_nested_wrappers_do_not_recurse(tmp_path):
+    depth = sys.getrecursionlimit() * 2
+    html = (
+        "<div class='course-mainbar lecture-content'>"
+        + "<div>" * depth
+        + "<p>Deep <strong>text</strong></p>"
+        + "</div>" * depth
+        + "</div>"
+    )
+    doc = build(html, tmp_path)
+    assert [p.text for p in doc.paragraphs] == ["Deep text "]
+
+
+def test_block_inside_paragraph_keeps_document_order(tmp_path):
+    doc = build(
+        "<div class='course-mainbar lecture-content'>"
+        "<p>a <strong>b <div><p>c</p></div> d</strong> e</p><p>f</p></div>",
+        tmp_path,
+    )
+    # Text after the nested block is dropped from its frame but not the parent
+    assert [p.text for p in doc.paragraphs] == ["a b e", "c", "f"]
+
+
+def test_register_class_handler(tmp_path, monkeypatch):
+    monkeypatch.setattr(walker, "CLASS_HANDLERS", dict(walker.CLASS_HANDLERS))
+
+    def handle_quiz(elem, walker):
+        walker.doc.add_paragraph(f"[Quiz: {elem.get_text(strip=True)}]")
+
+    walker.register_class_handler("lecture-attachment-type-quiz", handle_quiz)
+    doc = build(
+        "<div class='course-mainbar lecture-content'>"
+        "<div class='lecture-attachment lecture-attachment-type-quiz'>Q1</div>"
+        "<div class='lecture-attachment-type-video'></div></div>",
+        tmp_path,
+    )
+    assert [p.text for p in doc.paragraphs] == ["[Quiz: Q1]", "[Video Here]"]
@@ -0,0 +1,149 @@
+import os
+import time
+import threading
+from harmony_tools import html2doc
+from harmony_tools.config import config
+from harmony_tools.watch import InputWatcher
+
+LESSON = (
+    "<html><head><title>{title}</title></head><body>"
+    "<div class='course-mainbar lecture-content'><p>Hello</p></div></body></html>"
+)
+
+
+def test_watcher_waits_for_files_to_settle(tmp_path):
+    now = [1000.0]
+    watcher = InputWatcher(tmp_path, debounce=2, clock=lambda: now[0])
+    page = tmp_path / "lesson.html"
+
+    page.write_text("<html>")
+    os.utime(page, (now[0], now[0]))
+    (tmp_path / "lesson.html.crdownload").write_text("partial")
+    assert watcher.poll() == []
+
+    # Still growing: the debounce starts over
+    now[0] += 1.5
+    page.write_text(LESSON.format(title="One"))
+    os.utime(page, (now[0], now[0]))
+    assert watcher.poll() == []
+    now[0] += 1
+    assert watcher.poll() == []
+    now[0] += 1.5
+    assert watcher.poll() == ["lesson.html"]
+    assert watcher.poll() == []
+
+    # A later edit is picked up again once it settles
+    page.write_text(LESSON.format(title="Two"))
+    os.utime(page, (now[0] - 10, now[0] - 10))
+    assert watcher.poll() == ["lesson.html"]
+
+
+def test_watch_converts_new_lessons_with_a_warm_pool(tmp_path):
+    config.load(tmp_path, force=True)
+    options = {"workdir": config.workdir}
+    (config.input_folder / "early.html").write_text(LESSON.format(title="Early"))
+
+    stop = threading.Event()
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.extend(
+            html2doc.watch_inputs(
+                jobs=2, options=options, interval=0.1, debounce=0.2, stop=stop
+            )
+        )
+    )
+    thread.start()
+    try:
+        late = config.input_folder / "late.html"
+        late.write_text(LESSON.format(title="Late"))
+        # Converted inputs are moved to processed_html
+        deadline = time.time() + 30
+        while time.time() < deadline and os.listdir(config.input_folder):
+            time.sleep(0.1)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert sorted(r["filename"] for r in results) == ["early.html", "late.html"]
+    assert all(r["status"] == "converted" for r in results)
+    assert os.listdir(config.input_folder) == []
+
+
+def test_watch_outlives_inputs_that_vanish_after_poll(tmp_path, monkeypatch):
+    config.load(tmp_path, force=True)
+    (config.input_folder / "kept.html").write_text(LESSON.format(title="Kept"))
+    (config.input_folder / "gone.html").write_text(LESSON.format(title="Gone"))
+    stop = threading.Event()
+    poll = InputWatcher.poll
+
+    def poll_then_delete(self):
+        ready = poll(self)
+        if "gone.html" in ready:
+            (config.input_folder / "gone.html").unlink()
+            stop.set()
+        return ready
+
+    monkeypatch.setattr(InputWatcher, "poll", poll_then_delete)
+    results = html2doc.watch_inputs(interval=0.05, debounce=0.1, stop=stop)
+
+    statuses = {r["filename"]: r["status"] for r in results}
+    assert statuses == {"kept.html": "converted", "gone.html": "failed"}
+
+
+def test_watch_retries_a_batch_that_failed(tmp_path, monkeypatch):
+    config.load(tmp_path, force=True)
+    (config.input_folder / "lesson.html").write_text(LESSON.format(title="One"))
+    stop = threading.Event()
+    convert_changed = html2doc.convert_changed
+    calls = []
+
+    def fail_first_batch(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        stop.set()
+        return convert_changed(*args, **kwargs)
+
+    monkeypatch.setattr(html2doc, "convert_changed", fail_first_batch)
+    results = html2doc.watch_inputs(interval=0.05, debounce=0.1, stop=stop)
+
+    assert len(calls) == 2
+    assert [(r["filename"], r["status"]) for r in results] == [
+        ("lesson.html", "converted")
+    ]
+
+
+def test_convert_batch_replaces_a_broken_pool_and_requeues(tmp_path, monkeypatch):
+    # Kept in place, so a lesson finished before the crash reads as unchanged
+    config.load(tmp_path, force=True, keep_inputs=True)
+    options = {"workdir": config.workdir, "keep_inputs": True}
+    for name in ["crash", "calm"]:
+        (config.input_folder / f"{name}.html").write_text(LESSON.format(title=name))
+    marker = tmp_path / "crash-once"
+    marker.touch()
+    convert_file = html2doc.convert_file
+
+    def crash_once(filename, image_paths=None, output_path=None):
+        # Forked workers inherit this; the marker makes it a one-off
+        if filename == "crash.html" and marker.exists():
+            marker.unlink()
+            os._exit(1)
+        return convert_file(filename, image_paths, output_path)
+
+    monkeypatch.setattr(html2doc, "convert_file", crash_once)
+    pool = html2doc.create_pool(2, options)
+    batch, new_pool = html2doc.convert_batch(
+        ["crash.html", "calm.html"], 2, options, False, pool
+    )
+    try:
+        assert new_pool is not pool
+        assert {r["filename"] for r in batch} == {"crash.html", "calm.html"}
+        assert all(r["status"] in ("converted", "unchanged") for r in batch)
+        # The new pool is healthy for the next batch
+        (config.input_folder / "next.html").write_text(LESSON.format(title="Next"))
+        batch, same_pool = html2doc.convert_batch(
+            ["next.html"], 2, options, False, new_pool
+        )
+        assert same_pool is new_pool and batch[0]["status"] == "converted"
+    finally:
+        new_pool.shutdown()